@@ -0,0 +1,55 @@
+"""Add keyset pagination indexes
+
+Revision ID: 5e8a1d4c2b7f
+Revises: 9b1f3c2d7e4a
+Create Date: 2026-10-18 14:03:27.519764
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e8a1d4c2b7f"
+down_revision = "9b1f3c2d7e4a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows without created_at would drop out of keyset pages
+    op.execute(
+        "UPDATE users SET created_at = now() at time zone 'utc' "
+        "WHERE created_at IS NULL"
+    )
+    op.execute(
+        "UPDATE accounts SET created_at = now() at time zone 'utc' "
+        "WHERE created_at IS NULL"
+    )
+    # Build the indexes without locking writes on large tables
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_created_at_id",
+            "users",
+            ["created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_users_account_id_created_at_id",
+            "users",
+            ["account_id", "created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_accounts_created_at_id",
+            "accounts",
+            ["created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_accounts_created_at_id", table_name="accounts")
+    op.drop_index("ix_users_account_id_created_at_id", table_name="users")
+    op.drop_index("ix_users_created_at_id", table_name="users")
@@ -0,0 +1,216 @@
+"""Add account stats
+
+Revision ID: 7d2c5f9a3e18
+Revises: e1b4d8f2a6c9
+Create Date: 2026-10-18 17:55:12.840311
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "7d2c5f9a3e18"
+down_revision = "e1b4d8f2a6c9"
+branch_labels = None
+depends_on = None
+
+TRIGGERS = """
+CREATE OR REPLACE FUNCTION account_stats_add(
+    target uuid, users integer, active integer
+) RETURNS void AS $$
+BEGIN
+    IF target IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO account_stats AS stats
+        (account_id, user_count, active_user_count, updated_at)
+    VALUES (target, users, active, now() AT TIME ZONE 'utc')
+    ON CONFLICT (account_id) DO UPDATE SET
+        user_count = stats.user_count + excluded.user_count,
+        active_user_count =
+            stats.active_user_count + excluded.active_user_count,
+        updated_at = excluded.updated_at;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION account_role_stats_add(
+    target uuid, role uuid, users integer
+) RETURNS void AS $$
+BEGIN
+    IF target IS NULL OR role IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO account_role_stats AS stats (account_id, role_id, user_count)
+    VALUES (target, role, users)
+    ON CONFLICT (account_id, role_id) DO UPDATE SET
+        user_count = stats.user_count + excluded.user_count;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION users_account_stats() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    -- Users the statement added to (sign 1) or removed from (sign -1) the
+    -- counts of an account. Updates only count users whose account or
+    -- is_active changed
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT id, account_id, is_active, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT id, account_id, is_active, -1 AS sign FROM old_rows'
+        ELSE
+            'WITH moved AS ('
+            '    SELECT new_rows.*, old_rows.account_id AS old_account_id,'
+            '        old_rows.is_active AS old_is_active'
+            '    FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id'
+            '    WHERE old_rows.account_id'
+            '        IS DISTINCT FROM new_rows.account_id'
+            '        OR old_rows.is_active IS DISTINCT FROM new_rows.is_active'
+            ') '
+            'SELECT id, account_id, is_active, 1 AS sign FROM moved '
+            'UNION ALL '
+            'SELECT id, old_account_id, old_is_active, -1 FROM moved'
+    END;
+    EXECUTE
+        'SELECT account_stats_add('
+        '    account_id,'
+        '    sum(sign)::integer,'
+        '    coalesce(sum(sign) FILTER (WHERE is_active), 0)::integer'
+        ') '
+        'FROM (' || changes || ') AS changes GROUP BY account_id';
+    EXECUTE
+        'SELECT account_role_stats_add('
+        '    changes.account_id, user_roles.role_id, sum(sign)::integer'
+        ') '
+        'FROM (' || changes || ') AS changes '
+        'JOIN user_roles ON user_roles.user_id = changes.id '
+        'GROUP BY changes.account_id, user_roles.role_id '
+        'HAVING sum(sign) <> 0';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_roles_account_stats() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT user_id, role_id, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT user_id, role_id, -1 AS sign FROM old_rows'
+        ELSE
+            'SELECT user_id, role_id, 1 AS sign FROM new_rows '
+            'UNION ALL '
+            'SELECT user_id, role_id, -1 FROM old_rows'
+    END;
+    EXECUTE
+        'SELECT account_role_stats_add('
+        '    users.account_id, changes.role_id, sum(sign)::integer'
+        ') '
+        'FROM (' || changes || ') AS changes '
+        'JOIN users ON users.id = changes.user_id '
+        'GROUP BY users.account_id, changes.role_id '
+        'HAVING sum(sign) <> 0';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_account_stats_insert
+    AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE users_account_stats();
+
+CREATE TRIGGER users_account_stats_update
+    AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE users_account_stats();
+
+CREATE TRIGGER users_account_stats_delete
+    AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE users_account_stats();
+
+CREATE TRIGGER user_roles_account_stats_insert
+    AFTER INSERT ON user_roles
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE user_roles_account_stats();
+
+CREATE TRIGGER user_roles_account_stats_update
+    AFTER UPDATE ON user_roles
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE user_roles_account_stats();
+
+CREATE TRIGGER user_roles_account_stats_delete
+    AFTER DELETE ON user_roles
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE user_roles_account_stats();
+"""
+
+
+def upgrade():
+    op.create_table(
+        "account_stats",
+        sa.Column("account_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "user_count", sa.Integer(), server_default="0", nullable=False
+        ),
+        sa.Column(
+            "active_user_count",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+        ),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["account_id"], ["accounts.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("account_id"),
+    )
+    op.create_table(
+        "account_role_stats",
+        sa.Column("account_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("role_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "user_count", sa.Integer(), server_default="0", nullable=False
+        ),
+        sa.ForeignKeyConstraint(
+            ["account_id"], ["accounts.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("account_id", "role_id"),
+    )
+    op.execute(TRIGGERS)
+    # Count the existing users. Creating the triggers locked users and
+    # user_roles against writes until the migration commits, so no user is
+    # counted twice
+    op.execute(
+        "INSERT INTO account_stats "
+        "(account_id, user_count, active_user_count, updated_at) "
+        "SELECT account_id, count(*), count(*) FILTER (WHERE is_active), "
+        "now() AT TIME ZONE 'utc' "
+        "FROM users WHERE account_id IS NOT NULL GROUP BY account_id"
+    )
+    op.execute(
+        "INSERT INTO account_role_stats (account_id, role_id, user_count) "
+        "SELECT users.account_id, user_roles.role_id, count(*) "
+        "FROM users JOIN user_roles ON user_roles.user_id = users.id "
+        "WHERE users.account_id IS NOT NULL "
+        "GROUP BY users.account_id, user_roles.role_id"
+    )
+
+
+def downgrade():
+    for operation in ("insert", "update", "delete"):
+        op.execute(
+            f"DROP TRIGGER user_roles_account_stats_{operation} ON user_roles"
+        )
+        op.execute(f"DROP TRIGGER users_account_stats_{operation} ON users")
+    op.execute("DROP FUNCTION user_roles_account_stats()")
+    op.execute("DROP FUNCTION users_account_stats()")
+    op.execute("DROP FUNCTION account_role_stats_add(uuid, uuid, integer)")
+    op.execute("DROP FUNCTION account_stats_add(uuid, integer, integer)")
+    op.drop_table("account_role_stats")
+    op.drop_table("account_stats")
@@ -0,0 +1,31 @@
+"""Add a unique index on user_roles.user_id
+
+Revision ID: c3f7a9e2d1b6
+Revises: 5e8a1d4c2b7f
+Create Date: 2026-10-18 15:21:09.604112
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3f7a9e2d1b6"
+down_revision = "5e8a1d4c2b7f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fails if a user was assigned more than one role, remove the extra
+    # user_roles rows before upgrading
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_roles_user_id",
+            "user_roles",
+            ["user_id"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_user_roles_user_id", table_name="user_roles")
@@ -0,0 +1,38 @@
+"""Add user search indexes
+
+Revision ID: e1b4d8f2a6c9
+Revises: c3f7a9e2d1b6
+Create Date: 2026-10-18 16:42:51.208416
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e1b4d8f2a6c9"
+down_revision = "c3f7a9e2d1b6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The trigram index is not declared on the model, tables created with
+    # create_all work without pg_trgm. Creating the extension requires a
+    # role allowed to, on managed databases it may have to be enabled by
+    # the provider instead
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+            "ix_users_lower_email_pattern "
+            "ON users (lower(email) text_pattern_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+            "ix_users_lower_full_name_trgm "
+            "ON users USING gin (lower(full_name) gin_trgm_ops)"
+        )
+
+
+def downgrade():
+    op.drop_index("ix_users_lower_full_name_trgm", table_name="users")
+    op.drop_index("ix_users_lower_email_pattern", table_name="users")
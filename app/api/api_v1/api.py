@@ -1,4 +1,11 @@
-from app.api.api_v1.routers import accounts, auth, roles, user_roles, users
+from app.api.api_v1.routers import (
+    accounts,
+    auth,
+    roles,
+    stats,
+    user_roles,
+    users,
+)
 from fastapi import APIRouter
 
 api_router = APIRouter()
@@ -8,3 +15,4 @@ api_router.include_router(users.router)
 api_router.include_router(roles.router)
 api_router.include_router(user_roles.router)
 api_router.include_router(accounts.router)
+api_router.include_router(stats.router)
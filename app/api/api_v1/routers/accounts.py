@@ -1,45 +1,113 @@
-from typing import Any, List
+from typing import Any, FrozenSet, List, Optional
 
 from app import crud, models, schemas
 from app.api import deps
+from app.api.export import ExportFormat, stream_rows
+from app.api.fields import (
+    SparseFields,
+    sparse_item_response,
+    sparse_response,
+)
+from app.api.pagination import set_next_cursor, set_total_count
+from app.api.responses import ORJSONRoute
 from app.constants.role import Role
-from fastapi import APIRouter, Body, Depends, HTTPException, Security
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+    Security,
+)
 from pydantic.types import UUID4
 from sqlalchemy.orm import Session
 
-router = APIRouter(prefix="/accounts", tags=["accounts"])
+router = APIRouter(
+    prefix="/accounts", tags=["accounts"], route_class=ORJSONRoute
+)
 
 
-@router.get("", response_model=List[schemas.Account])
+@router.get("", response_model=List[schemas.AccountWithStats])
 def get_accounts(
     *,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
+    stats: bool = False,
+    fields: Optional[FrozenSet[str]] = Depends(
+        SparseFields(schemas.AccountWithStats)
+    ),
     current_user: models.User = Security(
         deps.get_current_active_user,
         scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
     ),
 ) -> Any:
     """
-    Retrieve all accounts.
+    Retrieve all accounts, or only the fields given in ?fields=.
+    With ?count=true the total is returned in X-Total-Count, with
+    ?stats=true the user counts of each account are included.
     """
-    accounts = crud.account.get_multi(db, skip=skip, limit=limit)
+    accounts = crud.account.get_multi(
+        db,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        fields=fields,
+        with_stats=stats,
+    )
+    set_next_cursor(response, crud.account, accounts, limit)
+    if count:
+        set_total_count(response, crud.account.count(db))
+    if fields:
+        return sparse_response(
+            accounts, schemas.AccountWithStats, fields, response
+        )
     return accounts
 
 
+@router.get("/export")
+def export_accounts(
+    db: Session = Depends(deps.get_db),
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Stream all accounts as NDJSON or CSV.
+    """
+    rows = crud.account.export(db)
+    return stream_rows(
+        rows, crud.account.export_columns, export_format, "accounts"
+    )
+
+
 @router.get("/me", response_model=schemas.Account)
 def get_account_for_user(
     *,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(schemas.Account)),
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    Retrieve account for a logged in user.
+    Retrieve account for a logged in user, or only the fields given in
+    ?fields=.
     """
-    account = crud.account.get(db, id=current_user.account_id)
+    account = crud.account.get(
+        db, id=current_user.account_id, fields=fields
+    )
+    if fields and account:
+        return sparse_item_response(
+            account, schemas.Account, fields, response
+        )
     return account
 
 
@@ -97,9 +165,50 @@ def update_account(
             status_code=404, detail="Account does not exist",
         )
     account = crud.account.update(db, db_obj=account, obj_in=account_in)
+    if not account:
+        raise HTTPException(
+            status_code=404, detail="Account does not exist",
+        )
     return account
 
 
+@router.get("/{account_id}/stats", response_model=schemas.AccountStats)
+def get_account_stats(
+    *,
+    db: Session = Depends(deps.get_db),
+    account_id: UUID4,
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[
+            Role.ADMIN["name"],
+            Role.SUPER_ADMIN["name"],
+            Role.ACCOUNT_ADMIN["name"],
+        ],
+    ),
+) -> Any:
+    """
+    Retrieve user counts of an account, in total, by activity and by role.
+    """
+    if current_user.user_role.role.name == Role.ACCOUNT_ADMIN["name"]:
+        if current_user.account_id != account_id:
+            raise HTTPException(
+                status_code=401,
+                detail=(
+                    "This user does not have the permissions to "
+                    "view this account"
+                ),
+            )
+    stats = crud.account_stats.get(db, account_id=account_id)
+    if stats:
+        return stats
+    # Accounts get stats with their first user
+    if not crud.account.get(db, id=account_id):
+        raise HTTPException(
+            status_code=404, detail="Account does not exist",
+        )
+    return schemas.AccountStats(account_id=account_id)
+
+
 @router.post("/{account_id}/users", response_model=schemas.User)
 def add_user_to_account(
     *,
@@ -123,23 +232,32 @@ def add_user_to_account(
         )
     user_in = schemas.UserUpdate(account_id=account_id)
     updated_user = crud.user.update(db, db_obj=user, obj_in=user_in)
+    if not updated_user:
+        raise HTTPException(
+            status_code=404, detail="User does not exist",
+        )
     return updated_user
 
 
 @router.get("/{account_id}/users", response_model=List[schemas.User])
 def retrieve_users_for_account(
     *,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
     account_id: UUID4,
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(schemas.User)),
     current_user: models.User = Security(
         deps.get_current_active_user,
         scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
     ),
 ) -> Any:
     """
-    Retrieve users for an account.
+    Retrieve users for an account, or only the fields given in ?fields=.
+    With ?count=true the total is returned in X-Total-Count.
     """
     account = crud.account.get(db, id=account_id)
     if not account:
@@ -147,17 +265,33 @@ def retrieve_users_for_account(
             status_code=404, detail="Account does not exist",
         )
     account_users = crud.user.get_by_account_id(
-        db, account_id=account_id, skip=skip, limit=limit
+        db,
+        account_id=account_id,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        fields=fields,
     )
+    set_next_cursor(response, crud.user, account_users, limit)
+    if count:
+        # Kept exact by the account_stats triggers
+        user_count = crud.account_stats.get_user_count(
+            db, account_id=account_id
+        )
+        set_total_count(response, (user_count, True))
+    if fields:
+        return sparse_response(account_users, schemas.User, fields, response)
     return account_users
 
 
 @router.get("/users/me", response_model=List[schemas.Account])
 def retrieve_users_for_own_account(
     *,
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
     current_user: models.User = Security(
         deps.get_current_active_user,
         scopes=[
@@ -176,6 +310,7 @@ def retrieve_users_for_own_account(
             status_code=404, detail="Account does not exist",
         )
     account_users = crud.user.get_by_account_id(
-        db, account_id=account.id, skip=skip, limit=limit
+        db, account_id=account.id, skip=skip, limit=limit, cursor=cursor
     )
+    set_next_cursor(response, crud.user, account_users, limit)
     return account_users
@@ -1,54 +1,166 @@
-from datetime import timedelta
-from typing import Any
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
 
 from app import crud, models, schemas
 from app.api import deps
+from app.api.responses import ORJSONRoute
+from app.constants.role import Role
 from app.core import security
 from app.core.config import settings
-from fastapi import APIRouter, Body, Depends, HTTPException
+from app.core.throttle import login_throttle
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Request,
+    Security,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from jose import jwt
+from pydantic import ValidationError
+from pydantic.types import UUID4
 from sqlalchemy.orm import Session
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(
+    prefix="/auth", tags=["auth"], route_class=ORJSONRoute
+)
 
 
-@router.post("/access-token", response_model=schemas.Token)
-def login_access_token(
-    db: Session = Depends(deps.get_db),
-    form_data: OAuth2PasswordRequestForm = Depends(),
-) -> Any:
-    """
-    OAuth2 compatible token login, get an access token for future requests
-    """
-    user = crud.user.authenticate(
-        db, email=form_data.username, password=form_data.password
-    )
-    if not user:
-        raise HTTPException(
-            status_code=400, detail="Incorrect email or password"
-        )
-    elif not crud.user.is_active(user):
-        raise HTTPException(status_code=400, detail="Inactive user")
-    access_token_expires = timedelta(
-        minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
-    )
+def get_token_payload(user: models.User) -> Dict[str, str]:
     if not user.user_role:
-        role = "GUEST"
+        role = Role.GUEST["name"]
     else:
         role = user.user_role.role.name
-    token_payload = {
+    return {
         "id": str(user.id),
         "role": role,
         "account_id": str(user.account_id),
     }
+
+
+def get_token_response(
+    token_payload: Dict[str, str], refresh_token: str
+) -> Dict[str, str]:
+    access_token_expires = timedelta(
+        minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
     return {
         "access_token": security.create_access_token(
             token_payload, expires_delta=access_token_expires
         ),
         "token_type": "bearer",
+        "refresh_token": refresh_token,
     }
 
 
+@router.post("/access-token", response_model=schemas.Token)
+async def login_access_token(
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    form_data: OAuth2PasswordRequestForm = Depends(),
+) -> Any:
+    """
+    OAuth2 compatible token login, get an access token for future requests
+    """
+    client_ip = login_throttle.client_ip(
+        request.client.host, request.headers.get("X-Forwarded-For")
+    )
+    if settings.LOGIN_THROTTLE_ENABLED:
+        retry_after = login_throttle.check(form_data.username, client_ip)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+    user = await run_in_threadpool(
+        crud.user.get_by_email, db, email=form_data.username
+    )
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await security.verify_and_update_password_async(
+            form_data.password, user.hashed_password
+        )
+    if not verified:
+        raise HTTPException(
+            status_code=400, detail="Incorrect email or password"
+        )
+    if settings.LOGIN_THROTTLE_ENABLED:
+        login_throttle.succeeded(form_data.username, client_ip)
+    if not crud.user.is_active(user):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    user_id = user.id
+    token_payload = get_token_payload(user)
+    if new_hash:
+        await run_in_threadpool(
+            crud.user.rehash_password, db, user=user, hashed_password=new_hash
+        )
+    refresh_token = await run_in_threadpool(
+        crud.refresh_token.issue, db, user_id=user_id
+    )
+    return get_token_response(token_payload, refresh_token)
+
+
+@router.post("/refresh", response_model=schemas.Token)
+def refresh_access_token(
+    db: Session = Depends(deps.get_db),
+    refresh_token: str = Body(..., embed=True),
+) -> Any:
+    """
+    Exchange a refresh token for a new access token and refresh token
+    """
+    invalid_token_exception = HTTPException(
+        status_code=401, detail="Invalid refresh token"
+    )
+    db_token = crud.refresh_token.get_by_token(db, token=refresh_token)
+    if not db_token or db_token.expires_at <= datetime.utcnow():
+        raise invalid_token_exception
+    if db_token.revoked_at is not None:
+        # A rotated token was presented again, treat the family as stolen
+        crud.refresh_token.revoke_family(db, family_id=db_token.family_id)
+        raise invalid_token_exception
+    if not crud.user.is_active(db_token.user):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    # Claims are read before rotating as the commit expires the user
+    token_payload = get_token_payload(db_token.user)
+    new_refresh_token = crud.refresh_token.rotate(db, db_obj=db_token)
+    if new_refresh_token is None:
+        crud.refresh_token.revoke_family(db, family_id=db_token.family_id)
+        raise invalid_token_exception
+    return get_token_response(token_payload, new_refresh_token)
+
+
+@router.post("/revoke", response_model=schemas.Msg)
+def revoke_refresh_tokens(
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Revoke all refresh tokens of the current user
+    """
+    revoked = crud.refresh_token.revoke_for_user(db, user_id=current_user.id)
+    return {"msg": f"Revoked {revoked} refresh tokens"}
+
+
+@router.post("/revoke/{user_id}", response_model=schemas.Msg)
+def revoke_user_refresh_tokens(
+    user_id: UUID4,
+    db: Session = Depends(deps.get_db),
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Revoke all refresh tokens of a user
+    """
+    revoked = crud.refresh_token.revoke_for_user(db, user_id=user_id)
+    return {"msg": f"Revoked {revoked} refresh tokens"}
+
+
 @router.post("/test-token", response_model=schemas.User)
 def test_token(
     current_user: models.User = Depends(deps.get_current_user),
@@ -59,9 +171,52 @@ def test_token(
     return current_user
 
 
+@router.post("/introspect", response_model=List[schemas.TokenIntrospection])
+def introspect_tokens(
+    *,
+    db: Session = Depends(deps.get_db),
+    introspection_in: schemas.TokenIntrospectionRequest,
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Validate a batch of access tokens, in the order they were given.
+    A token is active if it verifies and its user exists and is active.
+    The role and account are the user's current ones, not the claims.
+    """
+    token_data = []
+    for token in introspection_in.tokens:
+        try:
+            token_data.append(deps.decode_token(token))
+        except (jwt.JWTError, ValidationError):
+            token_data.append(None)
+    principals = deps.get_principals(
+        db, [data.id for data in token_data if data is not None]
+    )
+    introspections = []
+    for data in token_data:
+        principal = principals.get(data.id) if data is not None else None
+        if principal is None or not principal.is_active:
+            introspections.append({"active": False})
+            continue
+        introspections.append(
+            {
+                "active": True,
+                "id": data.id,
+                # Same fallback as the token claims
+                "role": principal.role_name or Role.GUEST["name"],
+                "account_id": principal.account_id,
+                "exp": data.exp,
+            }
+        )
+    return introspections
+
+
 @router.post("/hash-password", response_model=str)
-def hash_password(password: str = Body(..., embed=True),) -> Any:
+async def hash_password(password: str = Body(..., embed=True),) -> Any:
     """
     Hash a password
     """
-    return security.get_password_hash(password)
+    return await security.get_password_hash_async(password)
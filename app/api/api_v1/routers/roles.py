@@ -2,18 +2,33 @@ from typing import Any, List
 
 from app import crud, schemas
 from app.api import deps
-from fastapi import APIRouter, Depends
+from app.api.pagination import set_next_cursor
+from app.api.responses import ORJSONRoute
+from fastapi import APIRouter, Depends, Header, Response
 from sqlalchemy.orm import Session
 
-router = APIRouter(prefix="/roles", tags=["roles"])
+router = APIRouter(
+    prefix="/roles", tags=["roles"], route_class=ORJSONRoute
+)
 
 
 @router.get("/", response_model=List[schemas.Role])
 def get_roles(
-    db: Session = Depends(deps.get_db), skip: int = 0, limit: int = 100,
+    response: Response,
+    db: Session = Depends(deps.get_db),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    if_none_match: str = Header(None),
 ) -> Any:
     """
     Retrieve all available user roles.
     """
-    roles = crud.role.get_multi(db, skip=skip, limit=limit)
+    catalog = crud.role.get_catalog(db)
+    if if_none_match == catalog.etag:
+        return Response(status_code=304, headers={"ETag": catalog.etag})
+    after = crud.role.decode_keyset(cursor)[0] if cursor else None
+    roles = catalog.page(skip=skip, limit=limit, after=after)
+    set_next_cursor(response, crud.role, roles, limit)
+    response.headers["ETag"] = catalog.etag
     return roles
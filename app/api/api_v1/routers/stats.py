@@ -0,0 +1,83 @@
+from typing import Any, Dict
+
+from app import models
+from app.api import deps
+from app.api.responses import ORJSONRoute
+from app.constants.role import Role
+from app.core.cache import (
+    count_cache,
+    principal_cache,
+    rejected_token_cache,
+    token_cache,
+)
+from app.core.hashing import bulk_password_hasher, password_hasher
+from app.core.role_catalog import role_catalog
+from app.core.throttle import login_throttle
+from app.db.pool import pool_metrics
+from fastapi import APIRouter, Security
+
+router = APIRouter(
+    prefix="/stats", tags=["stats"], route_class=ORJSONRoute
+)
+
+
+@router.get("/caches", response_model=Dict[str, Dict[str, Any]])
+def get_cache_stats(
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Retrieve hit, miss and eviction counters of the in-process caches.
+    """
+    return {
+        "principal": principal_cache.stats(),
+        "token": token_cache.stats(),
+        "rejected_token": rejected_token_cache.stats(),
+        "count": count_cache.stats(),
+        "role_catalog": role_catalog.stats(),
+    }
+
+
+@router.get("/hashing", response_model=Dict[str, Any])
+def get_hashing_stats(
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Retrieve queue depth and latency of the password hashing pools.
+    """
+    return {
+        "password": password_hasher.stats(),
+        "bulk_password": bulk_password_hasher.stats(),
+    }
+
+
+@router.get("/login-throttle", response_model=Dict[str, Any])
+def get_login_throttle_stats(
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Retrieve allowed and throttled login attempt counters.
+    """
+    return login_throttle.stats()
+
+
+@router.get("/db-pool", response_model=Dict[str, Dict[str, Any]])
+def get_db_pool_stats(
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Retrieve checked out, idle and overflow connections, checkout wait
+    times and timeouts of the database connection pools.
+    """
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
@@ -1,13 +1,17 @@
-from typing import Any
+from typing import Any, List
 
 from app import crud, models, schemas
-from app.api import deps
+from app.api import bulk, deps
+from app.api.responses import ORJSONRoute
 from app.constants.role import Role
-from fastapi import APIRouter, Depends, HTTPException, Security
+from app.core.config import settings
+from fastapi import APIRouter, Body, Depends, HTTPException, Security
 from pydantic.types import UUID4
 from sqlalchemy.orm import Session
 
-router = APIRouter(prefix="/user-roles", tags=["user-roles"])
+router = APIRouter(
+    prefix="/user-roles", tags=["user-roles"], route_class=ORJSONRoute
+)
 
 
 @router.post("", response_model=schemas.UserRole)
@@ -30,6 +34,66 @@ def assign_user_role(
     return user_role
 
 
+@router.post("/bulk", response_model=List[schemas.BulkItemResult])
+def assign_user_roles_bulk(
+    *,
+    db: Session = Depends(deps.get_db),
+    user_roles_in: List[schemas.UserRoleCreate] = Body(...),
+    current_user: models.User = Security(
+        deps.get_current_active_user,
+        scopes=[
+            Role.ADMIN["name"],
+            Role.SUPER_ADMIN["name"],
+            Role.ACCOUNT_ADMIN["name"],
+        ],
+    ),
+) -> Any:
+    """
+    Assign or change the roles of many users in one transaction.
+    Account admins can only change the users of their own account, to
+    roles up to their own. Returns the outcome of every item.
+    """
+    if len(user_roles_in) > settings.BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.BULK_MAX_ROWS} rows per request",
+        )
+    user_ids = [item.user_id for item in user_roles_in if item.user_id]
+    catalog = crud.role.get_catalog(db)
+    existing_role_ids = set(catalog.ids())
+    assignable_role_ids = None
+    role_name = current_user.user_role.role.name
+    if role_name == Role.ACCOUNT_ADMIN["name"]:
+        # Users of other accounts are reported as not existing
+        existing_user_ids = (
+            crud.user.get_existing_ids(
+                db, ids=user_ids, account_id=current_user.account_id
+            )
+            if current_user.account_id
+            else set()
+        )
+        ranks = Role.RANKS[: Role.RANKS.index(role_name) + 1]
+        assignable_role_ids = {
+            role.id
+            for role in map(catalog.get_by_name, ranks)
+            if role is not None
+        }
+    else:
+        existing_user_ids = crud.user.get_existing_ids(db, ids=user_ids)
+    current_role_ids = crud.user_role.get_role_ids_by_user_ids(
+        db, user_ids=list(existing_user_ids)
+    )
+    results, changes = bulk.select_user_role_changes(
+        user_roles_in,
+        existing_user_ids,
+        existing_role_ids,
+        current_role_ids,
+        assignable_role_ids,
+    )
+    crud.user_role.upsert_multi(db, objs_in=changes)
+    return results
+
+
 @router.put("/{user_id}", response_model=schemas.UserRole)
 def update_user_role(
     *,
@@ -56,4 +120,8 @@ def update_user_role(
     user_role = crud.user_role.update(
         db, db_obj=user_role, obj_in=user_role_in
     )
+    if not user_role:
+        raise HTTPException(
+            status_code=404, detail="There is no role assigned to this user",
+        )
     return user_role
@@ -1,110 +1,257 @@
-from typing import Any, List
+from typing import Any, FrozenSet, List, Optional
 
 from app import crud, models, schemas
-from app.api import deps
+from app.api import bulk, deps
+from app.api.export import ExportFormat, stream_partitions, stream_rows
+from app.api.fields import (
+    SparseFields,
+    sparse_item_response,
+    sparse_response,
+)
+from app.api.pagination import set_next_cursor, set_total_count
+from app.api.responses import ORJSONRoute
 from app.constants.role import Role
+from app.core import security
 from app.core.config import settings
-from fastapi import APIRouter, Body, Depends, HTTPException, Security
-from fastapi.encoders import jsonable_encoder
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    Security,
+)
 from pydantic.networks import EmailStr
 from pydantic.types import UUID4
-from sqlalchemy.orm import Session
 
-router = APIRouter(prefix="/users", tags=["users"])
+# Served from an AsyncSession when settings.ASYNC_DB is set, see
+# deps.run_crud
+
+router = APIRouter(
+    prefix="/users", tags=["users"], route_class=ORJSONRoute
+)
 
 
 @router.get("", response_model=List[schemas.User])
-def read_users(
-    db: Session = Depends(deps.get_db),
+async def read_users(
+    response: Response,
+    db: Any = Depends(deps.get_session_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(schemas.User)),
     current_user: models.User = Security(
-        deps.get_current_active_user,
+        deps.get_session_active_user,
         scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
     ),
 ) -> Any:
     """
-    Retrieve all users.
+    Retrieve all users, or only the fields given in ?fields=.
+    With ?count=true the total is returned in X-Total-Count.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit,)
+    users = await deps.run_crud(
+        crud.user.get_multi,
+        db,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        fields=fields,
+    )
+    set_next_cursor(response, crud.user, users, limit)
+    if count:
+        set_total_count(response, await deps.run_crud(crud.user.count, db))
+    if fields:
+        return sparse_response(users, schemas.User, fields, response)
     return users
 
 
+@router.get("/export")
+async def export_users(
+    db: Any = Depends(deps.get_session_db),
+    account_id: UUID4 = None,
+    export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+    current_user: models.User = Security(
+        deps.get_session_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Stream all users, or the users of an account, as NDJSON or CSV.
+    """
+    rows = await deps.run_crud(crud.user.export, db, account_id=account_id)
+    if settings.ASYNC_DB:
+        return stream_partitions(
+            rows, crud.user.export_columns, export_format, "users"
+        )
+    return stream_rows(
+        rows, crud.user.export_columns, export_format, "users"
+    )
+
+
+@router.get("/search", response_model=List[schemas.User])
+async def search_users(
+    db: Any = Depends(deps.get_session_db),
+    q: str = Query(..., min_length=3, max_length=100),
+    account_id: UUID4 = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: models.User = Security(
+        deps.get_session_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Find users by email prefix or full name substring, optionally within
+    an account.
+    """
+    return await deps.run_crud(
+        crud.user.search, db, q=q, account_id=account_id, limit=limit
+    )
+
+
 @router.post("", response_model=schemas.User)
-def create_user(
+async def create_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Any = Depends(deps.get_session_db),
     user_in: schemas.UserCreate,
     current_user: models.User = Security(
-        deps.get_current_active_user,
+        deps.get_session_active_user,
         scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
     ),
 ) -> Any:
     """
     Create new user.
     """
-    user = crud.user.get_by_email(db, email=user_in.email)
+    user = await deps.run_crud(
+        crud.user.get_by_email, db, email=user_in.email
+    )
     if user:
         raise HTTPException(
             status_code=409,
             detail="The user with this username already exists in the system.",
         )
-    user = crud.user.create(db, obj_in=user_in)
+    hashed_password = await security.get_password_hash_async(user_in.password)
+    user = await deps.run_crud(
+        crud.user.create, db, obj_in=user_in, hashed_password=hashed_password
+    )
     return user
 
 
+@router.post("/bulk", response_model=List[schemas.BulkItemResult])
+async def create_users_bulk(
+    *,
+    request: Request,
+    db: Any = Depends(deps.get_session_db),
+    current_user: models.User = Security(
+        deps.get_session_active_user,
+        scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
+    ),
+) -> Any:
+    """
+    Create users from a JSON array or a CSV file of UserCreate fields.
+    Returns the outcome of every row.
+    """
+    rows = await bulk.read_rows(
+        request, max_rows=settings.BULK_IMPORT_MAX_ROWS
+    )
+    results, users_in = bulk.validate_rows(rows, schemas.UserCreate)
+    emails = [user_in.email for _, user_in in users_in]
+    phone_numbers = [user_in.phone_number for _, user_in in users_in]
+    account_ids = [user_in.account_id for _, user_in in users_in]
+    existing_emails = await deps.run_crud(
+        crud.user.get_existing_emails, db, emails=emails
+    )
+    existing_phone_numbers = await deps.run_crud(
+        crud.user.get_existing_phone_numbers,
+        db,
+        phone_numbers=list(filter(None, phone_numbers)),
+    )
+    existing_account_ids = await deps.run_crud(
+        crud.account.get_existing_ids, db, ids=list(filter(None, account_ids))
+    )
+    new_users = bulk.select_new_users(
+        results,
+        users_in,
+        existing_emails,
+        existing_phone_numbers,
+        existing_account_ids,
+    )
+    hashed_passwords = await security.get_password_hashes_async(
+        [user_in.password for _, user_in in new_users.values()]
+    )
+    objs_in = [
+        (user_in, hashed_password)
+        for (_, user_in), hashed_password in zip(
+            new_users.values(), hashed_passwords
+        )
+    ]
+    created = await deps.run_crud(
+        crud.user.create_multi, db, objs_in=objs_in
+    )
+    taken_emails = set()
+    if len(created) < len(new_users):
+        # Tell the emails from the phone numbers taken since the checks
+        taken_emails = await deps.run_crud(
+            crud.user.get_existing_emails,
+            db,
+            emails=[email for email in new_users if email not in created],
+        )
+    bulk.record_created_users(results, new_users, created, taken_emails)
+    return [results[row] for row in range(len(rows))]
+
+
 @router.put("/me", response_model=schemas.User)
-def update_user_me(
+async def update_user_me(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Any = Depends(deps.get_session_db),
     full_name: str = Body(None),
     phone_number: str = Body(None),
     email: EmailStr = Body(None),
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: models.User = Depends(deps.get_session_active_user),
 ) -> Any:
     """
     Update own user.
     """
-    current_user_data = jsonable_encoder(current_user)
-    user_in = schemas.UserUpdate(**current_user_data)
+    user_in = schemas.UserUpdate()
     if phone_number is not None:
         user_in.phone_number = phone_number
     if full_name is not None:
         user_in.full_name = full_name
     if email is not None:
         user_in.email = email
-    user = crud.user.update(db, db_obj=current_user, obj_in=user_in)
+    user = await deps.run_crud(
+        crud.user.update, db, db_obj=current_user, obj_in=user_in
+    )
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="The user with this username does not exist in the system",
+        )
     return user
 
 
 @router.get("/me", response_model=schemas.User)
-def read_user_me(
-    db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user),
+async def read_user_me(
+    response: Response,
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(schemas.User)),
+    current_user: models.User = Depends(deps.get_session_active_user),
 ) -> Any:
     """
-    Get current user.
+    Get current user, or only the fields given in ?fields=.
     """
-    if not current_user.user_role:
-        role = None
-    else:
-        role = current_user.user_role.role.name
-    user_data = schemas.User(
-        id=current_user.id,
-        email=current_user.email,
-        is_active=current_user.is_active,
-        full_name=current_user.full_name,
-        created_at=current_user.created_at,
-        updated_at=current_user.updated_at,
-        role=role,
-    )
-    return user_data
+    if fields:
+        return sparse_item_response(
+            current_user, schemas.User, fields, response
+        )
+    return current_user
 
 
 @router.post("/open", response_model=schemas.User)
-def create_user_open(
+async def create_user_open(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Any = Depends(deps.get_session_db),
     password: str = Body(...),
     email: EmailStr = Body(...),
     full_name: str = Body(...),
@@ -118,7 +265,7 @@ def create_user_open(
             status_code=403,
             detail="Open user registration is forbidden on this server",
         )
-    user = crud.user.get_by_email(db, email=email)
+    user = await deps.run_crud(crud.user.get_by_email, db, email=email)
     if user:
         raise HTTPException(
             status_code=409,
@@ -130,45 +277,59 @@ def create_user_open(
         full_name=full_name,
         phone_number=phone_number,
     )
-    user = crud.user.create(db, obj_in=user_in)
+    hashed_password = await security.get_password_hash_async(password)
+    user = await deps.run_crud(
+        crud.user.create, db, obj_in=user_in, hashed_password=hashed_password
+    )
     return user
 
 
 @router.get("/{user_id}", response_model=schemas.User)
-def read_user_by_id(
+async def read_user_by_id(
     user_id: UUID4,
+    response: Response,
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(schemas.User)),
     current_user: models.User = Security(
-        deps.get_current_active_user,
+        deps.get_session_active_user,
         scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
     ),
-    db: Session = Depends(deps.get_db),
+    db: Any = Depends(deps.get_session_db),
 ) -> Any:
     """
-    Get a specific user by id.
+    Get a specific user by id, or only the fields given in ?fields=.
     """
-    user = crud.user.get(db, id=user_id)
+    user = await deps.run_crud(crud.user.get, db, id=user_id, fields=fields)
+    if fields and user:
+        return sparse_item_response(user, schemas.User, fields, response)
     return user
 
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(
+async def update_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: Any = Depends(deps.get_session_db),
     user_id: UUID4,
     user_in: schemas.UserUpdate,
     current_user: models.User = Security(
-        deps.get_current_active_user,
+        deps.get_session_active_user,
         scopes=[Role.ADMIN["name"], Role.SUPER_ADMIN["name"]],
     ),
 ) -> Any:
     """
     Update a user.
     """
-    user = crud.user.get(db, id=user_id)
+    user = await deps.run_crud(crud.user.get, db, id=user_id)
+    if not user:
+        raise HTTPException(
+            status_code=404,
+            detail="The user with this username does not exist in the system",
+        )
+    user = await deps.run_crud(
+        crud.user.update, db, db_obj=user, obj_in=user_in
+    )
     if not user:
         raise HTTPException(
             status_code=404,
             detail="The user with this username does not exist in the system",
         )
-    user = crud.user.update(db, db_obj=user, obj_in=user_in)
     return user
@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple, Type, TypeVar
+
+from app.core.config import settings
+from app.schemas.bulk import BulkItemResult
+from app.schemas.user import UserCreate
+from app.schemas.user_role import UserRoleCreate
+from fastapi import HTTPException, Request
+from pydantic import UUID4, BaseModel, ValidationError
+
+SchemaType = TypeVar("SchemaType", bound=BaseModel)
+
+
+async def read_rows(
+    request: Request, max_rows: int = None
+) -> List[Dict[str, Any]]:
+    """
+    Read the rows of a bulk request body, either a JSON array of objects
+    or, with a text/csv content type, CSV with a header line. Bodies of
+    more than max_rows rows, settings.BULK_MAX_ROWS by default, are
+    rejected.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        try:
+            text = body.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+        # Empty cells are missing values, not empty strings
+        rows = [
+            {key: value for key, value in row.items() if value}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(rows, list) or not all(
+            isinstance(row, dict) for row in rows
+        ):
+            raise HTTPException(
+                status_code=422, detail="Expected an array of objects"
+            )
+    if max_rows is None:
+        max_rows = settings.BULK_MAX_ROWS
+    if len(rows) > max_rows:
+        raise HTTPException(
+            status_code=413, detail=f"At most {max_rows} rows per request",
+        )
+    return rows
+
+
+def validate_rows(
+    rows: List[Dict[str, Any]], schema: Type[SchemaType]
+) -> Tuple[Dict[int, BulkItemResult], List[Tuple[int, SchemaType]]]:
+    """
+    Validate every row against schema.
+
+    :return: Results of the invalid rows by row number, and the valid rows
+             with their row numbers
+    """
+    results = {}
+    valid = []
+    for row, data in enumerate(rows):
+        # csv.DictReader keeps the cells past the header under None
+        if None in data:
+            results[row] = BulkItemResult(
+                row=row, status="invalid", detail="Too many columns"
+            )
+            continue
+        try:
+            valid.append((row, schema(**data)))
+        except ValidationError as e:
+            results[row] = BulkItemResult(
+                row=row, status="invalid", detail=str(e)
+            )
+    return results, valid
+
+
+def select_new_users(
+    results: Dict[int, BulkItemResult],
+    users_in: List[Tuple[int, UserCreate]],
+    existing_emails: Set[str],
+    existing_phone_numbers: Set[str],
+    existing_account_ids: Set[UUID4],
+) -> Dict[str, Tuple[int, UserCreate]]:
+    """
+    Record the rows whose email or phone number is taken or repeated, or
+    whose account does not exist, and return the remaining rows by email.
+    """
+    new_users: Dict[str, Tuple[int, UserCreate]] = {}
+    phone_numbers = set(existing_phone_numbers)
+    for row, user_in in users_in:
+        if user_in.email in existing_emails or user_in.email in new_users:
+            results[row] = BulkItemResult(
+                row=row, status="duplicate", detail="Email already exists"
+            )
+        elif user_in.phone_number in phone_numbers:
+            results[row] = BulkItemResult(
+                row=row,
+                status="duplicate",
+                detail="Phone number already exists",
+            )
+        elif (
+            user_in.account_id
+            and user_in.account_id not in existing_account_ids
+        ):
+            results[row] = BulkItemResult(
+                row=row, status="invalid", detail="Account does not exist"
+            )
+        else:
+            new_users[user_in.email] = (row, user_in)
+            if user_in.phone_number:
+                phone_numbers.add(user_in.phone_number)
+    return new_users
+
+
+def record_created_users(
+    results: Dict[int, BulkItemResult],
+    new_users: Dict[str, Tuple[int, UserCreate]],
+    created: Dict[str, UUID4],
+    taken_emails: Set[str],
+) -> None:
+    """
+    Record the outcome of the inserted rows. Rows left out of created were
+    taken meanwhile, by their email if it is in taken_emails and by their
+    phone number otherwise.
+    """
+    for email, (row, _) in new_users.items():
+        if email in created:
+            results[row] = BulkItemResult(
+                row=row, status="created", id=created[email]
+            )
+        elif email in taken_emails:
+            results[row] = BulkItemResult(
+                row=row, status="duplicate", detail="Email already exists"
+            )
+        else:
+            results[row] = BulkItemResult(
+                row=row,
+                status="duplicate",
+                detail="Phone number already exists",
+            )
+
+
+def select_user_role_changes(
+    user_roles_in: List[UserRoleCreate],
+    existing_user_ids: Set[UUID4],
+    existing_role_ids: Set[UUID4],
+    current_role_ids: Dict[UUID4, UUID4],
+    assignable_role_ids: Optional[Set[UUID4]] = None,
+) -> Tuple[List[BulkItemResult], List[UserRoleCreate]]:
+    """
+    Sort role assignments into the ones to apply and the ones that are
+    invalid, repeated or already in place. With assignable_role_ids, only
+    users holding one of those roles, or none, can be given one of them.
+
+    :return: The result of every row and the assignments to apply
+    """
+    results = []
+    changes = []
+    seen_user_ids = set()
+    for row, user_role_in in enumerate(user_roles_in):
+        user_id, role_id = user_role_in.user_id, user_role_in.role_id
+        detail = None
+        if user_id not in existing_user_ids:
+            status, detail = "invalid", "User does not exist"
+        elif role_id not in existing_role_ids:
+            status, detail = "invalid", "Role does not exist"
+        elif assignable_role_ids is not None and (
+            role_id not in assignable_role_ids
+            or current_role_ids.get(user_id, role_id)
+            not in assignable_role_ids
+        ):
+            status, detail = "invalid", "Role is above the caller's role"
+        elif user_id in seen_user_ids:
+            status, detail = "duplicate", "User repeated in the request"
+        elif current_role_ids.get(user_id) == role_id:
+            status = "unchanged"
+        else:
+            status = "updated" if user_id in current_role_ids else "created"
+            changes.append(user_role_in)
+        if user_id in existing_user_ids:
+            seen_user_ids.add(user_id)
+        results.append(
+            BulkItemResult(row=row, status=status, id=user_id, detail=detail)
+        )
+    return results, changes
@@ -1,16 +1,41 @@
+import hashlib
 import logging
-from typing import Generator
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    NamedTuple,
+    Optional,
+)
 
 from app import crud, models, schemas
 from app.constants.role import Role
 from app.core import security
+from app.core.cache import (
+    principal_cache,
+    rejected_token_cache,
+    token_cache,
+)
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal, SessionLocal
+from app.models.role import Role as RoleModel
+from app.models.user_role import UserRole
 from fastapi import Depends, HTTPException, Security, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jose import jwt
-from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from pydantic import UUID4, ValidationError
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+if TYPE_CHECKING or settings.ASYNC_DB:
+    # FastAPI resolves the annotation of get_current_user_async's db
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/access-token",
@@ -35,41 +60,146 @@ def get_db() -> Generator:
         db.close()
 
 
-def get_current_user(
-    security_scopes: SecurityScopes,
-    db: Session = Depends(get_db),
-    token: str = Depends(reusable_oauth2),
+class CachedPrincipal(NamedTuple):
+    """
+    Column values of an authenticated user, its user role and role
+    """
+
+    user: Dict[str, Any]
+    user_role: Optional[Dict[str, Any]]
+    role: Optional[Dict[str, Any]]
+    is_active: bool
+    account_id: Optional[UUID4]
+    role_name: Optional[str]
+
+
+def _column_values(obj: Any) -> Dict[str, Any]:
+    return {
+        attr.key: getattr(obj, attr.key)
+        for attr in inspect(obj).mapper.column_attrs
+    }
+
+
+def _cache_principal(user: models.User) -> CachedPrincipal:
+    user_role = user.user_role
+    role = user_role.role if user_role else None
+    principal = CachedPrincipal(
+        user=_column_values(user),
+        user_role=_column_values(user_role) if user_role else None,
+        role=_column_values(role) if role else None,
+        is_active=user.is_active,
+        account_id=user.account_id,
+        role_name=role.name if role else None,
+    )
+    principal_cache.set(user.id, principal)
+    return principal
+
+
+def get_principals(
+    db: Session, user_ids: Iterable[UUID4]
+) -> Dict[UUID4, CachedPrincipal]:
+    """
+    Resolve principals from the cache, loading all missing users in a
+    single query. Unknown user ids are left out of the result.
+    """
+    principals = {}
+    missing_ids = []
+    for user_id in set(user_ids):
+        principal = principal_cache.get(user_id)
+        if principal is None:
+            missing_ids.append(user_id)
+        else:
+            principals[user_id] = principal
+    if missing_ids:
+        for user in crud.user.get_multi_by_ids(db, ids=missing_ids):
+            principals[user.id] = _cache_principal(user)
+    return principals
+
+
+def _restore_principal(
+    db: Session, principal: CachedPrincipal
 ) -> models.User:
+    """
+    Rebuild the cached user as a persistent instance of the given session
+    without querying the database.
+    """
+    user = models.User(**principal.user)
+    user.user_role = None
+    if principal.user_role is not None:
+        user.user_role = UserRole(**principal.user_role)
+        user.user_role.role = RoleModel(**principal.role)
+        make_transient_to_detached(user.user_role.role)
+        make_transient_to_detached(user.user_role)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+def decode_token(token: str) -> Optional[schemas.TokenPayload]:
+    """
+    Verify an access token and validate its payload. Returns None when the
+    token carries no user id, raises jwt.JWTError or ValidationError when it
+    is invalid. Repeated tokens are answered from the token caches.
+    """
+    token_key = hashlib.sha256(token.encode()).digest()
+    token_data = token_cache.get(token_key)
+    if token_data is not None:
+        return token_data
+    if rejected_token_cache.get(token_key) is not None:
+        raise jwt.JWTError("Token recently failed verification")
+    try:
+        payload = security.decode_access_token(token)
+        if payload.get("id") is None:
+            return None
+        token_data = schemas.TokenPayload(**payload)
+    except (jwt.JWTError, ValidationError):
+        rejected_token_cache.set(token_key, True)
+        raise
+    ttl = None
+    if "exp" in payload:
+        ttl = min(payload["exp"] - time.time(), token_cache.ttl)
+    token_cache.set(token_key, token_data, ttl=ttl)
+    return token_data
+
+
+def _authenticate_value(security_scopes: SecurityScopes) -> str:
     if security_scopes.scopes:
-        authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
-    else:
-        authenticate_value = "Bearer"
-    credentials_exception = HTTPException(
+        return f'Bearer scope="{security_scopes.scope_str}"'
+    return "Bearer"
+
+
+def _credentials_exception(security_scopes: SecurityScopes) -> HTTPException:
+    return HTTPException(
         status_code=401,
         detail="Could not validate credentials",
-        headers={"WWW-Authenticate": authenticate_value},
+        headers={"WWW-Authenticate": _authenticate_value(security_scopes)},
     )
+
+
+def _verify_token(
+    security_scopes: SecurityScopes, token: str
+) -> schemas.TokenPayload:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        if payload.get("id") is None:
-            raise credentials_exception
-        token_data = schemas.TokenPayload(**payload)
+        token_data = decode_token(token)
     except (jwt.JWTError, ValidationError):
         logger.error("Error Decoding Token", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = crud.user.get(db, id=token_data.id)
-    if not user:
-        raise credentials_exception
+    if token_data is None:
+        raise _credentials_exception(security_scopes)
+    return token_data
+
+
+def _check_scopes(
+    security_scopes: SecurityScopes, token_data: schemas.TokenPayload
+) -> None:
     if security_scopes.scopes and not token_data.role:
         raise HTTPException(
             status_code=401,
             detail="Not enough permissions",
-            headers={"WWW-Authenticate": authenticate_value},
+            headers={"WWW-Authenticate": _authenticate_value(security_scopes)},
         )
     if (
         security_scopes.scopes
@@ -78,8 +208,25 @@ def get_current_user(
         raise HTTPException(
             status_code=401,
             detail="Not enough permissions",
-            headers={"WWW-Authenticate": authenticate_value},
+            headers={"WWW-Authenticate": _authenticate_value(security_scopes)},
         )
+
+
+def get_current_user(
+    security_scopes: SecurityScopes,
+    db: Session = Depends(get_db),
+    token: str = Depends(reusable_oauth2),
+) -> models.User:
+    token_data = _verify_token(security_scopes, token)
+    principal = principal_cache.get(token_data.id)
+    if principal is not None:
+        user = _restore_principal(db, principal)
+    else:
+        user = crud.user.get(db, id=token_data.id)
+        if not user:
+            raise _credentials_exception(security_scopes)
+        _cache_principal(user)
+    _check_scopes(security_scopes, token_data)
     return user
 
 
@@ -89,3 +236,56 @@ def get_current_active_user(
     if not crud.user.is_active(current_user):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_async_db() -> AsyncGenerator:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_current_user_async(
+    security_scopes: SecurityScopes,
+    db: "AsyncSession" = Depends(get_async_db),
+    token: str = Depends(reusable_oauth2),
+) -> models.User:
+    token_data = _verify_token(security_scopes, token)
+    principal = principal_cache.get(token_data.id)
+    if principal is not None:
+        user = _restore_principal(db, principal)
+    else:
+        user = await crud.user.get_async(db, id=token_data.id)
+        if not user:
+            raise _credentials_exception(security_scopes)
+        _cache_principal(user)
+    _check_scopes(security_scopes, token_data)
+    return user
+
+
+async def get_current_active_user_async(
+    current_user: models.User = Security(get_current_user_async, scopes=[],),
+) -> models.User:
+    if not crud.user.is_active(current_user):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
+# Session and user of the routes served from an AsyncSession when
+# settings.ASYNC_DB is set, and from a Session otherwise, see run_crud
+get_session_db = get_async_db if settings.ASYNC_DB else get_db
+get_session_active_user = (
+    get_current_active_user_async
+    if settings.ASYNC_DB
+    else get_current_active_user
+)
+
+
+async def run_crud(method: Callable[..., Any], db: Any, **kwargs: Any) -> Any:
+    """
+    Call a CRUD method with a session of get_session_db. Its _async
+    counterpart is awaited on an AsyncSession, otherwise it runs in the
+    threadpool.
+    """
+    if settings.ASYNC_DB:
+        method = getattr(method.__self__, f"{method.__name__}_async")
+        return await method(db, **kwargs)
+    return await run_in_threadpool(method, db, **kwargs)
@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import Any, FrozenSet, List, Optional, Type, get_type_hints
+
+from app.api.responses import ORJSONResponse
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel, create_model
+
+
+class SparseFields:
+    def __init__(self, schema: Type[BaseModel]):
+        """Dependency parsing the comma separated ?fields= of a read
+           endpoint into the set of requested fields of schema, or None
+           when every field is requested.
+
+        :param schema: The response schema of the endpoint
+        :type schema: Type[BaseModel]
+        """
+        self.schema = schema
+
+    def __call__(
+        self,
+        fields: str = Query(
+            None, description="Comma separated fields to return"
+        ),
+    ) -> Optional[FrozenSet[str]]:
+        if fields is None:
+            return None
+        selected = frozenset(
+            field.strip() for field in fields.split(",") if field.strip()
+        )
+        if not selected:
+            raise HTTPException(status_code=400, detail="No fields requested")
+        unknown = selected - set(self.schema.__fields__)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+        return selected
+
+
+@lru_cache()
+def sparse_schema(
+    schema: Type[BaseModel], fields: FrozenSet[str]
+) -> Type[BaseModel]:
+    """
+    A schema with only the given fields of schema.
+    """
+    hints = get_type_hints(schema)
+    return create_model(  # type: ignore
+        f"Sparse{schema.__name__}",
+        __config__=schema.__config__,
+        **{
+            name: (hints[name], field.default)
+            for name, field in schema.__fields__.items()
+            if name in fields
+        },
+    )
+
+
+def sparse_response(
+    items: List[Any],
+    schema: Type[BaseModel],
+    fields: FrozenSet[str],
+    response: Response,
+) -> ORJSONResponse:
+    """
+    Serialize only fields of items, without reading the columns that
+    CRUDBase.load_options left unloaded. Keeps the headers already set on
+    the endpoint's response.
+    """
+    model = sparse_schema(schema, fields)
+    return _with_headers(
+        ORJSONResponse([model.from_orm(item) for item in items]), response
+    )
+
+
+def sparse_item_response(
+    item: Any,
+    schema: Type[BaseModel],
+    fields: FrozenSet[str],
+    response: Response,
+) -> ORJSONResponse:
+    """
+    Like sparse_response for the single item of a read endpoint.
+    """
+    model = sparse_schema(schema, fields)
+    return _with_headers(ORJSONResponse(model.from_orm(item)), response)
+
+
+def _with_headers(
+    sparse: ORJSONResponse, response: Response
+) -> ORJSONResponse:
+    for key, value in response.headers.items():
+        if key != "content-length":
+            sparse.headers[key] = value
+    return sparse
@@ -0,0 +1,147 @@
+import time
+from typing import Any, Callable, Dict
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram, registry
+from app.db.query_stats import QueryStats, current_query_stats
+from starlette.datastructures import MutableHeaders
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Requests that matched no route share one label, raw paths would make a
+# series per url
+UNMATCHED_ROUTE = "<unmatched>"
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by method, route and status",
+        ["method", "route", "status"],
+    )
+)
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by method, route and status",
+        ["method", "route", "status"],
+    )
+)
+http_request_db_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "Database statements per HTTP request by method and route",
+        ["method", "route"],
+        buckets=[0, 1, 2, 5, 10, 20, 50, 100],
+    )
+)
+http_request_db_duration = registry.register(
+    Histogram(
+        "http_request_db_duration_seconds",
+        "Database time per HTTP request by method and route",
+        ["method", "route"],
+    )
+)
+
+
+class RouteTemplates:
+    def __init__(self) -> None:
+        """Path templates of the application's routes by endpoint, e.g.
+           /api/v1/users/{user_id}. Labels built from raw paths would
+           make a series per url.
+        """
+        self._routes: Dict[Callable, str] = {}
+
+    def __call__(self, scope: Scope) -> str:
+        # The router leaves the matched endpoint in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._routes.get(endpoint)
+        if template is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            self._routes = {
+                route.endpoint: route.path
+                for route in routes
+                if isinstance(route, BaseRoute) and hasattr(route, "endpoint")
+            }
+            template = self._routes.get(endpoint, UNMATCHED_ROUTE)
+        return template
+
+
+route_template = RouteTemplates()
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        """Pure ASGI middleware counting requests and timing them until the
+           response is sent, labelled with the path template of the route.
+
+        :param app: The wrapped application
+        :type app: ASGIApp
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            labels: Any = (
+                scope["method"],
+                route_template(scope),
+                str(status),
+            )
+            http_requests.inc(*labels)
+            http_request_duration.observe(
+                time.perf_counter() - started, *labels
+            )
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app: ASGIApp):
+        """Pure ASGI middleware attributing the database statements run
+           while serving a request to it, see app.db.query_stats. Reports
+           them in a Server-Timing header and per route metrics.
+           Statements run after the response started, e.g. by streamed
+           exports, are missing from the header.
+
+        :param app: The wrapped application
+        :type app: ASGIApp
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(route=lambda: route_template(scope))
+        token = current_query_stats.set(stats)
+
+        async def send_with_timing(message: Message) -> None:
+            if (
+                message["type"] == "http.response.start"
+                and settings.SERVER_TIMING_ENABLED
+            ):
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            if settings.METRICS_ENABLED:
+                labels: Any = (scope["method"], route_template(scope))
+                http_request_db_queries.observe(stats.count, *labels)
+                http_request_db_duration.observe(stats.duration, *labels)
@@ -0,0 +1,27 @@
+from typing import Any, List, Tuple
+
+from fastapi import Response
+
+# Listings are ordered on CRUDBase.keyset. When a page is full the cursor of
+# the next page is returned in this header, pass it back as ?cursor=
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# With ?count=true the number of rows in the whole listing, and whether
+# it was counted ("exact") or taken from the planner ("estimate")
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_TYPE_HEADER = "X-Total-Count-Type"
+
+
+def set_next_cursor(
+    response: Response, crud_obj: Any, items: List[Any], limit: int
+) -> None:
+    next_cursor = crud_obj.get_next_cursor(items, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def set_total_count(response: Response, total: Tuple[int, bool]) -> None:
+    count, exact = total
+    response.headers[TOTAL_COUNT_HEADER] = str(count)
+    response.headers[TOTAL_COUNT_TYPE_HEADER] = (
+        "exact" if exact else "estimate"
+    )
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import inspect
+from typing import Any, Callable
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from fastapi.utils import create_cloned_field, create_response_field
+from pydantic import BaseModel, ValidationError
+from pydantic.fields import ModelField
+from pydantic.json import pydantic_encoder
+from pydantic.utils import lenient_issubclass
+
+# Options of response_model that only FastAPI's own serialization applies
+RESPONSE_MODEL_OPTIONS = (
+    "response_model_include",
+    "response_model_exclude",
+    "response_model_exclude_unset",
+    "response_model_exclude_defaults",
+    "response_model_exclude_none",
+)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict(by_alias=True)
+    return pydantic_encoder(obj)
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # UUIDs, datetimes and enums are encoded natively, models through
+        # their dict
+        return orjson.dumps(
+            content, default=_default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+def _validated_response(
+    content: Any, field: ModelField, status_code: int, response: Response
+) -> Response:
+    if isinstance(content, Response):
+        return content
+    value, errors = field.validate(content, {}, loc=("response",))
+    if errors:
+        if not isinstance(errors, list):
+            errors = [errors]
+        raise ValidationError(errors, field.type_)
+    validated = ORJSONResponse(
+        value, status_code=response.status_code or status_code
+    )
+    validated.headers.raw.extend(response.headers.raw)
+    return validated
+
+
+class ORJSONRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        """Route validating what its endpoint returns against the
+           response_model once, and encoding it straight to bytes with
+           orjson. FastAPI's own path runs the validated model through
+           jsonable_encoder and json.dumps after validating it. Headers and
+           status codes set on the endpoint's Response parameter are kept.
+           Routes using the RESPONSE_MODEL_OPTIONS are left to FastAPI.
+
+        :param path: Path of the route
+        :type path: str
+        :param endpoint: The endpoint function
+        :type endpoint: Callable[..., Any]
+        """
+        response_model = kwargs.get("response_model")
+        if response_model is None or any(
+            kwargs.get(option) for option in RESPONSE_MODEL_OPTIONS
+        ):
+            super().__init__(path, endpoint, **kwargs)
+            return
+        # Cloned like FastAPI does, so that fields of a subclass of the
+        # response model are not returned
+        field = create_cloned_field(
+            create_response_field(
+                name=f"Response_{endpoint.__name__}", type_=response_model
+            )
+        )
+        status_code = kwargs.get("status_code", 200)
+        signature = inspect.signature(endpoint)
+        response_param = next(
+            (
+                param.name
+                for param in signature.parameters.values()
+                if lenient_issubclass(param.annotation, Response)
+            ),
+            None,
+        )
+        added_param = response_param is None
+        if added_param:
+            response_param = "_route_response"
+            signature = signature.replace(
+                parameters=[
+                    *signature.parameters.values(),
+                    inspect.Parameter(
+                        response_param,
+                        inspect.Parameter.KEYWORD_ONLY,
+                        annotation=Response,
+                    ),
+                ]
+            )
+
+        if asyncio.iscoroutinefunction(endpoint):
+
+            @functools.wraps(endpoint)
+            async def call(**values: Any) -> Response:
+                response = values[response_param]
+                if added_param:
+                    del values[response_param]
+                content = await endpoint(**values)
+                return _validated_response(
+                    content, field, status_code, response
+                )
+
+        else:
+
+            @functools.wraps(endpoint)
+            def call(**values: Any) -> Response:
+                response = values[response_param]
+                if added_param:
+                    del values[response_param]
+                content = endpoint(**values)
+                return _validated_response(
+                    content, field, status_code, response
+                )
+
+        call.__signature__ = signature  # type: ignore
+        super().__init__(path, call, **kwargs)
+        # include_router builds its copy of the route from the endpoint
+        self.endpoint = endpoint
@@ -0,0 +1,467 @@
+import argparse
+import itertools
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from app import crud, schemas
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.models.account import Account
+from app.models.user import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_ACCOUNT_NAME = "benchmark"
+BENCHMARK_EMAIL_DOMAIN = "benchmark.example.com"
+IN_PROCESS_URL = "http://testserver"
+# Suffixes and names of the databases that may be seeded without
+# --disposable-db
+DISPOSABLE_DB_SUFFIX = "_test"
+DISPOSABLE_DB_MARKER = "benchmark"
+
+
+class Scenario(NamedTuple):
+    name: str
+    # Called with the client and the base url, returns the response
+    request: Callable[[Any, str], Any]
+
+
+class Result(NamedTuple):
+    scenario: str
+    concurrency: int
+    requests: int
+    errors: int
+    rps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest rank percentile of values, 0 when there are none.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(
+    scenario: str,
+    concurrency: int,
+    latencies: List[float],
+    errors: int,
+    elapsed: float,
+) -> Result:
+    """
+    Throughput and latency percentiles in milliseconds of one run.
+    """
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return Result(
+        scenario=scenario,
+        concurrency=concurrency,
+        requests=len(latencies),
+        errors=errors,
+        rps=len(latencies) / elapsed if elapsed else 0.0,
+        mean_ms=statistics.mean(latencies_ms) if latencies_ms else 0.0,
+        p50_ms=percentile(latencies_ms, 50),
+        p95_ms=percentile(latencies_ms, 95),
+        p99_ms=percentile(latencies_ms, 99),
+    )
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    threshold: float,
+) -> List[str]:
+    """
+    Runs whose p95 latency grew, or whose throughput dropped, by more than
+    threshold (a fraction) against the baseline run of the same scenario
+    and concurrency. Runs missing from either side are not compared.
+    """
+    previous = {
+        (result["scenario"], result["concurrency"]): result
+        for result in baseline
+    }
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        label = f"{result['scenario']} x{result['concurrency']}"
+        if result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{label}: p95 {before['p95_ms']:.1f}ms -> "
+                f"{result['p95_ms']:.1f}ms"
+            )
+        if result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(
+                f"{label}: {before['rps']:.1f} -> {result['rps']:.1f} req/s"
+            )
+    return regressions
+
+
+def run(
+    scenario: Scenario,
+    make_client: Callable[[], Any],
+    base_url: str,
+    concurrency: int,
+    requests: int,
+    warmup: int = 5,
+) -> Result:
+    """
+    Send requests of scenario from concurrency threads, each with its own
+    client, after warmup untimed requests. Responses with a status of 400
+    or above count as errors and are left out of the latencies.
+    """
+    clients = [make_client() for _ in range(concurrency)]
+    for _ in range(warmup):
+        scenario.request(clients[0], base_url)
+    remaining = itertools.count()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = 0
+
+    def worker(client: Any) -> None:
+        nonlocal errors
+        while next(remaining) < requests:
+            started = time.perf_counter()
+            response = scenario.request(client, base_url)
+            latency = time.perf_counter() - started
+            with lock:
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    latencies.append(latency)
+
+    threads = [
+        threading.Thread(target=worker, args=(client,)) for client in clients
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(scenario.name, concurrency, latencies, errors, elapsed)
+
+
+def seed(db: Any, users: int) -> Any:
+    """
+    Create the benchmark account with users in it, all with one password
+    hash so that seeding does not hash every password. Idempotent.
+    """
+    account = crud.account.get_by_name(db, name=BENCHMARK_ACCOUNT_NAME)
+    if account is None:
+        account = Account(
+            name=BENCHMARK_ACCOUNT_NAME, description="benchmark users"
+        )
+        db.add(account)
+        db.commit()
+    objs_in = [
+        schemas.UserCreate(
+            email=f"user-{i}@{BENCHMARK_EMAIL_DOMAIN}",
+            full_name=f"Benchmark User {i}",
+            password="benchmark password",
+            account_id=account.id,
+        )
+        for i in range(users)
+    ]
+    existing = crud.user.get_existing_emails(
+        db, emails=[obj_in.email for obj_in in objs_in]
+    )
+    hashed_password = get_password_hash("benchmark password")
+    crud.user.create_multi(
+        db,
+        objs_in=[
+            (obj_in, hashed_password)
+            for obj_in in objs_in
+            if obj_in.email not in existing
+        ],
+    )
+    return account
+
+
+def is_disposable_db(name: str) -> bool:
+    return name.endswith(DISPOSABLE_DB_SUFFIX) or DISPOSABLE_DB_MARKER in name
+
+
+def delete_created_users(db: Any) -> int:
+    """
+    Delete the users created by the create_user scenario, of this run and
+    of interrupted ones.
+    """
+    deleted = (
+        db.query(User)
+        .filter(User.email.like(f"created-%@{BENCHMARK_EMAIL_DOMAIN}"))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def scenarios(
+    headers: Dict[str, str],
+    account_id: Any,
+    page_depths: List[int],
+    page_size: int,
+) -> Iterator[Scenario]:
+    api = settings.API_V1_STR
+    credentials = {
+        "username": settings.FIRST_SUPER_ADMIN_EMAIL,
+        "password": settings.FIRST_SUPER_ADMIN_PASSWORD,
+    }
+    yield Scenario(
+        "login",
+        lambda client, url: client.post(
+            f"{url}{api}/auth/access-token", data=credentials
+        ),
+    )
+    yield Scenario(
+        "test_token",
+        lambda client, url: client.post(
+            f"{url}{api}/auth/test-token", headers=headers
+        ),
+    )
+    yield Scenario(
+        "users_me",
+        lambda client, url: client.get(
+            f"{url}{api}/users/me", headers=headers
+        ),
+    )
+    for depth in page_depths:
+        yield Scenario(
+            f"users_skip_{depth}",
+            lambda client, url, depth=depth: client.get(
+                f"{url}{api}/users",
+                headers=headers,
+                params={"skip": depth, "limit": page_size},
+            ),
+        )
+    yield Scenario(
+        "account_users",
+        lambda client, url: client.get(
+            f"{url}{api}/accounts/{account_id}/users",
+            headers=headers,
+            params={"limit": page_size},
+        ),
+    )
+    # Unique across runs, deleted by delete_created_users after the runs
+    emails = (
+        f"created-{time.time_ns()}-{i}@{BENCHMARK_EMAIL_DOMAIN}"
+        for i in itertools.count()
+    )
+    email_lock = threading.Lock()
+
+    def create_user(client: Any, url: str) -> Any:
+        with email_lock:
+            email = next(emails)
+        return client.post(
+            f"{url}{api}/users",
+            headers=headers,
+            json={
+                "email": email,
+                "full_name": "Created User",
+                "password": "benchmark password",
+                "account_id": str(account_id),
+            },
+        )
+
+    yield Scenario("create_user", create_user)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure latency and throughput of the hot endpoints"
+    )
+    parser.add_argument(
+        "--url",
+        default=None,
+        help="Base url of a running server, started with "
+        "LOGIN_THROTTLE_ENABLED=False. By default the app runs in process "
+        "against the test database",
+    )
+    parser.add_argument(
+        "--disposable-db",
+        action="store_true",
+        help="Seed the server's database even though its name does not end "
+        f"with {DISPOSABLE_DB_SUFFIX} or contain {DISPOSABLE_DB_MARKER}",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 4, 16],
+        help="Concurrent clients of each run",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Requests per run"
+    )
+    parser.add_argument(
+        "--users", type=int, default=10000, help="Users to seed"
+    )
+    parser.add_argument(
+        "--page-depths",
+        type=int,
+        nargs="+",
+        default=[0, 1000, 5000],
+        help="Offsets of the listed users pages",
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=100, help="Users per listed page"
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", default=None, help="Only run these"
+    )
+    parser.add_argument(
+        "--output", default="benchmark.json", help="File of the results"
+    )
+    parser.add_argument(
+        "--baseline", default=None, help="Results to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed regression against the baseline, as a fraction",
+    )
+    args = parser.parse_args()
+
+    if args.url:
+        import requests
+
+        from app.db.session import SessionLocal
+
+        # Seeded through DB_NAME, which should be the server's database
+        if not args.disposable_db and not is_disposable_db(settings.DB_NAME):
+            parser.error(
+                f"Refusing to seed users into {settings.DB_NAME}, pass "
+                "--disposable-db if the database may be written to"
+            )
+        make_client: Callable[[], Any] = requests.Session
+        base_url = args.url.rstrip("/")
+        make_session: Callable[[], Any] = SessionLocal
+    else:
+        if settings.ASYNC_DB:
+            parser.error("Benchmark ASYNC_DB against a server with --url")
+        from app.api.deps import get_db
+        from app.db.session import TestingSessionLocal
+        from app.main import app
+        from fastapi.testclient import TestClient
+
+        def get_test_db() -> Iterator[Any]:
+            db = TestingSessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = get_test_db
+        settings.LOGIN_THROTTLE_ENABLED = False
+        make_client = lambda: TestClient(app)  # noqa: E731
+        base_url = IN_PROCESS_URL
+        make_session = TestingSessionLocal
+
+    db = make_session()
+    try:
+        logger.info("Seeding %s benchmark users", args.users)
+        account = seed(db, args.users)
+        account_id = account.id
+    finally:
+        db.close()
+
+    client = make_client()
+    token = client.post(
+        f"{base_url}{settings.API_V1_STR}/auth/access-token",
+        data={
+            "username": settings.FIRST_SUPER_ADMIN_EMAIL,
+            "password": settings.FIRST_SUPER_ADMIN_PASSWORD,
+        },
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = []
+    try:
+        for scenario in scenarios(
+            headers, account_id, args.page_depths, args.page_size
+        ):
+            if args.scenarios and scenario.name not in args.scenarios:
+                continue
+            for concurrency in args.concurrency:
+                result = run(
+                    scenario, make_client, base_url, concurrency, args.requests
+                )
+                logger.info(
+                    "%-20s x%-3s %8.1f req/s  p50 %7.1fms  p95 %7.1fms  "
+                    "p99 %7.1fms  %s errors",
+                    result.scenario,
+                    result.concurrency,
+                    result.rps,
+                    result.p50_ms,
+                    result.p95_ms,
+                    result.p99_ms,
+                    result.errors,
+                )
+                results.append(result._asdict())
+    finally:
+        db = make_session()
+        try:
+            logger.info("Deleted %s created users", delete_created_users(db))
+        finally:
+            db.close()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "options": {
+            "requests": args.requests,
+            "users": args.users,
+            "page_size": args.page_size,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    logger.info("Results written to %s", args.output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for regression in regressions:
+            logger.error("Regression %s", regression)
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions over %.0f%%", args.threshold * 100)
+
+
+if __name__ == "__main__":
+    main()
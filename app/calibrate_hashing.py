@@ -0,0 +1,29 @@
+import argparse
+import logging
+
+from app.core.config import settings
+from app.core.hashing import calibrate_bcrypt_rounds
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pick the bcrypt rounds for a password hash latency"
+    )
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=settings.PASSWORD_HASH_TARGET_MS,
+        help="Hash latency to aim for in milliseconds",
+    )
+    args = parser.parse_args()
+    logger.info("Calibrating bcrypt for %.0fms per hash", args.target_ms)
+    rounds, latency = calibrate_bcrypt_rounds(args.target_ms)
+    logger.info("%s rounds take %.0fms on this host", rounds, latency)
+    print(f"PASSWORD_BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
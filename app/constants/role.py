@@ -24,3 +24,12 @@ class Role:
         "name": "SUPER_ADMIN",
         "description": "Super Administrator of Application Ecosystem",
     }
+
+    # Lowest to highest. Account admins cannot assign the roles above theirs
+    RANKS = [
+        GUEST["name"],
+        ACCOUNT_MANAGER["name"],
+        ACCOUNT_ADMIN["name"],
+        ADMIN["name"],
+        SUPER_ADMIN["name"],
+    ]
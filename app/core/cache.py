@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import StatsCollector, registry
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        """Thread safe in-process cache with LRU eviction.
+           Entries expire after a time to live, which can be overridden
+           per entry.
+
+        :param maxsize: Maximum number of entries held by the cache
+        :type maxsize: int
+        :param ttl: Default time to live of an entry in seconds
+        :type ttl: float
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> int:
+        with self._lock:
+            keys = [
+                key
+                for key, (_, value) in self._data.items()
+                if predicate(value)
+            ]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Authenticated principals keyed by user id, see deps.get_current_user
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+# Validated token payloads and recently rejected tokens keyed by a digest
+# of the raw token, see deps.decode_token
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS,
+)
+rejected_token_cache = TTLCache(
+    maxsize=settings.REJECTED_TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.REJECTED_TOKEN_CACHE_TTL_SECONDS,
+)
+
+# Total counts of listings keyed by table and filter, see CRUDBase.count
+count_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_MAX_SIZE,
+    ttl=settings.COUNT_CACHE_TTL_SECONDS,
+)
+
+registry.register(
+    StatsCollector(
+        "app_cache",
+        "cache",
+        lambda: {
+            "principal": principal_cache,
+            "token": token_cache,
+            "rejected_token": rejected_token_cache,
+            "count": count_cache,
+        },
+        counters=["hits", "misses", "evictions", "expirations"],
+    )
+)
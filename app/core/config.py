@@ -1,16 +1,116 @@
+import os
 from functools import lru_cache
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseSettings, PostgresDsn, validator
 
+JWT_ALGORITHMS = (
+    "HS256",
+    "HS384",
+    "HS512",
+    "RS256",
+    "RS384",
+    "RS512",
+    "ES256",
+    "ES384",
+    "ES512",
+)
+
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "FastAPI Role Based Access Control Auth Service"
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    INTROSPECTION_MAX_TOKENS: int = 100
+    # Rows accepted by a bulk endpoint, inserted BULK_INSERT_BATCH_SIZE at
+    # a time with one commit per batch
+    BULK_MAX_ROWS: int = 50000
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    # Rows accepted by the user import. Every password is hashed within the
+    # request, in about rows * hash time / PASSWORD_BULK_HASHING_WORKERS:
+    # 1000 rows at 250 ms on 8 workers take about 30 s. Keep it well under
+    # the timeout of the proxy in front of the service
+    BULK_IMPORT_MAX_ROWS: int = 1000
+    # Rows fetched from the server side cursor and written per chunk by the
+    # export endpoints
+    EXPORT_BATCH_SIZE: int = 1000
     USERS_OPEN_REGISTRATION: str
 
+    # HS* algorithms sign with SECRET_KEY. RS* and ES* algorithms sign with
+    # the PEM encoded JWT_PRIVATE_KEY (or the file at JWT_PRIVATE_KEY_FILE)
+    # and publish the public key at /.well-known/jwks.json
+    JWT_ALGORITHM: str = "HS256"
+    JWT_PRIVATE_KEY_FILE: Optional[str] = None
+    JWT_PRIVATE_KEY: Optional[str] = None
+    JWT_KEY_ID: Optional[str] = None
+    JWKS_MAX_AGE_SECONDS: int = 3600
+
+    # Set PRINCIPAL_CACHE_MAX_SIZE to 0 to disable the principal cache.
+    # The cache is per process: a user deactivated or given another role
+    # is only dropped from the cache of the worker that made the change,
+    # other workers keep authenticating the old principal for up to
+    # PRINCIPAL_CACHE_TTL_SECONDS
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    # Verified tokens are cached until they expire, at most for
+    # TOKEN_CACHE_TTL_SECONDS. Set the sizes to 0 to disable the caches
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 3600
+    REJECTED_TOKEN_CACHE_MAX_SIZE: int = 10000
+    REJECTED_TOKEN_CACHE_TTL_SECONDS: int = 60
+    # Roles are held in memory and reloaded on role writes in this worker,
+    # or once they are older than this in every worker
+    ROLE_CATALOG_MAX_AGE_SECONDS: int = 300
+    # Listings with ?count=true are counted exactly below
+    # EXACT_COUNT_THRESHOLD rows, and estimated by the planner above it.
+    # Counts are cached for COUNT_CACHE_TTL_SECONDS
+    EXACT_COUNT_THRESHOLD: int = 10000
+    COUNT_CACHE_MAX_SIZE: int = 10000
+    COUNT_CACHE_TTL_SECONDS: int = 60
+
+    # Prometheus metrics at /metrics, served without authentication. Keep
+    # the path off the public ingress
+    METRICS_ENABLED: bool = True
+    # Statement count and database time of every request in a Server-Timing
+    # header. Statements slower than SLOW_QUERY_MS are logged with their
+    # route, without parameter values. Unset SLOW_QUERY_MS to stop logging
+    SERVER_TIMING_ENABLED: bool = True
+    SLOW_QUERY_MS: Optional[float] = 200
+
+    # Either "thread" or "process"
+    PASSWORD_HASHING_EXECUTOR: str = "thread"
+    PASSWORD_HASHING_WORKERS: int = 4
+    # Bulk imports hash on a pool of their own, one process per core by
+    # default, so that logins never wait behind an import
+    PASSWORD_BULK_HASHING_EXECUTOR: str = "process"
+    PASSWORD_BULK_HASHING_WORKERS: int = os.cpu_count() or 1
+    # The first scheme hashes new passwords. Hashes made with another scheme,
+    # or with other bcrypt rounds, are upgraded on the next successful login.
+    # `python -m app.calibrate_hashing` picks the rounds that take about
+    # PASSWORD_HASH_TARGET_MS on the current host. Unset keeps passlib's
+    # default rounds
+    PASSWORD_SCHEMES: List[str] = ["bcrypt"]
+    PASSWORD_BCRYPT_ROUNDS: Optional[int] = None
+    PASSWORD_HASH_TARGET_MS: int = 250
+
+    # Token buckets of login attempts per username and per client ip.
+    # The "memory" backend counts per worker, "redis" shares the buckets
+    # between workers and requires the redis package
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_THROTTLE_BACKEND: str = "memory"
+    LOGIN_THROTTLE_REDIS_URL: Optional[str] = None
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    LOGIN_THROTTLE_USERNAME_CAPACITY: int = 10
+    LOGIN_THROTTLE_USERNAME_PER_MINUTE: float = 5
+    LOGIN_THROTTLE_IP_CAPACITY: int = 50
+    LOGIN_THROTTLE_IP_PER_MINUTE: float = 30
+    # Addresses or networks of the proxies in front of the app, e.g. the
+    # ingress. Requests from them are counted against the client ip of
+    # X-Forwarded-For instead of the proxy's
+    LOGIN_THROTTLE_TRUSTED_PROXIES: List[str] = []
+
     ENVIRONMENT: Optional[str]
 
     FIRST_SUPER_ADMIN_EMAIL: str
@@ -23,6 +123,56 @@ class Settings(BaseSettings):
     DB_NAME: str
 
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    # Connections held open per engine, and opened beyond that under load.
+    # A checkout waits at most DB_POOL_TIMEOUT seconds for a connection.
+    # Connections older than DB_POOL_RECYCLE seconds are reopened, -1 keeps
+    # them. DB_POOL_PRE_PING is "always" to ping on every checkout, "idle"
+    # to only ping connections idle for DB_POOL_PRE_PING_IDLE_SECONDS, or
+    # "never". See /stats/db-pool for the pool's state
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: str = "idle"
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = 30
+    # Serve the users router from an asyncpg backed AsyncSession.
+    # Requires the async extra (poetry install -E async)
+    ASYNC_DB: bool = False
+
+    @validator("JWT_ALGORITHM")
+    def check_jwt_algorithm(cls, v: str) -> str:
+        if v not in JWT_ALGORITHMS:
+            raise ValueError(f"Unsupported JWT algorithm: {v}")
+        return v
+
+    @validator("JWT_PRIVATE_KEY", always=True)
+    def load_jwt_private_key(
+        cls, v: Optional[str], values: Dict[str, Any]
+    ) -> Optional[str]:
+        if v is None and values.get("JWT_PRIVATE_KEY_FILE"):
+            with open(values["JWT_PRIVATE_KEY_FILE"]) as key_file:
+                v = key_file.read()
+        algorithm = values.get("JWT_ALGORITHM")
+        if v is None and algorithm and not algorithm.startswith("HS"):
+            raise ValueError(f"A private key is required for {algorithm}")
+        return v
+
+    @validator("LOGIN_THROTTLE_REDIS_URL", always=True)
+    def check_login_throttle_backend(
+        cls, v: Optional[str], values: Dict[str, Any]
+    ) -> Optional[str]:
+        backend = values.get("LOGIN_THROTTLE_BACKEND")
+        if backend not in ("memory", "redis"):
+            raise ValueError(f"Unknown login throttle backend: {backend}")
+        if backend == "redis" and not v:
+            raise ValueError("LOGIN_THROTTLE_REDIS_URL is required for redis")
+        return v
+
+    @validator("DB_POOL_PRE_PING")
+    def check_pool_pre_ping(cls, v: str) -> str:
+        if v not in ("always", "idle", "never"):
+            raise ValueError(f"Unknown pool pre-ping strategy: {v}")
+        return v
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
     def assemble_db_connection(
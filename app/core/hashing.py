@@ -0,0 +1,164 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import StatsCollector, registry
+from passlib.hash import bcrypt
+
+
+def _timed_call(
+    func: Callable[..., Any], *args: Any
+) -> Tuple[Any, float]:
+    # Module level so that it can be pickled for a process pool
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def measure_bcrypt(rounds: int, samples: int = 3) -> float:
+    """
+    Median time in milliseconds to hash a password with the given rounds.
+    """
+    hasher = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        _, run_time = _timed_call(hasher.hash, "calibration password")
+        timings.append(run_time * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float, min_rounds: int = 4, max_rounds: int = 16
+) -> Tuple[int, float]:
+    """
+    Find the highest bcrypt rounds whose hash time stays within target_ms
+    on this host. Every extra round doubles the cost, so the search stops
+    at the first setting over the target.
+
+    :return: The rounds and their measured hash time in milliseconds
+    """
+    rounds, latency = min_rounds, measure_bcrypt(min_rounds)
+    while rounds < max_rounds:
+        next_latency = measure_bcrypt(rounds + 1)
+        if next_latency > target_ms:
+            break
+        rounds, latency = rounds + 1, next_latency
+    return rounds, latency
+
+
+class HashingExecutor:
+    def __init__(self, kind: str, max_workers: int):
+        """Dedicated worker pool for password hashing and verification.
+           Keeps slow bcrypt calls off the event loop and off the
+           threadpool that serves sync endpoints.
+
+        :param kind: Either "thread" or "process"
+        :type kind: str
+        :param max_workers: Number of workers in the pool
+        :type max_workers: int
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hashing executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.total_run_time = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        self.max_workers, thread_name_prefix="hashing"
+                    )
+            return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.submitted += 1
+        started = time.perf_counter()
+        try:
+            result, run_time = await loop.run_in_executor(
+                self.executor, _timed_call, func, *args
+            )
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.completed += 1
+            self.total_latency += latency
+            self.total_run_time += run_time
+            self.max_latency = max(self.max_latency, latency)
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self.submitted - self.completed - self.failed
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - self.max_workers),
+                "avg_latency_ms": (
+                    self.total_latency / self.completed * 1000
+                    if self.completed
+                    else 0.0
+                ),
+                "avg_run_time_ms": (
+                    self.total_run_time / self.completed * 1000
+                    if self.completed
+                    else 0.0
+                ),
+                "max_latency_ms": self.max_latency * 1000,
+            }
+
+
+password_hasher = HashingExecutor(
+    kind=settings.PASSWORD_HASHING_EXECUTOR,
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+)
+# Hashes the passwords of bulk imports, see get_password_hashes_async
+bulk_password_hasher = HashingExecutor(
+    kind=settings.PASSWORD_BULK_HASHING_EXECUTOR,
+    max_workers=settings.PASSWORD_BULK_HASHING_WORKERS,
+)
+registry.register(
+    StatsCollector(
+        "app_hashing",
+        "executor",
+        lambda: {
+            "password": password_hasher,
+            "bulk_password": bulk_password_hasher,
+        },
+        counters=["submitted", "completed", "failed"],
+    )
+)
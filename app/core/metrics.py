@@ -0,0 +1,229 @@
+import bisect
+import threading
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Sequence,
+    Tuple,
+)
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class MetricFamily(NamedTuple):
+    name: str
+    type: str
+    help: str
+    samples: List[Tuple[str, Dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        """Monotonic counter per combination of label values.
+
+        :param name: Metric name, ending in _total
+        :type name: str
+        :param help: Description shown by Prometheus
+        :type help: str
+        :param labelnames: Names of the labels, values are given positionally
+        :type labelnames: Sequence[str]
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            MetricFamily(
+                self.name,
+                "counter",
+                self.help,
+                [
+                    (self.name, dict(zip(self.labelnames, labels)), value)
+                    for labels, value in values
+                ],
+            )
+        ]
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        """Distribution of observed values in cumulative buckets per
+           combination of label values.
+
+        :param name: Metric name
+        :type name: str
+        :param help: Description shown by Prometheus
+        :type help: str
+        :param labelnames: Names of the labels, values are given positionally
+        :type labelnames: Sequence[str]
+        :param buckets: Sorted upper bounds of the buckets
+        :type buckets: Sequence[float]
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per labels, the count of each bucket (not cumulative) and +Inf,
+        # then the sum of the observations
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[labels] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def collect(self) -> List[MetricFamily]:
+        with self._lock:
+            values = [
+                (labels, list(counts), total[0])
+                for labels, (counts, total) in self._values.items()
+            ]
+        samples = []
+        for labels, counts, total in values:
+            labeled = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        {**labeled, "le": _format_value(bound)},
+                        cumulative,
+                    )
+                )
+            samples.append((f"{self.name}_sum", labeled, total))
+            samples.append((f"{self.name}_count", labeled, cumulative))
+        return [MetricFamily(self.name, "histogram", self.help, samples)]
+
+
+class StatsCollector:
+    def __init__(
+        self,
+        namespace: str,
+        label: str,
+        sources: Callable[[], Dict[str, Any]],
+        counters: Collection[str] = (),
+    ):
+        """Exposes the numeric entries of existing stats() dictionaries,
+           read when metrics are scraped. Keys listed in counters become
+           <namespace>_<key>_total counters, the others gauges.
+
+        :param namespace: Prefix of the metric names
+        :type namespace: str
+        :param label: Name of the label holding the source's name
+        :type label: str
+        :param sources: Returns the objects with a stats() method by name
+        :type sources: Callable[[], Dict[str, Any]]
+        :param counters: Keys of the stats that only ever increase
+        :type counters: Collection[str]
+        """
+        self.namespace = namespace
+        self.label = label
+        self.sources = sources
+        self.counters = set(counters)
+
+    def collect(self) -> List[MetricFamily]:
+        families: Dict[str, MetricFamily] = {}
+        for source_name, source in self.sources().items():
+            for key, value in source.stats().items():
+                if isinstance(value, bool) or not isinstance(
+                    value, (int, float)
+                ):
+                    continue
+                if key in self.counters:
+                    name, kind = f"{self.namespace}_{key}_total", "counter"
+                else:
+                    name, kind = f"{self.namespace}_{key}", "gauge"
+                family = families.setdefault(
+                    name,
+                    MetricFamily(name, kind, f"{self.namespace} {key}", []),
+                )
+                family.samples.append((name, {self.label: source_name}, value))
+        return list(families.values())
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        """Metrics rendered together in the Prometheus text format."""
+        self._collectors: List[Any] = []
+        self._lock = threading.Lock()
+
+    def register(self, collector: Any) -> Any:
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def collect(self) -> Iterable[MetricFamily]:
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            yield from collector.collect()
+
+    def render(self) -> str:
+        lines = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {_escape(family.help)}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            for name, labels, value in family.samples:
+                if labels:
+                    label_text = ",".join(
+                        f'{key}="{_escape(str(label))}"'
+                        for key, label in labels.items()
+                    )
+                    name = f"{name}{{{label_text}}}"
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Served at /metrics
+registry = MetricsRegistry()
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.schemas.role import Role
+from pydantic import UUID4
+
+
+class RoleCatalog:
+    def __init__(self, max_age: float):
+        """In-process copy of the roles table for id and name lookups.
+           Replaced as a whole on every load so readers never see a
+           partial catalog.
+
+        :param max_age: Seconds after which the catalog is stale and
+                        reloaded on next use
+        :type max_age: float
+        """
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._by_id: Dict[UUID4, Role] = {}
+        self._by_name: Dict[str, Role] = {}
+        self._roles: List[Role] = []
+        self.etag: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.loads = 0
+
+    def load(self, roles: Iterable[Any]) -> None:
+        roles = sorted(
+            (Role.from_orm(role) for role in roles), key=lambda role: role.id
+        )
+        digest = hashlib.sha256(
+            json.dumps(
+                [[str(role.id), role.name, role.description] for role in roles]
+            ).encode()
+        ).hexdigest()
+        with self._lock:
+            self._roles = roles
+            self._by_id = {role.id: role for role in roles}
+            self._by_name = {role.name: role for role in roles}
+            self.etag = f'"{digest[:32]}"'
+            self.loaded_at = time.monotonic()
+            self.loads += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.loaded_at = None
+
+    @property
+    def is_stale(self) -> bool:
+        loaded_at = self.loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self.max_age
+
+    def get(self, id: UUID4) -> Optional[Role]:
+        return self._by_id.get(id)
+
+    def get_by_name(self, name: str) -> Optional[Role]:
+        return self._by_name.get(name)
+
+    def ids(self) -> List[UUID4]:
+        return list(self._by_id)
+
+    def page(
+        self, *, skip: int = 0, limit: int = 100, after: UUID4 = None
+    ) -> List[Role]:
+        """
+        Roles in id order, the order of GET /roles/ when it was served from
+        the database, starting after the given id or at skip.
+        """
+        roles = self._roles
+        if after is not None:
+            roles = [role for role in roles if role.id > after]
+        else:
+            roles = roles[skip:]
+        return roles[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        loaded_at = self.loaded_at
+        return {
+            "size": len(self._roles),
+            "max_age": self.max_age,
+            "loads": self.loads,
+            "age": (
+                time.monotonic() - loaded_at if loaded_at is not None else None
+            ),
+        }
+
+
+# Roles by id and name, see crud.role.get_catalog
+role_catalog = RoleCatalog(max_age=settings.ROLE_CATALOG_MAX_AGE_SECONDS)
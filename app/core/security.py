@@ -1,13 +1,84 @@
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from app.core.config import settings
-from jose import jwt
+from app.core.hashing import bulk_password_hasher, password_hasher
+from jose import jwk, jwt
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-ALGORITHM = "HS256"
+def get_crypt_context(
+    schemes: List[str], bcrypt_rounds: int = None
+) -> CryptContext:
+    """
+    Build the password hashing policy. Hashes made with any scheme but the
+    first, or with bcrypt rounds other than bcrypt_rounds, need an update.
+    """
+    options = {}
+    if bcrypt_rounds is not None:
+        options = {
+            "bcrypt__default_rounds": bcrypt_rounds,
+            "bcrypt__min_rounds": bcrypt_rounds,
+            "bcrypt__max_rounds": bcrypt_rounds,
+        }
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
+pwd_context = get_crypt_context(
+    settings.PASSWORD_SCHEMES, settings.PASSWORD_BCRYPT_ROUNDS
+)
+
+ALGORITHM = settings.JWT_ALGORITHM
+
+# Members of a JWK used for its RFC 7638 thumbprint
+JWK_THUMBPRINT_MEMBERS = {
+    "RSA": ("e", "kty", "n"),
+    "EC": ("crv", "kty", "x", "y"),
+}
+
+
+def jwk_thumbprint(key: Dict[str, str]) -> str:
+    members = {
+        name: key[name] for name in JWK_THUMBPRINT_MEMBERS[key["kty"]]
+    }
+    digest = hashlib.sha256(
+        json.dumps(members, separators=(",", ":"), sort_keys=True).encode()
+    ).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def get_public_jwk(
+    private_key: str, algorithm: str, key_id: str = None
+) -> Dict[str, str]:
+    """
+    Build the public JSON Web Key matching a PEM encoded private key.
+    The key id defaults to the key's thumbprint.
+    """
+    public_jwk = jwk.construct(private_key, algorithm).public_key().to_dict()
+    public_jwk["use"] = "sig"
+    public_jwk["kid"] = key_id or jwk_thumbprint(public_jwk)
+    return public_jwk
+
+
+if ALGORITHM.startswith("HS"):
+    SIGNING_KEY = settings.SECRET_KEY
+    VERIFICATION_KEY = settings.SECRET_KEY
+    KEY_ID: Optional[str] = None
+    # Shared secrets are never published
+    JWKS: Dict[str, List[Dict[str, str]]] = {"keys": []}
+else:
+    SIGNING_KEY = settings.JWT_PRIVATE_KEY
+    VERIFICATION_KEY = (
+        jwk.construct(SIGNING_KEY, ALGORITHM).public_key().to_pem().decode()
+    )
+    _public_jwk = get_public_jwk(SIGNING_KEY, ALGORITHM, settings.JWT_KEY_ID)
+    KEY_ID = _public_jwk["kid"]
+    JWKS = {"keys": [_public_jwk]}
 
 
 def create_access_token(
@@ -20,15 +91,81 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     to_encode = {"exp": expire, **subject}
+    headers = {"kid": KEY_ID} if KEY_ID else None
     encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=ALGORITHM
+        to_encode, SIGNING_KEY, algorithm=ALGORITHM, headers=headers
     )
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Dict[str, Any]:
+    return jwt.decode(token, VERIFICATION_KEY, algorithms=[ALGORITHM])
+
+
+def create_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def get_refresh_token_hash(token: str) -> str:
+    # Refresh tokens are random, a fast digest is enough to store them
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and return a new hash for it when the stored hash
+    does not match the current hashing policy.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def get_password_hashes(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    return await password_hasher.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def get_password_hashes_async(passwords: List[str]) -> List[str]:
+    """
+    Hash many passwords on the bulk hashing pool, leaving the pool that
+    verifies logins free. Passwords are sent in chunks to keep the per
+    task overhead of a process pool low.
+    """
+    size = max(1, len(passwords) // (bulk_password_hasher.max_workers * 4))
+    chunks = await asyncio.gather(
+        *[
+            bulk_password_hasher.run(
+                get_password_hashes, passwords[i:i + size]
+            )
+            for i in range(0, len(passwords), size)
+        ]
+    )
+    return [hashed for chunk in chunks for hashed in chunk]
@@ -0,0 +1,278 @@
+import ipaddress
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import StatsCollector, registry
+
+logger = logging.getLogger(__name__)
+
+# Refills a bucket, then takes a token from it when one is available.
+# Returns the seconds until a token is available as a string, Lua numbers
+# would be truncated to integers
+REDIS_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call("HMSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+# Puts back a token taken by REDIS_TAKE_SCRIPT, when the bucket still exists
+REDIS_GIVE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local tokens = tonumber(redis.call("HGET", KEYS[1], "tokens"))
+if tokens then
+    redis.call("HSET", KEYS[1], "tokens", math.min(capacity, tokens + 1))
+end
+return 0
+"""
+
+
+class MemoryTokenBucketBackend:
+    name = "memory"
+
+    def __init__(
+        self, max_keys: int, clock: Callable[[], float] = time.monotonic
+    ):
+        """Token buckets held in process, counted per worker.
+           The least recently used buckets are dropped past max_keys.
+
+        :param max_keys: Maximum number of buckets held
+        :type max_keys: int
+        :param clock: Source of the current time in seconds
+        :type clock: Callable[[], float]
+        """
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def give(self, key: str, capacity: int) -> None:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                tokens, updated = bucket
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisTokenBucketBackend:
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "login-throttle:"):
+        """Token buckets shared by every worker through Redis.
+           Requires the redis package. Logins are let through while
+           Redis is unreachable.
+
+        :param url: Redis connection url
+        :type url: str
+        :param prefix: Prefix of the bucket keys
+        :type prefix: str
+        """
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(
+            url, socket_timeout=0.1, socket_connect_timeout=0.1
+        )
+        self._take = self._client.register_script(REDIS_TAKE_SCRIPT)
+        self._give = self._client.register_script(REDIS_GIVE_SCRIPT)
+        self._errors = redis.RedisError
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        try:
+            retry_after = self._take(
+                keys=[self.prefix + key], args=[capacity, rate, time.time()]
+            )
+        except self._errors:
+            logger.exception("Login throttle backend unavailable")
+            return 0.0
+        return float(retry_after)
+
+    def give(self, key: str, capacity: int) -> None:
+        try:
+            self._give(keys=[self.prefix + key], args=[capacity])
+        except self._errors:
+            logger.exception("Login throttle backend unavailable")
+
+    def reset(self) -> None:
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+
+class LoginThrottle:
+    def __init__(
+        self,
+        backend: Any,
+        username_capacity: int,
+        username_per_minute: float,
+        ip_capacity: int,
+        ip_per_minute: float,
+        trusted_proxies: Optional[List[str]] = None,
+    ):
+        """Token bucket throttle of login attempts per client ip and per
+           username, checked before a password is hashed. Attempts are
+           given back once the password is verified, so that only failed
+           attempts are counted.
+
+        :param backend: Storage of the buckets, either
+                        MemoryTokenBucketBackend or RedisTokenBucketBackend
+        :type backend: Any
+        :param username_capacity: Attempts a username can burst
+        :type username_capacity: int
+        :param username_per_minute: Attempts a username regains per minute
+        :type username_per_minute: float
+        :param ip_capacity: Attempts a client ip can burst
+        :type ip_capacity: int
+        :param ip_per_minute: Attempts a client ip regains per minute
+        :type ip_per_minute: float
+        :param trusted_proxies: Addresses or networks of the proxies whose
+                                X-Forwarded-For header is trusted
+        :type trusted_proxies: Optional[List[str]]
+        """
+        self.backend = backend
+        self.username_capacity = username_capacity
+        self.username_per_minute = username_per_minute
+        self.ip_capacity = ip_capacity
+        self.ip_per_minute = ip_per_minute
+        self.trusted_proxies = [
+            ipaddress.ip_network(proxy, strict=False)
+            for proxy in trusted_proxies or []
+        ]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled_ip = 0
+        self.throttled_username = 0
+
+    def is_trusted_proxy(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address.strip())
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, peer: str, forwarded_for: Optional[str]) -> str:
+        """
+        The address of the client behind the trusted proxies: the right-most
+        address of X-Forwarded-For that is not a trusted proxy. The header
+        is ignored unless the peer is a trusted proxy, since clients can
+        set it.
+        """
+        if not forwarded_for or not self.is_trusted_proxy(peer):
+            return peer
+        addresses = [
+            address.strip()
+            for address in forwarded_for.split(",")
+            if address.strip()
+        ]
+        for address in reversed(addresses):
+            if not self.is_trusted_proxy(address):
+                return address
+        return addresses[0] if addresses else peer
+
+    def check(self, username: str, ip: str) -> float:
+        """
+        Take an attempt from the client ip's and the username's buckets.
+        Returns 0 when the attempt may proceed, otherwise the seconds until
+        it may be retried. A throttled ip does not drain the username.
+        """
+        retry_after = self.backend.take(
+            f"ip:{ip}", self.ip_capacity, self.ip_per_minute / 60
+        )
+        if retry_after:
+            with self._lock:
+                self.throttled_ip += 1
+            return retry_after
+        retry_after = self.backend.take(
+            f"username:{username.lower()}",
+            self.username_capacity,
+            self.username_per_minute / 60,
+        )
+        with self._lock:
+            if retry_after:
+                self.throttled_username += 1
+            else:
+                self.allowed += 1
+        return retry_after
+
+    def succeeded(self, username: str, ip: str) -> None:
+        """
+        Give back the attempt check took for a login whose password was
+        verified.
+        """
+        self.backend.give(f"ip:{ip}", self.ip_capacity)
+        self.backend.give(
+            f"username:{username.lower()}", self.username_capacity
+        )
+
+    def reset(self) -> None:
+        self.backend.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend.name,
+                "allowed": self.allowed,
+                "throttled_ip": self.throttled_ip,
+                "throttled_username": self.throttled_username,
+                "username_capacity": self.username_capacity,
+                "username_per_minute": self.username_per_minute,
+                "ip_capacity": self.ip_capacity,
+                "ip_per_minute": self.ip_per_minute,
+            }
+
+
+if settings.LOGIN_THROTTLE_BACKEND == "redis":
+    _backend: Any = RedisTokenBucketBackend(settings.LOGIN_THROTTLE_REDIS_URL)
+else:
+    _backend = MemoryTokenBucketBackend(settings.LOGIN_THROTTLE_MAX_KEYS)
+
+login_throttle = LoginThrottle(
+    _backend,
+    username_capacity=settings.LOGIN_THROTTLE_USERNAME_CAPACITY,
+    username_per_minute=settings.LOGIN_THROTTLE_USERNAME_PER_MINUTE,
+    ip_capacity=settings.LOGIN_THROTTLE_IP_CAPACITY,
+    ip_per_minute=settings.LOGIN_THROTTLE_IP_PER_MINUTE,
+    trusted_proxies=settings.LOGIN_THROTTLE_TRUSTED_PROXIES,
+)
+registry.register(
+    StatsCollector(
+        "app_login_throttle",
+        "throttle",
+        lambda: {"login": login_throttle},
+        counters=["allowed", "throttled_ip", "throttled_username"],
+    )
+)
@@ -1,4 +1,6 @@
 from .crud_account import account
+from .crud_account_stats import account_stats
+from .crud_refresh_token import refresh_token
 from .crud_role import role
 from .crud_user import user
 from .crud_user_role import user_role
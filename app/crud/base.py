@@ -1,9 +1,55 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Collection,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
+from app.core.cache import count_cache
+from app.core.config import settings
 from app.db.base import Base
 from fastapi.encoders import jsonable_encoder
 from pydantic import UUID4, BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    Column,
+    DateTime,
+    String,
+    and_,
+    any_,
+    bindparam,
+    cast,
+    func,
+    inspect,
+    literal_column,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+if TYPE_CHECKING:
+    # Only available with SQLAlchemy >= 1.4, see settings.ASYNC_DB
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 # Define custom types for SQLAlchemy model, and Pydantic schemas
 ModelType = TypeVar("ModelType", bound=Base)
@@ -11,6 +57,64 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+def any_of(column: Column, values: Sequence[Any]) -> Any:
+    """
+    column = ANY(:values), sending values as one array parameter instead of
+    one parameter per value like column.in_(values) does.
+    """
+    param = bindparam(
+        "values", [str(value) for value in values], ARRAY(String), unique=True
+    )
+    return column == any_(cast(param, ARRAY(column.type)))
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: Any):
+        """EXPLAIN (FORMAT JSON) of statement, planned but not run.
+
+        :param statement: The select to plan
+        :type statement: Any
+        """
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def compile_explain(element: Explain, compiler: Any, **kw: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def plan_rows(plan: Any) -> int:
+    """
+    The planner's estimate of the rows returned by an Explain result.
+    """
+    if isinstance(plan, str):
+        # asyncpg does not decode json
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = json.dumps(jsonable_encoder(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         """Base class that can be extend by other action classes.
@@ -21,13 +125,175 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
+    @property
+    def keyset(self) -> Tuple[Column, ...]:
+        """
+        Columns that order listings, unique together and indexed.
+        """
+        if hasattr(self.model, "created_at"):
+            return (self.model.created_at, self.model.id)
+        return (self.model.id,)
+
+    def paginate(
+        self,
+        query: Any,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: str = None,
+    ) -> Any:
+        """Order a query on the keyset and select a page of it.
+           A cursor seeks straight past the previous page through the
+           keyset index and takes precedence over skip.
+
+        :param query: A Query or, on an AsyncSession, a select
+        :param cursor: A next page cursor from get_next_cursor
+        :raises InvalidCursor: When the cursor was not made for this model
+        """
+        query = query.order_by(*self.keyset)
+        if cursor:
+            values = self.decode_keyset(cursor)
+            query = query.filter(tuple_(*self.keyset) > tuple_(*values))
+        else:
+            query = query.offset(skip)
+        return query.limit(limit)
+
+    def load_options(self, fields: Collection[str] = None) -> List[Any]:
+        """
+        Loader options that load only the columns among fields, plus the
+        primary and keyset columns. Everything is loaded without fields.
+        """
+        if fields is None:
+            return []
+        keys = {column.key for column in self.keyset}
+        columns = [
+            attr.class_attribute
+            for attr in inspect(self.model).column_attrs
+            if attr.key in fields or attr.key in keys
+        ]
+        return [load_only(*columns)]
+
+    def _count_statements(self, filters: Sequence[Any]) -> Tuple[Any, Any]:
+        table = self.model.__table__
+        condition = and_(True, *filters)
+        return (
+            Explain(
+                select([literal_column("1")]).select_from(table).where(
+                    condition
+                )
+            ),
+            select([func.count()]).select_from(table).where(condition),
+        )
+
+    def count(
+        self,
+        db: Session,
+        *,
+        filters: Sequence[Any] = (),
+        cache_key: Hashable = None,
+    ) -> Tuple[int, bool]:
+        """
+        Number of rows matching filters and whether it is exact.
+        Sets the planner expects to hold settings.EXACT_COUNT_THRESHOLD rows
+        or more are not counted, the planner's estimate is returned instead.
+
+        :param filters: Criteria of the counted rows
+        :param cache_key: Key to keep the count in the count cache under
+        """
+        if cache_key is not None:
+            total = count_cache.get(cache_key)
+            if total is not None:
+                return total
+        explain, count = self._count_statements(filters)
+        estimate = plan_rows(db.execute(explain).scalar())
+        if estimate >= settings.EXACT_COUNT_THRESHOLD:
+            total = estimate, False
+        else:
+            total = db.execute(count).scalar(), True
+        if cache_key is not None:
+            count_cache.set(cache_key, total)
+        return total
+
+    def decode_keyset(self, cursor: str) -> List[Any]:
+        """
+        The keyset values of the last row of the page before cursor.
+
+        :raises InvalidCursor: When the cursor was not made for this model
+        """
+        values = decode_cursor(cursor)
+        if len(values) != len(self.keyset):
+            raise InvalidCursor(cursor)
+        try:
+            return [
+                datetime.fromisoformat(value)
+                if isinstance(column.type, DateTime)
+                else uuid.UUID(value)
+                for column, value in zip(self.keyset, values)
+            ]
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+
+    def get_next_cursor(
+        self, items: List[ModelType], limit: int
+    ) -> Optional[str]:
+        """
+        Cursor of the page after items, None when items is the last page.
+        """
+        if not items or len(items) < limit:
+            return None
+        return encode_cursor(
+            [getattr(items[-1], column.key) for column in self.keyset]
+        )
+
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: str = None,
+        fields: Collection[str] = None,
     ) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        return self.paginate(
+            db.query(self.model).options(*self.load_options(fields)),
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+        ).all()
+
+    @property
+    def export_columns(self) -> List[Column]:
+        return list(self.model.__table__.columns)
+
+    def export(self, db: Session) -> Iterator[Tuple]:
+        """
+        Every row as a tuple of export_columns in keyset order, fetched
+        settings.EXPORT_BATCH_SIZE rows at a time from a server side cursor.
+        """
+        return (
+            db.query(*self.export_columns)
+            .order_by(*self.keyset)
+            .yield_per(settings.EXPORT_BATCH_SIZE)
+        )
+
+    def get(
+        self, db: Session, id: UUID4, fields: Collection[str] = None
+    ) -> Optional[ModelType]:
+        return (
+            db.query(self.model)
+            .options(*self.load_options(fields))
+            .filter(self.model.id == id)
+            .first()
+        )
 
-    def get(self, db: Session, id: UUID4) -> Optional[ModelType]:
-        return db.query(self.model).filter(self.model.id == id).first()
+    def get_existing_ids(self, db: Session, *, ids: List[UUID4]) -> Set[UUID4]:
+        """
+        The subset of ids that exist, in one query.
+        """
+        if not ids:
+            return set()
+        query = db.query(self.model.id).filter(any_of(self.model.id, ids))
+        return {id for id, in query}
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
@@ -37,24 +303,82 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.refresh(db_obj)
         return db_obj
 
-    def update(
+    def _update_values(
         self,
-        db: Session,
-        *,
         db_obj: ModelType,
-        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
-    ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        # Column names only, loaded relationships may reference db_obj back
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
-        db.add(db_obj)
+        return {
+            attr.key: update_data[attr.key]
+            for attr in inspect(db_obj).mapper.column_attrs
+            if attr.key in update_data
+        }
+
+    def _update_statement(
+        self, db_obj: ModelType, values: Dict[str, Any]
+    ) -> Optional[Any]:
+        """
+        UPDATE ... RETURNING of db_obj's row. None when db_obj is not
+        persisted or values change its primary key, which the session's
+        identity map only follows through a flush.
+        """
+        state = inspect(db_obj)
+        primary_key = state.mapper.primary_key
+        if state.identity is None or any(
+            column.key in values for column in primary_key
+        ):
+            return None
+        table = state.mapper.local_table
+        return (
+            update(table)
+            .where(
+                and_(
+                    *[
+                        column == value
+                        for column, value in zip(primary_key, state.identity)
+                    ]
+                )
+            )
+            .values(values)
+            .returning(*table.columns)
+        )
+
+    def _populate(self, db_obj: ModelType, row: Sequence[Any]) -> None:
+        # Loads the returned row as the committed state, no SELECT needed
+        mapper = inspect(db_obj).mapper
+        for column, value in zip(mapper.local_table.columns, row):
+            key = mapper.get_property_by_column(column).key
+            set_committed_value(db_obj, key, value)
+
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> Optional[ModelType]:
+        values = self._update_values(db_obj, obj_in)
+        if not values:
+            return db_obj
+        statement = self._update_statement(db_obj, values)
+        if statement is None:
+            for key, value in values.items():
+                setattr(db_obj, key, value)
+            db.add(db_obj)
+            db.commit()
+            db.refresh(db_obj)
+            return db_obj
+        row = db.execute(statement).first()
         db.commit()
-        db.refresh(db_obj)
+        if row is None:
+            # Deleted since it was read
+            return None
+        self._populate(db_obj, row)
         return db_obj
 
     def remove(self, db: Session, *, id: UUID4) -> ModelType:
@@ -62,3 +386,93 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.delete(obj)
         db.commit()
         return obj
+
+    # Async counterparts of the methods above, used when ASYNC_DB is set.
+    # Relationships cannot be lazy loaded on an AsyncSession, subclasses
+    # eager load the ones their schemas need.
+
+    async def get_multi_async(
+        self,
+        db: "AsyncSession",
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: str = None,
+        fields: Collection[str] = None,
+    ) -> List[ModelType]:
+        result = await db.execute(
+            self.paginate(
+                select(self.model).options(*self.load_options(fields)),
+                skip=skip,
+                limit=limit,
+                cursor=cursor,
+            )
+        )
+        return result.scalars().all()
+
+    async def count_async(
+        self,
+        db: "AsyncSession",
+        *,
+        filters: Sequence[Any] = (),
+        cache_key: Hashable = None,
+    ) -> Tuple[int, bool]:
+        if cache_key is not None:
+            total = count_cache.get(cache_key)
+            if total is not None:
+                return total
+        explain, count = self._count_statements(filters)
+        estimate = plan_rows((await db.execute(explain)).scalar())
+        if estimate >= settings.EXACT_COUNT_THRESHOLD:
+            total = estimate, False
+        else:
+            total = (await db.execute(count)).scalar(), True
+        if cache_key is not None:
+            count_cache.set(cache_key, total)
+        return total
+
+    async def get_async(
+        self, db: "AsyncSession", id: UUID4, fields: Collection[str] = None
+    ) -> Optional[ModelType]:
+        result = await db.execute(
+            select(self.model)
+            .options(*self.load_options(fields))
+            .filter(self.model.id == id)
+        )
+        return result.scalars().first()
+
+    async def get_existing_ids_async(
+        self, db: "AsyncSession", *, ids: List[UUID4]
+    ) -> Set[UUID4]:
+        if not ids:
+            return set()
+        result = await db.execute(
+            select(self.model.id).filter(any_of(self.model.id, ids))
+        )
+        return set(result.scalars().all())
+
+    async def update_async(
+        self,
+        db: "AsyncSession",
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> Optional[ModelType]:
+        values = self._update_values(db_obj, obj_in)
+        if not values:
+            return db_obj
+        statement = self._update_statement(db_obj, values)
+        if statement is None:
+            for key, value in values.items():
+                setattr(db_obj, key, value)
+            db.add(db_obj)
+            await db.commit()
+            await db.refresh(db_obj)
+            return db_obj
+        result = await db.execute(statement)
+        row = result.first()
+        await db.commit()
+        if row is None:
+            return None
+        self._populate(db_obj, row)
+        return db_obj
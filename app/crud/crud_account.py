@@ -1,14 +1,51 @@
-from typing import Optional
+from typing import Any, Collection, Dict, List, Optional, Union
 
+from app.core.cache import principal_cache
 from app.crud.base import CRUDBase
 from app.models.account import Account
 from app.schemas.account import AccountCreate, AccountUpdate
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
 
 class CRUDAccount(CRUDBase[Account, AccountCreate, AccountUpdate]):
     def get_by_name(self, db: Session, *, name: str) -> Optional[Account]:
         return db.query(self.model).filter(Account.name == name).first()
 
+    def get_multi(
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: str = None,
+        fields: Collection[str] = None,
+        with_stats: bool = False,
+    ) -> List[Account]:
+        """
+        Like CRUDBase.get_multi, with_stats loads the accounts' stats in
+        one more query.
+        """
+        query = db.query(self.model).options(*self.load_options(fields))
+        if with_stats:
+            query = query.options(selectinload(Account.stats))
+        return self.paginate(
+            query, skip=skip, limit=limit, cursor=cursor
+        ).all()
+
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Account,
+        obj_in: Union[AccountUpdate, Dict[str, Any]],
+    ) -> Optional[Account]:
+        account_id = db_obj.id
+        account = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        # Drop cached principals of the account's users
+        principal_cache.invalidate_where(
+            lambda principal: principal.account_id == account_id
+        )
+        return account
+
 
 account = CRUDAccount(Account)
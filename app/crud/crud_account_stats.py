@@ -0,0 +1,104 @@
+from typing import Optional
+
+from app.models.account_stats import AccountRoleStats, AccountStats
+from app.models.user import User
+from app.models.user_role import UserRole
+from pydantic.types import UUID4
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session, joinedload
+
+
+class CRUDAccountStats:
+    """
+    Reads of the per account user counts. The counts are written by the
+    database triggers in app.models.account_stats, not through this class.
+    """
+
+    def get(self, db: Session, *, account_id: UUID4) -> Optional[AccountStats]:
+        return (
+            db.query(AccountStats)
+            .options(joinedload(AccountStats.roles))
+            .filter(AccountStats.account_id == account_id)
+            .first()
+        )
+
+    def get_user_count(self, db: Session, *, account_id: UUID4) -> int:
+        """
+        Exact number of users of the account, without counting the rows.
+        """
+        user_count = (
+            db.query(AccountStats.user_count)
+            .filter(AccountStats.account_id == account_id)
+            .scalar()
+        )
+        # Accounts get stats with their first user
+        return user_count or 0
+
+    def rebuild(self, db: Session, *, account_id: UUID4 = None) -> None:
+        """
+        Recount the stats of every account, or of one account, from the
+        users and user_roles tables. Writes to users and user_roles wait
+        until the rebuild is committed, their triggers then apply on top
+        of the new counts.
+        """
+        db.execute(
+            text(
+                "LOCK TABLE account_stats, account_role_stats "
+                "IN EXCLUSIVE MODE"
+            )
+        )
+        users = User.__table__
+        user_roles = UserRole.__table__
+        stats = AccountStats.__table__
+        role_stats = AccountRoleStats.__table__
+        counted = users.c.account_id.isnot(None)
+        delete_stats, delete_role_stats = stats.delete(), role_stats.delete()
+        if account_id is not None:
+            counted = users.c.account_id == account_id
+            delete_stats = delete_stats.where(stats.c.account_id == account_id)
+            delete_role_stats = delete_role_stats.where(
+                role_stats.c.account_id == account_id
+            )
+        db.execute(delete_stats)
+        db.execute(delete_role_stats)
+        db.execute(
+            stats.insert().from_select(
+                [
+                    stats.c.account_id,
+                    stats.c.user_count,
+                    stats.c.active_user_count,
+                    stats.c.updated_at,
+                ],
+                select(
+                    [
+                        users.c.account_id,
+                        func.count(),
+                        func.count().filter(users.c.is_active),
+                        func.timezone("utc", func.now()),
+                    ]
+                )
+                .where(counted)
+                .group_by(users.c.account_id),
+            )
+        )
+        db.execute(
+            role_stats.insert().from_select(
+                [
+                    role_stats.c.account_id,
+                    role_stats.c.role_id,
+                    role_stats.c.user_count,
+                ],
+                select(
+                    [users.c.account_id, user_roles.c.role_id, func.count()]
+                )
+                .select_from(
+                    users.join(user_roles, user_roles.c.user_id == users.c.id)
+                )
+                .where(counted)
+                .group_by(users.c.account_id, user_roles.c.role_id),
+            )
+        )
+        db.commit()
+
+
+account_stats = CRUDAccountStats()
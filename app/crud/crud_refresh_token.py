@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.security import create_refresh_token, get_refresh_token_hash
+from app.crud.base import CRUDBase
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+from app.models.user_role import UserRole
+from app.schemas.refresh_token import RefreshTokenCreate, RefreshTokenUpdate
+from pydantic.types import UUID4
+from sqlalchemy import update
+from sqlalchemy.orm import Session, joinedload
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class CRUDRefreshToken(
+    CRUDBase[RefreshToken, RefreshTokenCreate, RefreshTokenUpdate]
+):
+    def get_by_token(
+        self, db: Session, *, token: str
+    ) -> Optional[RefreshToken]:
+        """
+        Look a token up by its digest, loading the user and its role
+        in the same query.
+        """
+        return (
+            db.query(RefreshToken)
+            .options(
+                joinedload(RefreshToken.user)
+                .joinedload(User.user_role)
+                .joinedload(UserRole.role)
+            )
+            .filter(RefreshToken.token_hash == get_refresh_token_hash(token))
+            .first()
+        )
+
+    def _add(
+        self, db: Session, *, user_id: UUID4, family_id: UUID4
+    ) -> str:
+        token = create_refresh_token()
+        db.add(
+            RefreshToken(
+                token_hash=get_refresh_token_hash(token),
+                family_id=family_id,
+                user_id=user_id,
+                expires_at=datetime.utcnow()
+                + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+            )
+        )
+        return token
+
+    def issue(self, db: Session, *, user_id: UUID4) -> str:
+        """
+        Issue a refresh token starting a new rotation family.
+        """
+        token = self._add(db, user_id=user_id, family_id=uuid4())
+        db.commit()
+        return token
+
+    def rotate(self, db: Session, *, db_obj: RefreshToken) -> Optional[str]:
+        """
+        Revoke a refresh token and issue its successor in one transaction.
+        Returns None if the token had already been revoked.
+        """
+        revoked = (
+            db.query(RefreshToken)
+            .filter(
+                RefreshToken.id == db_obj.id,
+                RefreshToken.revoked_at.is_(None),
+            )
+            .update(
+                {RefreshToken.revoked_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        if not revoked:
+            db.rollback()
+            return None
+        token = self._add(
+            db, user_id=db_obj.user_id, family_id=db_obj.family_id
+        )
+        db.commit()
+        return token
+
+    def revoke_family(self, db: Session, *, family_id: UUID4) -> int:
+        revoked = (
+            db.query(RefreshToken)
+            .filter(
+                RefreshToken.family_id == family_id,
+                RefreshToken.revoked_at.is_(None),
+            )
+            .update(
+                {RefreshToken.revoked_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return revoked
+
+    def revoke_for_user(self, db: Session, *, user_id: UUID4) -> int:
+        revoked = (
+            db.query(RefreshToken)
+            .filter(
+                RefreshToken.user_id == user_id,
+                RefreshToken.revoked_at.is_(None),
+            )
+            .update(
+                {RefreshToken.revoked_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return revoked
+
+    async def revoke_for_user_async(
+        self, db: "AsyncSession", *, user_id: UUID4
+    ) -> int:
+        result = await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.user_id == user_id,
+                RefreshToken.revoked_at.is_(None),
+            )
+            .values(revoked_at=datetime.utcnow())
+        )
+        await db.commit()
+        return result.rowcount
+
+
+refresh_token = CRUDRefreshToken(RefreshToken)
@@ -1,14 +1,62 @@
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 
+from app.core.role_catalog import RoleCatalog, role_catalog
 from app.crud.base import CRUDBase
 from app.models.role import Role
+from app.schemas.role import Role as CatalogRole
 from app.schemas.role import RoleCreate, RoleUpdate
+from pydantic import UUID4
 from sqlalchemy.orm import Session
 
 
 class CRUDRole(CRUDBase[Role, RoleCreate, RoleUpdate]):
-    def get_by_name(self, db: Session, *, name: str) -> Optional[Role]:
-        return db.query(self.model).filter(Role.name == name).first()
+    def get_by_name(self, db: Session, *, name: str) -> Optional[CatalogRole]:
+        """
+        The role named name from the role catalog. A name missing from the
+        catalog is looked up in the database, and reloads the catalog when
+        the role exists there.
+        """
+        role = self.get_catalog(db).get_by_name(name)
+        if role is None and db.query(
+            db.query(self.model).filter(Role.name == name).exists()
+        ).scalar():
+            role = self.load_catalog(db).get_by_name(name)
+        return role
+
+    def load_catalog(self, db: Session) -> RoleCatalog:
+        role_catalog.load(db.query(self.model).all())
+        return role_catalog
+
+    def get_catalog(self, db: Session) -> RoleCatalog:
+        """
+        The in-memory role catalog, reloaded from the database once it is
+        older than ROLE_CATALOG_MAX_AGE_SECONDS. Writes through this class
+        reload it straight away.
+        """
+        if role_catalog.is_stale:
+            return self.load_catalog(db)
+        return role_catalog
+
+    def create(self, db: Session, *, obj_in: RoleCreate) -> Role:
+        db_obj = super().create(db, obj_in=obj_in)
+        self.load_catalog(db)
+        return db_obj
+
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Role,
+        obj_in: Union[RoleUpdate, Dict[str, Any]]
+    ) -> Optional[Role]:
+        db_obj = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        self.load_catalog(db)
+        return db_obj
+
+    def remove(self, db: Session, *, id: UUID4) -> Role:
+        db_obj = super().remove(db, id=id)
+        self.load_catalog(db)
+        return db_obj
 
 
 role = CRUDRole(Role)
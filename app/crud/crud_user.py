@@ -1,28 +1,260 @@
-from typing import Any, Dict, List, Optional, Union
+import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Collection,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from uuid import uuid4
 
-from app.core.security import get_password_hash, verify_password
-from app.crud.base import CRUDBase
+from app.core.cache import principal_cache
+from app.core.config import settings
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_and_update_password,
+)
+from app.crud.base import CRUDBase, any_of
+from app.crud.crud_refresh_token import refresh_token
+from app.models.role import Role
 from app.models.user import User
+from app.models.user_role import UserRole
 from app.schemas.user import UserCreate, UserUpdate
 from pydantic.types import UUID4
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Loads what schemas.User needs in the same query as the user
+load_user_role = joinedload(User.user_role).joinedload(UserRole.role)
+
+
+def _search(query: Any, q: str, account_id: Optional[UUID4]) -> Any:
+    # Matches the expressions of ix_users_lower_email_pattern and
+    # ix_users_lower_full_name_trgm so that both indexes can be used
+    term = q.lower()
+    pattern = (
+        term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    email = func.lower(User.email)
+    full_name = func.lower(User.full_name)
+    query = query.filter(
+        or_(email.like(f"{pattern}%"), full_name.like(f"%{pattern}%"))
+    )
+    if account_id is not None:
+        query = query.filter(User.account_id == account_id)
+    # Exact emails first, then email prefixes, then names matching
+    # earliest and shortest
+    return query.order_by(
+        case([(email == term, 0), (email.like(f"{pattern}%"), 1)], else_=2),
+        func.strpos(full_name, term),
+        func.length(full_name),
+        User.email,
+    )
+
+
+def _insert_users(objs_in: List[Tuple[UserCreate, str]]) -> Any:
+    # Emails and phone numbers taken since they were checked are skipped,
+    # not an error
+    now = datetime.datetime.utcnow()
+    return (
+        insert(User)
+        .values(
+            [
+                {
+                    "id": uuid4(),
+                    "email": obj_in.email,
+                    "hashed_password": hashed_password,
+                    "full_name": obj_in.full_name,
+                    "phone_number": obj_in.phone_number,
+                    "account_id": obj_in.account_id,
+                    "is_active": obj_in.is_active is not False,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for obj_in, hashed_password in objs_in
+            ]
+        )
+        .on_conflict_do_nothing()
+        .returning(User.id, User.email)
+    )
 
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
+    @property
+    def export_columns(self) -> List[Any]:
+        # Never the password hash, the role name instead of the role row
+        return [
+            User.id,
+            User.email,
+            User.full_name,
+            User.phone_number,
+            User.is_active,
+            User.account_id,
+            Role.name.label("role"),
+            User.created_at,
+            User.updated_at,
+        ]
+
+    def _export_query(self, query: Any, account_id: UUID4 = None) -> Any:
+        query = (
+            query.select_from(User)
+            .outerjoin(UserRole, UserRole.user_id == User.id)
+            .outerjoin(Role, Role.id == UserRole.role_id)
+        )
+        if account_id:
+            query = query.filter(User.account_id == account_id)
+        return query.order_by(*self.keyset)
+
+    def export(
+        self, db: Session, *, account_id: UUID4 = None
+    ) -> Iterator[Tuple]:
+        return self._export_query(
+            db.query(*self.export_columns), account_id
+        ).yield_per(settings.EXPORT_BATCH_SIZE)
+
+    async def export_async(
+        self, db: "AsyncSession", *, account_id: UUID4 = None
+    ) -> AsyncIterator[List[Tuple]]:
+        result = await db.stream(
+            self._export_query(select(*self.export_columns), account_id)
+        )
+        return result.partitions(settings.EXPORT_BATCH_SIZE)
+
+    def load_options(self, fields: Collection[str] = None) -> List[Any]:
+        """
+        Like CRUDBase.load_options, the user role is only joined when
+        fields include it.
+        """
+        options = super().load_options(fields)
+        if fields is None or "user_role" in fields:
+            options.append(load_user_role)
+        return options
+
+    def get(
+        self, db: Session, id: UUID4, fields: Collection[str] = None
+    ) -> Optional[User]:
+        return (
+            db.query(self.model)
+            .options(*self.load_options(fields))
+            .filter(User.id == id)
+            .first()
+        )
+
     def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
-        return db.query(self.model).filter(User.email == email).first()
+        return (
+            db.query(self.model)
+            .options(load_user_role)
+            .filter(User.email == email)
+            .first()
+        )
+
+    def search(
+        self,
+        db: Session,
+        *,
+        q: str,
+        account_id: UUID4 = None,
+        limit: int = 20,
+    ) -> List[User]:
+        """
+        Users whose email starts with q or whose full name contains q,
+        ignoring case, best matches first.
+        """
+        return (
+            _search(db.query(User).options(load_user_role), q, account_id)
+            .limit(limit)
+            .all()
+        )
 
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
+    def create(
+        self, db: Session, *, obj_in: UserCreate, hashed_password: str = None
+    ) -> User:
+        """
+        Create a user, hashing its password unless hashed_password is given.
+        The user is returned with its role loaded, see update.
+        """
+        if hashed_password is None:
+            hashed_password = get_password_hash(obj_in.password)
         db_obj = User(
             email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password),
+            hashed_password=hashed_password,
             full_name=obj_in.full_name,
             account_id=obj_in.account_id,
         )
         db.add(db_obj)
+        db.flush()
+        user_id = db_obj.id
         db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        return self.get(db, user_id)
+
+    def get_existing_emails(
+        self, db: Session, *, emails: List[str]
+    ) -> Set[str]:
+        """
+        The subset of emails already taken, in one query.
+        """
+        if not emails:
+            return set()
+        query = db.query(User.email).filter(any_of(User.email, emails))
+        return {email for email, in query}
+
+    def get_existing_phone_numbers(
+        self, db: Session, *, phone_numbers: List[str]
+    ) -> Set[str]:
+        """
+        The subset of phone numbers already taken, in one query.
+        """
+        if not phone_numbers:
+            return set()
+        query = db.query(User.phone_number).filter(
+            any_of(User.phone_number, phone_numbers)
+        )
+        return {phone_number for phone_number, in query}
+
+    def get_existing_ids(
+        self, db: Session, *, ids: List[UUID4], account_id: UUID4 = None
+    ) -> Set[UUID4]:
+        """
+        The subset of ids that exist, in one query. With account_id, only
+        the users of that account.
+        """
+        if not ids:
+            return set()
+        query = db.query(User.id).filter(any_of(User.id, ids))
+        if account_id is not None:
+            query = query.filter(User.account_id == account_id)
+        return {id for id, in query}
+
+    def create_multi(
+        self, db: Session, *, objs_in: List[Tuple[UserCreate, str]]
+    ) -> Dict[str, UUID4]:
+        """Insert users with hashed passwords using one multi-row INSERT
+           and one commit per settings.BULK_INSERT_BATCH_SIZE users.
+
+        :param objs_in: Users and the hashes of their passwords
+        :return: Ids of the inserted users by email, users whose email was
+                 taken meanwhile are left out
+        """
+        created = {}
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+        for start in range(0, len(objs_in), batch_size):
+            batch = objs_in[start:start + batch_size]
+            created.update(
+                {email: id for id, email in db.execute(_insert_users(batch))}
+            )
+            db.commit()
+        return created
 
     def update(
         self,
@@ -30,7 +262,7 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         *,
         db_obj: User,
         obj_in: Union[UserUpdate, Dict[str, Any]],
-    ) -> User:
+    ) -> Optional[User]:
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
@@ -39,12 +271,54 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             hashed_password = get_password_hash(update_data["password"])
             del update_data["password"]
             update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        user_id = db_obj.id
+        user = super().update(db, db_obj=db_obj, obj_in=update_data)
+        principal_cache.invalidate(user_id)
+        if user is None:
+            return None
+        # Credentials changed, force a new login on every device
+        if (
+            "hashed_password" in update_data
+            or update_data.get("is_active") is False
+        ):
+            refresh_token.revoke_for_user(db, user_id=user.id)
+        if "user_role" in inspect(user).unloaded:
+            # Expired by the commit. Loaded here rather than when the
+            # response of an async route is validated on the event loop
+            return self.get(db, user.id)
+        return user
+
+    def remove(self, db: Session, *, id: UUID4) -> User:
+        user = super().remove(db, id=id)
+        principal_cache.invalidate(id)
+        return user
+
+    def get_multi_by_ids(self, db: Session, *, ids: List[UUID4]) -> List[User]:
+        """
+        Fetch users by id together with their user role and role.
+        """
+        return (
+            db.query(self.model)
+            .options(load_user_role)
+            .filter(User.id.in_(ids))
+            .all()
+        )
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100,
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: str = None,
+        fields: Collection[str] = None,
     ) -> List[User]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        return self.paginate(
+            db.query(self.model).options(*self.load_options(fields)),
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+        ).all()
 
     def authenticate(
         self, db: Session, *, email: str, password: str
@@ -52,8 +326,26 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         user = self.get_by_email(db, email=email)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
+        verified, new_hash = verify_and_update_password(
+            password, user.hashed_password
+        )
+        if not verified:
             return None
+        if new_hash:
+            self.rehash_password(db, user=user, hashed_password=new_hash)
+        return user
+
+    def rehash_password(
+        self, db: Session, *, user: User, hashed_password: str
+    ) -> User:
+        """
+        Store a hash of the same password made with the current hashing
+        policy. Unlike a password change this keeps refresh tokens alive.
+        """
+        user.hashed_password = hashed_password
+        db.add(user)
+        db.commit()
+        principal_cache.invalidate(user.id)
         return user
 
     def is_active(self, user: User) -> bool:
@@ -66,14 +358,126 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
         account_id: UUID4,
         skip: int = 0,
         limit: int = 100,
+        cursor: str = None,
+        fields: Collection[str] = None,
     ) -> List[User]:
-        return (
+        return self.paginate(
             db.query(self.model)
-            .filter(User.account_id == account_id)
-            .offset(skip)
+            .options(*self.load_options(fields))
+            .filter(User.account_id == account_id),
+            skip=skip,
+            limit=limit,
+            cursor=cursor,
+        ).all()
+
+    async def get_by_email_async(
+        self, db: "AsyncSession", *, email: str
+    ) -> Optional[User]:
+        result = await db.execute(
+            select(User).options(load_user_role).filter(User.email == email)
+        )
+        return result.scalars().first()
+
+    async def search_async(
+        self,
+        db: "AsyncSession",
+        *,
+        q: str,
+        account_id: UUID4 = None,
+        limit: int = 20,
+    ) -> List[User]:
+        result = await db.execute(
+            _search(select(User).options(load_user_role), q, account_id)
             .limit(limit)
-            .all()
         )
+        return result.scalars().all()
+
+    async def create_async(
+        self,
+        db: "AsyncSession",
+        *,
+        obj_in: UserCreate,
+        hashed_password: str = None,
+    ) -> User:
+        if hashed_password is None:
+            hashed_password = await get_password_hash_async(obj_in.password)
+        db_obj = User(
+            email=obj_in.email,
+            hashed_password=hashed_password,
+            full_name=obj_in.full_name,
+            account_id=obj_in.account_id,
+        )
+        db.add(db_obj)
+        await db.commit()
+        return await self.get_async(db, db_obj.id)
+
+    async def get_existing_emails_async(
+        self, db: "AsyncSession", *, emails: List[str]
+    ) -> Set[str]:
+        if not emails:
+            return set()
+        result = await db.execute(
+            select(User.email).filter(any_of(User.email, emails))
+        )
+        return set(result.scalars().all())
+
+    async def get_existing_phone_numbers_async(
+        self, db: "AsyncSession", *, phone_numbers: List[str]
+    ) -> Set[str]:
+        if not phone_numbers:
+            return set()
+        result = await db.execute(
+            select(User.phone_number).filter(
+                any_of(User.phone_number, phone_numbers)
+            )
+        )
+        return set(result.scalars().all())
+
+    async def create_multi_async(
+        self, db: "AsyncSession", *, objs_in: List[Tuple[UserCreate, str]]
+    ) -> Dict[str, UUID4]:
+        created = {}
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+        for start in range(0, len(objs_in), batch_size):
+            batch = objs_in[start:start + batch_size]
+            result = await db.execute(_insert_users(batch))
+            created.update({email: id for id, email in result})
+            await db.commit()
+        return created
+
+    async def update_async(
+        self,
+        db: "AsyncSession",
+        *,
+        db_obj: User,
+        obj_in: Union[UserUpdate, Dict[str, Any]],
+    ) -> Optional[User]:
+        if isinstance(obj_in, dict):
+            update_data = obj_in
+        else:
+            update_data = obj_in.dict(exclude_unset=True)
+        if "password" in update_data:
+            hashed_password = await get_password_hash_async(
+                update_data["password"]
+            )
+            del update_data["password"]
+            update_data["hashed_password"] = hashed_password
+        user_id = db_obj.id
+        user = await super().update_async(
+            db, db_obj=db_obj, obj_in=update_data
+        )
+        principal_cache.invalidate(user_id)
+        if user is None:
+            return None
+        if (
+            "hashed_password" in update_data
+            or update_data.get("is_active") is False
+        ):
+            await refresh_token.revoke_for_user_async(db, user_id=user.id)
+        if "user_role" in inspect(user).unloaded:
+            # Cannot be lazy loaded from an AsyncSession
+            return await self.get_async(db, user.id)
+        return user
 
 
 user = CRUDUser(User)
@@ -1,9 +1,12 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 
-from app.crud.base import CRUDBase
+from app.core.cache import principal_cache
+from app.core.config import settings
+from app.crud.base import CRUDBase, any_of
 from app.models.user_role import UserRole
 from app.schemas.user_role import UserRoleCreate, UserRoleUpdate
 from pydantic.types import UUID4
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 
@@ -13,5 +16,61 @@ class CRUDUserRole(CRUDBase[UserRole, UserRoleCreate, UserRoleUpdate]):
     ) -> Optional[UserRole]:
         return db.query(UserRole).filter(UserRole.user_id == user_id).first()
 
+    def get_role_ids_by_user_ids(
+        self, db: Session, *, user_ids: List[UUID4]
+    ) -> Dict[UUID4, UUID4]:
+        """
+        Role ids of the users that have a role, in one query.
+        """
+        if not user_ids:
+            return {}
+        query = db.query(UserRole.user_id, UserRole.role_id).filter(
+            any_of(UserRole.user_id, user_ids)
+        )
+        return dict(query)
+
+    def upsert_multi(
+        self, db: Session, *, objs_in: List[UserRoleCreate]
+    ) -> None:
+        """
+        Assign roles to users, replacing their current role, with one
+        INSERT ... ON CONFLICT DO UPDATE per settings.BULK_INSERT_BATCH_SIZE
+        users and a single commit. Each user may appear once.
+        """
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+        for start in range(0, len(objs_in), batch_size):
+            statement = insert(UserRole).values(
+                [
+                    {"user_id": obj_in.user_id, "role_id": obj_in.role_id}
+                    for obj_in in objs_in[start:start + batch_size]
+                ]
+            )
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[UserRole.user_id],
+                    set_={"role_id": statement.excluded.role_id},
+                )
+            )
+        db.commit()
+        for obj_in in objs_in:
+            principal_cache.invalidate(obj_in.user_id)
+
+    def create(self, db: Session, *, obj_in: UserRoleCreate) -> UserRole:
+        user_role = super().create(db, obj_in=obj_in)
+        principal_cache.invalidate(user_role.user_id)
+        return user_role
+
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: UserRole,
+        obj_in: Union[UserRoleUpdate, Dict[str, Any]],
+    ) -> Optional[UserRole]:
+        user_id = db_obj.user_id
+        user_role = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        principal_cache.invalidate(user_id)
+        return user_role
+
 
 user_role = CRUDUserRole(UserRole)
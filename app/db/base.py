@@ -2,6 +2,8 @@
 # imported by Alembic
 from app.db.base_class import Base  # noqa
 from app.models.account import Account  # noqa
+from app.models.account_stats import AccountRoleStats, AccountStats  # noqa
+from app.models.refresh_token import RefreshToken  # noqa
 from app.models.role import Role  # noqa
 from app.models.user import User  # noqa
 from app.models.user_role import UserRole  # noqa
@@ -0,0 +1,183 @@
+import threading
+import time
+from typing import Any, Dict, Type
+
+from app.core.config import settings
+from app.core.metrics import StatsCollector, registry
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        """Checkout counters and wait times of an engine's connection
+           pool, see MonitoredPoolMixin and monitor_pool. The wait of a
+           checkout includes opening a new connection when one is needed.
+
+        :param name: Name of the engine in the stats
+        :type name: str
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self.pool: Any = None
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pings = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.pool
+        with self._lock:
+            waits = self.checkouts + self.checkout_timeouts
+            stats = {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "pings": self.pings,
+                "avg_wait_ms": (
+                    self.total_wait / waits * 1000 if waits else 0.0
+                ),
+                "max_wait_ms": self.max_wait * 1000,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+                max_overflow=pool._max_overflow,
+                timeout=pool.timeout(),
+            )
+        return stats
+
+
+# Metrics of every monitored engine by name, see GET /stats/db-pool
+pool_metrics: Dict[str, PoolMetrics] = {}
+registry.register(
+    StatsCollector(
+        "app_db_pool",
+        "engine",
+        lambda: pool_metrics,
+        counters=[
+            "checkouts",
+            "checkout_timeouts",
+            "connects",
+            "invalidations",
+            "pings",
+        ],
+    )
+)
+
+
+class MonitoredPoolMixin:
+    # Set by monitor_pool, kept when the pool is recreated on dispose
+    metrics: Any = None
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()  # type: ignore
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_wait(
+                    time.perf_counter() - started, timed_out=True
+                )
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self) -> Any:
+        pool = super().recreate()  # type: ignore
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class MonitoredQueuePool(MonitoredPoolMixin, QueuePool):
+    pass
+
+
+def engine_options(pool_class: Type[Pool] = MonitoredQueuePool) -> Dict:
+    """
+    Keyword arguments of create_engine for the DB_POOL_* settings.
+    """
+    return {
+        "poolclass": pool_class,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING == "always",
+    }
+
+
+def monitor_pool(engine: Engine, name: str) -> PoolMetrics:
+    """
+    Collect metrics of engine's pool. With DB_POOL_PRE_PING set to "idle"
+    connections are also pinged on checkout, but only when they sat idle in
+    the pool for more than DB_POOL_PRE_PING_IDLE_SECONDS.
+    """
+    metrics = PoolMetrics(name)
+    metrics.pool = engine.pool
+    engine.pool.metrics = metrics
+    pool_metrics[name] = metrics
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        metrics.increment("connects")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(
+        dbapi_connection: Any, connection_record: Any, exception: Any
+    ) -> None:
+        metrics.increment("invalidations")
+
+    if settings.DB_POOL_PRE_PING != "idle":
+        return metrics
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        if connection_record is not None:
+            connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(
+        dbapi_connection: Any, connection_record: Any, connection_proxy: Any
+    ) -> None:
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None:
+            return
+        if time.monotonic() - checked_in_at < (
+            settings.DB_POOL_PRE_PING_IDLE_SECONDS
+        ):
+            return
+        metrics.increment("pings")
+        try:
+            alive = engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            alive = False
+        if not alive:
+            # The pool discards the connection and checks out another one
+            raise exc.DisconnectionError()
+
+    return metrics
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+from app.core.metrics import Counter, registry
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Statements run outside of a request, e.g. on startup or from scripts
+NO_ROUTE = "<none>"
+
+slow_queries = registry.register(
+    Counter(
+        "db_slow_queries_total",
+        "Statements slower than SLOW_QUERY_MS by route",
+        ["route"],
+    )
+)
+
+
+class QueryStats:
+    def __init__(self, route: Callable[[], str] = lambda: NO_ROUTE):
+        """Statements run and time spent in the database on behalf of one
+           request. Shared by the threads and greenlets serving the request
+           through current_query_stats.
+
+        :param route: Returns the route of the request, resolved when a
+                      slow statement is logged
+        :type route: Callable[[], str]
+        """
+        self.route = route
+        self._lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+
+    def record(self, duration: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+
+    def server_timing(self) -> str:
+        """
+        The stats as a Server-Timing header value, durations in milliseconds.
+        """
+        with self._lock:
+            duration, count = self.duration * 1000, self.count
+        return f'db;dur={duration:.3f};desc="{count} queries"'
+
+
+# Set per request by QueryStatsMiddleware
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def redact_parameters(parameters: Any, executemany: bool) -> str:
+    """
+    Describe the parameters of a statement without their values, which may
+    hold emails, password hashes or tokens.
+    """
+    if executemany:
+        return f"{len(parameters)} rows"
+    if isinstance(parameters, dict):
+        return ", ".join(f"{key}=?" for key in parameters)
+    if parameters:
+        return ", ".join("?" for _ in parameters)
+    return ""
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every statement run by engine, attribute it to the current request
+    and log the ones slower than SLOW_QUERY_MS.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        if context is not None:
+            context.query_started_at = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        started_at = getattr(context, "query_started_at", None)
+        if started_at is None:
+            return
+        duration = time.perf_counter() - started_at
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.record(duration)
+        if (
+            settings.SLOW_QUERY_MS is None
+            or duration * 1000 < settings.SLOW_QUERY_MS
+        ):
+            return
+        route = stats.route() if stats is not None else NO_ROUTE
+        slow_queries.inc(route)
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s [%s]",
+            duration * 1000,
+            route,
+            " ".join(statement.split()),
+            redact_parameters(parameters, executemany),
+        )
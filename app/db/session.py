@@ -1,13 +1,61 @@
 from app.core.config import settings
+from app.db.pool import MonitoredPoolMixin, engine_options, monitor_pool
+from app.db.query_stats import instrument_engine
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, **engine_options())
+monitor_pool(engine, "default")
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 test_engine = create_engine(
-    f"{settings.SQLALCHEMY_DATABASE_URI}_test", pool_pre_ping=True
+    f"{settings.SQLALCHEMY_DATABASE_URI}_test", **engine_options()
 )
+monitor_pool(test_engine, "test")
+instrument_engine(test_engine)
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=test_engine
 )
+
+AsyncSessionLocal = None
+AsyncTestingSessionLocal = None
+if settings.ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    class MonitoredAsyncAdaptedQueuePool(
+        MonitoredPoolMixin, AsyncAdaptedQueuePool
+    ):
+        pass
+
+    ASYNC_DATABASE_URI = settings.SQLALCHEMY_DATABASE_URI.replace(
+        "postgresql://", "postgresql+asyncpg://", 1
+    )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URI, **engine_options(MonitoredAsyncAdaptedQueuePool)
+    )
+    monitor_pool(async_engine.sync_engine, "async")
+    instrument_engine(async_engine.sync_engine)
+    # Attributes must not expire on commit, they cannot be lazy loaded
+    AsyncSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=async_engine,
+        class_=AsyncSession,
+    )
+
+    async_test_engine = create_async_engine(
+        f"{ASYNC_DATABASE_URI}_test",
+        **engine_options(MonitoredAsyncAdaptedQueuePool),
+    )
+    monitor_pool(async_test_engine.sync_engine, "async_test")
+    instrument_engine(async_test_engine.sync_engine)
+    AsyncTestingSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=async_test_engine,
+        class_=AsyncSession,
+    )
@@ -1,12 +1,32 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from app import crud
 from app.api.api_v1.api import api_router
+from app.api.metrics import MetricsMiddleware, QueryStatsMiddleware
+from app.api.pagination import (
+    NEXT_CURSOR_HEADER,
+    TOTAL_COUNT_HEADER,
+    TOTAL_COUNT_TYPE_HEADER,
+)
+from app.api.responses import ORJSONResponse
+from app.core import security
 from app.core.config import settings
+from app.core.hashing import bulk_password_hasher, password_hasher
+from app.core.metrics import registry
+from app.crud.base import InvalidCursor
+from app.db.session import SessionLocal
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -15,11 +35,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        NEXT_CURSOR_HEADER,
+        TOTAL_COUNT_HEADER,
+        TOTAL_COUNT_TYPE_HEADER,
+        "ETag",
+        "Server-Timing",
+    ],
 )
+app.add_middleware(QueryStatsMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": "Invalid cursor"})
+
+
+@app.on_event("startup")
+def load_role_catalog() -> None:
+    # When the database is not reachable yet the catalog loads on first use
+    db = SessionLocal()
+    try:
+        crud.role.load_catalog(db)
+    except SQLAlchemyError:
+        logger.exception("Could not preload the role catalog")
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def shutdown_hashing_executors() -> None:
+    password_hasher.shutdown()
+    bulk_password_hasher.shutdown()
+
+
 @app.get("/health")
 def health():
     return {"message": "ok!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Request, database, cache, hashing and connection pool metrics for
+    Prometheus.
+    """
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/.well-known/jwks.json")
+def jwks(response: Response):
+    """
+    Public keys for verifying access tokens without calling this service.
+    """
+    response.headers[
+        "Cache-Control"
+    ] = f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}"
+    return security.JWKS
@@ -2,7 +2,7 @@ import datetime
 from uuid import uuid4
 
 from app.db.base_class import Base
-from sqlalchemy import Boolean, Column, DateTime, String
+from sqlalchemy import Boolean, Column, DateTime, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -12,6 +12,9 @@ class Account(Base):
     Database model for an account
     """
 
+    # Keyset pagination, see CRUDBase.paginate
+    __table_args__ = (Index("ix_accounts_created_at_id", "created_at", "id"),)
+
     id = Column(
         UUID(as_uuid=True), primary_key=True, index=True, default=uuid4
     )
@@ -28,3 +31,7 @@ class Account(Base):
     )
 
     users = relationship("User", back_populates="account")
+    # Only loaded when asked for, see CRUDAccount.get_multi
+    stats = relationship(
+        "AccountStats", uselist=False, viewonly=True, lazy="noload"
+    )
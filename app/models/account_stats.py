@@ -0,0 +1,205 @@
+import datetime
+
+from app.db.base_class import Base
+from sqlalchemy import DDL, Column, DateTime, ForeignKey, Integer, event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+# Keep account_stats and account_role_stats in step with every write to
+# users and user_roles, in the same transaction. Statement level triggers
+# aggregate the rows a statement changed through its transition tables, so
+# a bulk write upserts once per account, and per account and role, instead
+# of once per row. Created with the tables by create_all, and by the
+# add_account_stats migration
+ACCOUNT_STATS_TRIGGERS = """
+CREATE OR REPLACE FUNCTION account_stats_add(
+    target uuid, users integer, active integer
+) RETURNS void AS $$
+BEGIN
+    IF target IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO account_stats AS stats
+        (account_id, user_count, active_user_count, updated_at)
+    VALUES (target, users, active, now() AT TIME ZONE 'utc')
+    ON CONFLICT (account_id) DO UPDATE SET
+        user_count = stats.user_count + excluded.user_count,
+        active_user_count =
+            stats.active_user_count + excluded.active_user_count,
+        updated_at = excluded.updated_at;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION account_role_stats_add(
+    target uuid, role uuid, users integer
+) RETURNS void AS $$
+BEGIN
+    IF target IS NULL OR role IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO account_role_stats AS stats (account_id, role_id, user_count)
+    VALUES (target, role, users)
+    ON CONFLICT (account_id, role_id) DO UPDATE SET
+        user_count = stats.user_count + excluded.user_count;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION users_account_stats() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    -- Users the statement added to (sign 1) or removed from (sign -1) the
+    -- counts of an account. Updates only count users whose account or
+    -- is_active changed
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT id, account_id, is_active, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT id, account_id, is_active, -1 AS sign FROM old_rows'
+        ELSE
+            'WITH moved AS ('
+            '    SELECT new_rows.*, old_rows.account_id AS old_account_id,'
+            '        old_rows.is_active AS old_is_active'
+            '    FROM new_rows JOIN old_rows ON old_rows.id = new_rows.id'
+            '    WHERE old_rows.account_id'
+            '        IS DISTINCT FROM new_rows.account_id'
+            '        OR old_rows.is_active IS DISTINCT FROM new_rows.is_active'
+            ') '
+            'SELECT id, account_id, is_active, 1 AS sign FROM moved '
+            'UNION ALL '
+            'SELECT id, old_account_id, old_is_active, -1 FROM moved'
+    END;
+    EXECUTE
+        'SELECT account_stats_add('
+        '    account_id,'
+        '    sum(sign)::integer,'
+        '    coalesce(sum(sign) FILTER (WHERE is_active), 0)::integer'
+        ') '
+        'FROM (' || changes || ') AS changes GROUP BY account_id';
+    EXECUTE
+        'SELECT account_role_stats_add('
+        '    changes.account_id, user_roles.role_id, sum(sign)::integer'
+        ') '
+        'FROM (' || changes || ') AS changes '
+        'JOIN user_roles ON user_roles.user_id = changes.id '
+        'GROUP BY changes.account_id, user_roles.role_id '
+        'HAVING sum(sign) <> 0';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION user_roles_account_stats() RETURNS trigger AS $$
+DECLARE
+    changes text;
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT user_id, role_id, 1 AS sign FROM new_rows'
+        WHEN 'DELETE' THEN
+            'SELECT user_id, role_id, -1 AS sign FROM old_rows'
+        ELSE
+            'SELECT user_id, role_id, 1 AS sign FROM new_rows '
+            'UNION ALL '
+            'SELECT user_id, role_id, -1 FROM old_rows'
+    END;
+    EXECUTE
+        'SELECT account_role_stats_add('
+        '    users.account_id, changes.role_id, sum(sign)::integer'
+        ') '
+        'FROM (' || changes || ') AS changes '
+        'JOIN users ON users.id = changes.user_id '
+        'GROUP BY users.account_id, changes.role_id '
+        'HAVING sum(sign) <> 0';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_account_stats_insert
+    AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE users_account_stats();
+
+CREATE TRIGGER users_account_stats_update
+    AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE users_account_stats();
+
+CREATE TRIGGER users_account_stats_delete
+    AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE users_account_stats();
+
+CREATE TRIGGER user_roles_account_stats_insert
+    AFTER INSERT ON user_roles
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE user_roles_account_stats();
+
+CREATE TRIGGER user_roles_account_stats_update
+    AFTER UPDATE ON user_roles
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE user_roles_account_stats();
+
+CREATE TRIGGER user_roles_account_stats_delete
+    AFTER DELETE ON user_roles
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE user_roles_account_stats();
+"""
+
+
+class AccountStats(Base):
+    """
+    Database model for the user counts of an account, see
+    ACCOUNT_STATS_TRIGGERS
+    """
+
+    __tablename__ = "account_stats"
+    account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("accounts.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    user_count = Column(Integer, nullable=False, server_default="0")
+    active_user_count = Column(Integer, nullable=False, server_default="0")
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    roles = relationship(
+        "AccountRoleStats",
+        primaryjoin=(
+            "and_(AccountStats.account_id == "
+            "foreign(AccountRoleStats.account_id), "
+            "AccountRoleStats.user_count > 0)"
+        ),
+        order_by="AccountRoleStats.role_id",
+        viewonly=True,
+        lazy="selectin",
+    )
+
+    @property
+    def inactive_user_count(self) -> int:
+        return self.user_count - self.active_user_count
+
+
+class AccountRoleStats(Base):
+    """
+    Database model for the number of users with a role in an account
+    """
+
+    __tablename__ = "account_role_stats"
+    account_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("accounts.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    role_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("roles.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    user_count = Column(Integer, nullable=False, server_default="0")
+
+
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(ACCOUNT_STATS_TRIGGERS).execute_if(dialect="postgresql"),
+)
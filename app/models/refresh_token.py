@@ -0,0 +1,32 @@
+import datetime
+from uuid import uuid4
+
+from app.db.base_class import Base
+from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+
+
+class RefreshToken(Base):
+    """
+    Database model for a refresh token. Only a digest of the token is
+    stored. Tokens issued by rotating one another share a family_id.
+    """
+
+    __tablename__ = "refresh_tokens"
+    id = Column(
+        UUID(as_uuid=True), primary_key=True, index=True, default=uuid4
+    )
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    family_id = Column(UUID(as_uuid=True), index=True, nullable=False)
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        index=True,
+        nullable=False,
+    )
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    user = relationship("User")
@@ -2,7 +2,15 @@ import datetime
 from uuid import uuid4
 
 from app.db.base_class import Base
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    text,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -12,6 +20,24 @@ class User(Base):
     Database Model for an application user
     """
 
+    # Keyset pagination, see CRUDBase.paginate
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index(
+            "ix_users_account_id_created_at_id",
+            "account_id",
+            "created_at",
+            "id",
+        ),
+        # Email prefixes of CRUDUser.search. Its full name substrings use
+        # ix_users_lower_full_name_trgm, which needs the pg_trgm extension
+        # and is only created by its migration
+        Index(
+            "ix_users_lower_email_pattern",
+            text("lower(email) text_pattern_ops"),
+        ),
+    )
+
     id = Column(
         UUID(as_uuid=True), primary_key=True, index=True, default=uuid4
     )
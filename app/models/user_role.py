@@ -1,5 +1,5 @@
 from app.db.base_class import Base
-from sqlalchemy import Column, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -24,4 +24,7 @@ class UserRole(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "role_id", name="unique_user_role"),
+        # A user has a single role, also the conflict target of
+        # CRUDUserRole.upsert_multi
+        Index("ix_user_roles_user_id", "user_id", unique=True),
     )
@@ -0,0 +1,33 @@
+import argparse
+import logging
+import uuid
+
+from app import crud
+from app.db.session import SessionLocal
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recount the account stats from the users table"
+    )
+    parser.add_argument(
+        "--account-id",
+        type=uuid.UUID,
+        default=None,
+        help="Only recount this account",
+    )
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        logger.info("Rebuilding account stats")
+        crud.account_stats.rebuild(db, account_id=args.account_id)
+        logger.info("Account stats rebuilt")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,20 @@
-from .account import Account, AccountCreate, AccountInDB, AccountUpdate
+from .account import (
+    Account,
+    AccountCreate,
+    AccountInDB,
+    AccountUpdate,
+    AccountWithStats,
+)
+from .account_stats import AccountRoleStats, AccountStats
+from .bulk import BulkItemResult
 from .msg import Msg
+from .refresh_token import RefreshTokenCreate, RefreshTokenUpdate
 from .role import Role, RoleCreate, RoleInDB, RoleUpdate
-from .token import Token, TokenPayload
+from .token import (
+    Token,
+    TokenIntrospection,
+    TokenIntrospectionRequest,
+    TokenPayload,
+)
 from .user import User, UserCreate, UserInDB, UserUpdate
 from .user_role import UserRole, UserRoleCreate, UserRoleInDB, UserRoleUpdate
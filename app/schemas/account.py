@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
+from app.schemas.account_stats import AccountStats
 from pydantic import UUID4, BaseModel
 
 
@@ -37,5 +38,10 @@ class Account(AccountInDBBase):
     pass
 
 
+# Returned by GET /accounts, stats are only set with ?stats=true
+class AccountWithStats(Account):
+    stats: Optional[AccountStats]
+
+
 class AccountInDB(AccountInDBBase):
     pass
@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import UUID4, BaseModel
+
+
+class AccountRoleStats(BaseModel):
+    role_id: UUID4
+    user_count: int
+
+    class Config:
+        orm_mode = True
+
+
+# Properties to return via API
+class AccountStats(BaseModel):
+    account_id: UUID4
+    user_count: int = 0
+    active_user_count: int = 0
+    inactive_user_count: int = 0
+    roles: List[AccountRoleStats] = []
+    updated_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,11 @@
+from typing import Optional
+
+from pydantic import UUID4, BaseModel
+
+
+# Outcome of one row of a bulk request, rows are numbered from 0
+class BulkItemResult(BaseModel):
+    row: int
+    status: str
+    id: Optional[UUID4] = None
+    detail: Optional[str] = None
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import UUID4, BaseModel
+
+
+# Properties to receive on creation
+class RefreshTokenCreate(BaseModel):
+    token_hash: str
+    family_id: UUID4
+    user_id: UUID4
+    expires_at: datetime
+
+
+# Properties to receive on update
+class RefreshTokenUpdate(BaseModel):
+    revoked_at: Optional[datetime]
@@ -1,12 +1,31 @@
-from pydantic import UUID4, BaseModel
+from typing import List, Optional
+
+from app.core.config import settings
+from pydantic import UUID4, BaseModel, Field
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 
 class TokenPayload(BaseModel):
     id: UUID4
     role: str = None
     account_id: UUID4 = None
+    exp: int = None
+
+
+class TokenIntrospectionRequest(BaseModel):
+    tokens: List[str] = Field(
+        ..., max_items=settings.INTROSPECTION_MAX_TOKENS
+    )
+
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    id: Optional[UUID4] = None
+    role: Optional[str] = None
+    account_id: Optional[UUID4] = None
+    exp: Optional[int] = None
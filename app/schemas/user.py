@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Optional
 
 from app.schemas.user_role import UserRole
-from pydantic import UUID4, BaseModel, EmailStr
+from pydantic import UUID4, BaseModel, EmailStr, constr
 
 
 # Shared properties
@@ -10,7 +10,8 @@ class UserBase(BaseModel):
     email: Optional[EmailStr] = None
     is_active: Optional[bool] = True
     full_name: Optional[str] = None
-    phone_number: Optional[str] = None
+    # Length of users.phone_number
+    phone_number: Optional[constr(max_length=13)] = None
     account_id: Optional[UUID4] = None
 
 
@@ -11,4 +11,7 @@ alembic upgrade head
 python /app/app/initial_test_data.py
 
 # Run tests
-pytest --cov=app --cov-report=term-missing tests
\ No newline at end of file
+pytest --cov=app --cov-report=term-missing tests
+
+# Run the users router again on an AsyncSession
+ASYNC_DB=True pytest tests/api/api_v1/test_users.py tests/api/test_deps.py
\ No newline at end of file
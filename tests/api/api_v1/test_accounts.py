@@ -1,5 +1,11 @@
+import csv
+import io
+from uuid import uuid4
+
 from app import crud, schemas
 from app.core.config import settings
+from app.models.account import Account
+from app.schemas.user import UserCreate
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from tests.utils.user import regular_user_email
@@ -201,3 +207,153 @@ def test_get_users_for_own_account(
         headers=superadmin_token_headers,
     )
     assert 200 <= r.status_code < 300
+
+
+def test_export_accounts(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    account_name = random_lower_string()
+    db.add(Account(name=account_name))
+    db.commit()
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/export",
+        headers=superadmin_token_headers,
+        params={"format": "csv"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert account_name in [row["name"] for row in rows]
+
+
+def test_get_users_for_account_count(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    account = Account(name=random_lower_string())
+    db.add(account)
+    db.commit()
+    for _ in range(2):
+        crud.user.create(
+            db,
+            obj_in=UserCreate(
+                email=random_email(),
+                password=random_lower_string(),
+                account_id=account.id,
+            ),
+        )
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/{account.id}/users",
+        headers=superadmin_token_headers,
+        params={"count": True, "limit": 1},
+    )
+    assert r.status_code == 200
+    assert len(r.json()) == 1
+    assert r.headers["X-Total-Count"] == "2"
+    assert r.headers["X-Total-Count-Type"] == "exact"
+
+    # Read from the account stats, exact right after a write
+    crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=random_email(),
+            password=random_lower_string(),
+            account_id=account.id,
+        ),
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/{account.id}/users",
+        headers=superadmin_token_headers,
+        params={"count": True},
+    )
+    assert r.headers["X-Total-Count"] == "3"
+    assert r.headers["X-Total-Count-Type"] == "exact"
+
+
+def test_get_accounts_estimated_count(
+    client: TestClient,
+    superadmin_token_headers: dict,
+    db: Session,
+    monkeypatch,
+) -> None:
+    monkeypatch.setattr(settings, "EXACT_COUNT_THRESHOLD", 0)
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts",
+        headers=superadmin_token_headers,
+        params={"count": True},
+    )
+    assert r.status_code == 200
+    assert r.headers["X-Total-Count-Type"] == "estimate"
+    assert int(r.headers["X-Total-Count"]) >= 0
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts", headers=superadmin_token_headers
+    )
+    assert "X-Total-Count" not in r.headers
+
+
+def test_get_account_stats(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    account = Account(name=random_lower_string())
+    db.add(account)
+    db.commit()
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/{account.id}/stats",
+        headers=superadmin_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json()["user_count"] == 0
+
+    crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=random_email(),
+            password=random_lower_string(),
+            account_id=account.id,
+        ),
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/{account.id}/stats",
+        headers=superadmin_token_headers,
+    )
+    assert r.json()["user_count"] == 1
+    assert r.json()["active_user_count"] == 1
+
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts",
+        headers=superadmin_token_headers,
+        params={"stats": True, "limit": 1000},
+    )
+    stats = {
+        item["id"]: item["stats"] for item in r.json() if item["stats"]
+    }
+    assert stats[str(account.id)]["user_count"] == 1
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts",
+        headers=superadmin_token_headers,
+        params={"fields": "id,stats", "stats": True},
+    )
+    assert r.status_code == 200
+    assert set(r.json()[0]) == {"id", "stats"}
+
+
+def test_get_account_for_user_fields(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/me",
+        headers=superadmin_token_headers,
+        params={"fields": "id,name"},
+    )
+    assert r.status_code == 200
+    assert r.json()["name"] == settings.FIRST_SUPER_ADMIN_ACCOUNT_NAME
+    assert set(r.json()) == {"id", "name"}
+
+
+def test_get_account_stats_of_missing_account(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/accounts/{uuid4()}/stats",
+        headers=superadmin_token_headers,
+    )
+    assert r.status_code == 404
@@ -1,8 +1,21 @@
-from typing import Dict
+from typing import Any, Dict
 
+from app import crud
+from app.core.cache import rejected_token_cache, token_cache
 from app.core.config import settings
+from app.core.throttle import login_throttle
+from app.models.account import Account
+from app.schemas.user import UserCreate, UserUpdate
 from fastapi.testclient import TestClient
-from tests.utils.user import regular_user_email, regular_user_password
+from pytest import MonkeyPatch
+from sqlalchemy.orm import Session
+from tests.utils.queries import assert_num_queries
+from tests.utils.user import (
+    regular_user_email,
+    regular_user_password,
+    user_authentication_headers,
+)
+from tests.utils.utils import random_email, random_lower_string
 
 
 def test_get_access_token(client: TestClient) -> None:
@@ -29,3 +42,264 @@ def test_use_access_token(
     result = r.json()
     assert r.status_code == 200
     assert "email" in result
+
+
+def test_get_cache_stats(
+    client: TestClient, superadmin_token_headers: Dict[str, str]
+) -> None:
+    def principal_stats() -> Dict[str, Any]:
+        r = client.get(
+            f"{settings.API_V1_STR}/stats/caches",
+            headers=superadmin_token_headers,
+        )
+        assert r.status_code == 200
+        return r.json()["principal"]
+
+    before = principal_stats()
+    for _ in range(2):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me", headers=superadmin_token_headers
+        )
+        assert r.status_code == 200
+    after = principal_stats()
+    # Both requests, and the stats request itself, are served from the cache
+    assert after["hits"] >= before["hits"] + 3
+    assert after["misses"] == before["misses"]
+    assert "evictions" in after
+
+
+def test_repeated_token_is_served_from_cache(
+    client: TestClient, superadmin_token_headers: Dict[str, str]
+) -> None:
+    hits = token_cache.stats()["hits"]
+    for _ in range(2):
+        r = client.post(
+            f"{settings.API_V1_STR}/auth/test-token",
+            headers=superadmin_token_headers,
+        )
+        assert r.status_code == 200
+    assert token_cache.stats()["hits"] >= hits + 2
+
+
+def test_invalid_token_is_rejected_from_cache(client: TestClient) -> None:
+    headers = {"Authorization": "Bearer not-a-valid-token"}
+    hits = rejected_token_cache.stats()["hits"]
+    for _ in range(2):
+        r = client.post(
+            f"{settings.API_V1_STR}/auth/test-token", headers=headers
+        )
+        assert r.status_code == 403
+    assert rejected_token_cache.stats()["hits"] == hits + 1
+
+
+def get_refresh_token(client: TestClient) -> str:
+    login_data = {
+        "username": regular_user_email,
+        "password": regular_user_password,
+    }
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token", data=login_data
+    )
+    return r.json()["refresh_token"]
+
+
+def test_refresh_access_token(
+    client: TestClient, normal_user_token_headers: Dict[str, str]
+) -> None:
+    refresh_token = get_refresh_token(client)
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/refresh",
+        json={"refresh_token": refresh_token},
+    )
+    tokens = r.json()
+    assert r.status_code == 200
+    assert tokens["access_token"]
+    assert tokens["refresh_token"] != refresh_token
+
+
+def test_reused_refresh_token_revokes_family(
+    client: TestClient, normal_user_token_headers: Dict[str, str]
+) -> None:
+    refresh_token = get_refresh_token(client)
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/refresh",
+        json={"refresh_token": refresh_token},
+    )
+    rotated_refresh_token = r.json()["refresh_token"]
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/refresh",
+        json={"refresh_token": refresh_token},
+    )
+    assert r.status_code == 401
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/refresh",
+        json={"refresh_token": rotated_refresh_token},
+    )
+    assert r.status_code == 401
+
+
+def test_revoke_refresh_tokens(
+    client: TestClient, superadmin_token_headers: Dict[str, str]
+) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPER_ADMIN_EMAIL,
+        "password": settings.FIRST_SUPER_ADMIN_PASSWORD,
+    }
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token", data=login_data
+    )
+    refresh_token = r.json()["refresh_token"]
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/revoke", headers=superadmin_token_headers
+    )
+    assert r.status_code == 200
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/refresh",
+        json={"refresh_token": refresh_token},
+    )
+    assert r.status_code == 401
+
+
+def test_introspect_tokens(
+    client: TestClient, superadmin_token_headers: Dict[str, str]
+) -> None:
+    token = superadmin_token_headers["Authorization"].split(" ")[1]
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/introspect",
+        headers=superadmin_token_headers,
+        json={"tokens": [token, "not-a-valid-token"]},
+    )
+    introspections = r.json()
+    assert r.status_code == 200
+    assert introspections[0]["active"] is True
+    assert introspections[0]["role"] == "SUPER_ADMIN"
+    assert introspections[0]["exp"]
+    assert introspections[1] == {
+        "active": False,
+        "id": None,
+        "role": None,
+        "account_id": None,
+        "exp": None,
+    }
+
+
+def test_introspect_reports_current_account(
+    client: TestClient, superadmin_token_headers: Dict[str, str], db: Session
+) -> None:
+    old_account = Account(name=random_lower_string())
+    new_account = Account(name=random_lower_string())
+    db.add_all([old_account, new_account])
+    db.commit()
+    email, password = random_email(), random_lower_string()
+    user = crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=email, password=password, account_id=old_account.id
+        ),
+    )
+    headers = user_authentication_headers(
+        client=client, email=email, password=password
+    )
+    token = headers["Authorization"].split(" ")[1]
+    # Moved after the token was issued
+    crud.user.update(
+        db, db_obj=user, obj_in=UserUpdate(account_id=new_account.id)
+    )
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/introspect",
+        headers=superadmin_token_headers,
+        json={"tokens": [token]},
+    )
+    assert r.status_code == 200
+    assert r.json()[0]["active"] is True
+    assert r.json()[0]["account_id"] == str(new_account.id)
+    # No role assigned, reported like the token's claim
+    assert r.json()[0]["role"] == "GUEST"
+
+
+def test_introspect_too_many_tokens(
+    client: TestClient, superadmin_token_headers: Dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/introspect",
+        headers=superadmin_token_headers,
+        json={"tokens": ["token"] * (settings.INTROSPECTION_MAX_TOKENS + 1)},
+    )
+    assert r.status_code == 422
+
+
+def test_login_queries(client: TestClient) -> None:
+    login_data = {
+        "username": regular_user_email,
+        "password": regular_user_password,
+    }
+    # One SELECT for the user joined to its role, one INSERT for the
+    # refresh token
+    with assert_num_queries(2):
+        r = client.post(
+            f"{settings.API_V1_STR}/auth/access-token", data=login_data
+        )
+    assert r.status_code == 200
+
+
+def test_login_is_throttled(
+    client: TestClient,
+    superadmin_token_headers: Dict[str, str],
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(login_throttle, "username_capacity", 2)
+    login_data = {"username": random_email(), "password": "wrong"}
+    for _ in range(2):
+        r = client.post(
+            f"{settings.API_V1_STR}/auth/access-token", data=login_data
+        )
+        assert r.status_code == 400
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token", data=login_data
+    )
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) > 0
+    r = client.get(
+        f"{settings.API_V1_STR}/stats/login-throttle",
+        headers=superadmin_token_headers,
+    )
+    assert r.status_code == 200
+    assert r.json()["throttled_username"] >= 1
+
+
+def test_login_is_throttled_per_forwarded_client(
+    client: TestClient, monkeypatch: MonkeyPatch
+) -> None:
+    # The test client connects from "testclient", standing in for a proxy
+    monkeypatch.setattr(login_throttle, "ip_capacity", 1)
+    monkeypatch.setattr(login_throttle, "is_trusted_proxy", lambda ip: True)
+    login_data = {
+        "username": regular_user_email,
+        "password": regular_user_password,
+    }
+    for _ in range(3):
+        r = client.post(
+            f"{settings.API_V1_STR}/auth/access-token",
+            data=login_data,
+            headers={"X-Forwarded-For": "1.2.3.4"},
+        )
+        assert r.status_code == 200
+    login_data["password"] = "wrong"
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token",
+        data=login_data,
+        headers={"X-Forwarded-For": "1.2.3.4"},
+    )
+    assert r.status_code == 400
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token",
+        data=login_data,
+        headers={"X-Forwarded-For": "1.2.3.4"},
+    )
+    assert r.status_code == 429
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token",
+        data=login_data,
+        headers={"X-Forwarded-For": "5.6.7.8"},
+    )
+    assert r.status_code == 400
@@ -0,0 +1,50 @@
+from app import crud
+from app.core.config import settings
+from app.schemas.role import RoleCreate
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from tests.utils.queries import assert_num_queries
+from tests.utils.utils import random_lower_string
+
+
+def test_get_roles_from_catalog(client: TestClient, db: Session) -> None:
+    crud.role.load_catalog(db)
+    with assert_num_queries(0):
+        r = client.get(f"{settings.API_V1_STR}/roles/")
+    assert r.status_code == 200
+    names = [role["name"] for role in r.json()]
+    assert "ACCOUNT_ADMIN" in names
+    ids = [role["id"] for role in r.json()]
+    assert ids == sorted(ids)
+
+
+def test_get_roles_not_modified(client: TestClient, db: Session) -> None:
+    r = client.get(f"{settings.API_V1_STR}/roles/")
+    etag = r.headers["ETag"]
+    r = client.get(
+        f"{settings.API_V1_STR}/roles/", headers={"If-None-Match": etag}
+    )
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+
+    role_in = RoleCreate(name=random_lower_string(), description="new")
+    crud.role.create(db, obj_in=role_in)
+    r = client.get(
+        f"{settings.API_V1_STR}/roles/", headers={"If-None-Match": etag}
+    )
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert role_in.name in [role["name"] for role in r.json()]
+
+
+def test_get_roles_cursor(client: TestClient, db: Session) -> None:
+    r = client.get(f"{settings.API_V1_STR}/roles/", params={"limit": 2})
+    first_page = r.json()
+    assert len(first_page) == 2
+    r = client.get(
+        f"{settings.API_V1_STR}/roles/",
+        params={"limit": 2, "cursor": r.headers["X-Next-Cursor"]},
+    )
+    assert r.status_code == 200
+    assert r.json()
+    assert r.json()[0]["id"] > first_page[-1]["id"]
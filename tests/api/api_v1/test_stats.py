@@ -0,0 +1,17 @@
+from typing import Dict
+
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+
+def test_db_pool_stats(
+    client: TestClient, superadmin_token_headers: Dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/stats/db-pool",
+        headers=superadmin_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()["test"]
+    assert stats["checkouts"] > 0
+    assert stats["size"] == settings.DB_POOL_SIZE
@@ -1,10 +1,14 @@
+from uuid import uuid4
+
 from app import crud
 from app.constants.role import Role
 from app.core.config import settings
+from app.models.account import Account
 from app.schemas.user import UserCreate
 from app.schemas.user_role import UserRoleCreate
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
+from tests.utils.user import user_authentication_headers
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -102,3 +106,119 @@ def test_update_user_role_by_unauthorized_user_fails(
         json=data,
     )
     assert r.status_code == 401
+
+
+def test_assign_user_roles_bulk(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    users = [
+        crud.user.create(
+            db,
+            obj_in=UserCreate(
+                email=random_email(), password=random_lower_string()
+            ),
+        )
+        for _ in range(3)
+    ]
+    manager = crud.role.get_by_name(db, name=Role.ACCOUNT_MANAGER["name"])
+    admin = crud.role.get_by_name(db, name=Role.ACCOUNT_ADMIN["name"])
+    crud.user_role.create(
+        db, obj_in=UserRoleCreate(user_id=users[1].id, role_id=manager.id)
+    )
+    crud.user_role.create(
+        db, obj_in=UserRoleCreate(user_id=users[2].id, role_id=admin.id)
+    )
+    data = [
+        {"user_id": str(users[0].id), "role_id": str(admin.id)},
+        {"user_id": str(users[1].id), "role_id": str(admin.id)},
+        {"user_id": str(users[2].id), "role_id": str(admin.id)},
+        {"user_id": str(users[0].id), "role_id": str(manager.id)},
+        {"user_id": str(uuid4()), "role_id": str(admin.id)},
+        {"user_id": str(users[1].id), "role_id": str(uuid4())},
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/user-roles/bulk",
+        headers=superadmin_token_headers,
+        json=data,
+    )
+    assert r.status_code == 200
+    assert [result["status"] for result in r.json()] == [
+        "created",
+        "updated",
+        "unchanged",
+        "duplicate",
+        "invalid",
+        "invalid",
+    ]
+    role_ids = crud.user_role.get_role_ids_by_user_ids(
+        db, user_ids=[user.id for user in users]
+    )
+    assert role_ids == {user.id: admin.id for user in users}
+
+
+def test_assign_user_roles_bulk_by_account_admin(
+    client: TestClient, db: Session
+) -> None:
+    account = Account(name=random_lower_string())
+    other_account = Account(name=random_lower_string())
+    db.add_all([account, other_account])
+    db.commit()
+    email, password = random_email(), random_lower_string()
+    account_admin, member, outsider, admin_member = [
+        crud.user.create(
+            db,
+            obj_in=UserCreate(
+                email=user_email,
+                password=password,
+                account_id=user_account.id,
+            ),
+        )
+        for user_email, user_account in [
+            (email, account),
+            (random_email(), account),
+            (random_email(), other_account),
+            (random_email(), account),
+        ]
+    ]
+    roles = {name: crud.role.get_by_name(db, name=name) for name in Role.RANKS}
+    crud.user_role.create(
+        db,
+        obj_in=UserRoleCreate(
+            user_id=account_admin.id,
+            role_id=roles[Role.ACCOUNT_ADMIN["name"]].id,
+        ),
+    )
+    crud.user_role.create(
+        db,
+        obj_in=UserRoleCreate(
+            user_id=admin_member.id, role_id=roles[Role.ADMIN["name"]].id
+        ),
+    )
+    headers = user_authentication_headers(
+        client=client, email=email, password=password
+    )
+    guest = str(roles[Role.GUEST["name"]].id)
+    data = [
+        {"user_id": str(member.id), "role_id": guest},
+        {"user_id": str(outsider.id), "role_id": guest},
+        {
+            "user_id": str(account_admin.id),
+            "role_id": str(roles[Role.SUPER_ADMIN["name"]].id),
+        },
+        {"user_id": str(admin_member.id), "role_id": guest},
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/user-roles/bulk", headers=headers, json=data
+    )
+    assert r.status_code == 200
+    results = r.json()
+    assert [result["status"] for result in results] == [
+        "created",
+        "invalid",
+        "invalid",
+        "invalid",
+    ]
+    assert results[1]["detail"] == "User does not exist"
+    assert results[2]["detail"] == "Role is above the caller's role"
+    assert results[3]["detail"] == "Role is above the caller's role"
+    assert crud.user_role.get_by_user_id(db, user_id=outsider.id) is None
@@ -1,12 +1,29 @@
-from typing import Dict
+import csv
+import io
+import json
+import threading
+from typing import Any, Dict
+from uuid import uuid4
 
+import pytest
 from app import crud
+from app.core.cache import principal_cache
 from app.core.config import settings
+from app.core.security import verify_password
+from app.db.session import test_engine
+from app.models.account import Account
+from app.models.user import User
 from app.schemas.user import UserCreate
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from tests.utils.queries import assert_num_queries, count_queries
 from tests.utils.user import regular_user_email
-from tests.utils.utils import random_email, random_lower_string
+from tests.utils.utils import (
+    random_email,
+    random_lower_string,
+    random_phone_number,
+)
 
 
 def test_get_own_user(
@@ -40,6 +57,39 @@ def test_create_user_by_superadmin(
     assert user.email == created_user["email"]
 
 
+@pytest.mark.skipif(settings.ASYNC_DB, reason="Queries on the event loop")
+def test_create_and_update_user_query_off_the_event_loop(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    # The TestClient runs the event loop in this thread, where the
+    # responses of async routes are validated
+    threads = []
+
+    def before_cursor_execute(*args: Any) -> None:
+        threads.append(threading.current_thread())
+
+    event.listen(test_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        r = client.post(
+            f"{settings.API_V1_STR}/users",
+            headers=superadmin_token_headers,
+            json={"email": random_email(), "password": random_lower_string()},
+        )
+        assert r.status_code == 200
+        r = client.put(
+            f"{settings.API_V1_STR}/users/{r.json()['id']}",
+            headers=superadmin_token_headers,
+            json={"full_name": random_lower_string()},
+        )
+        assert r.status_code == 200
+    finally:
+        event.remove(
+            test_engine, "before_cursor_execute", before_cursor_execute
+        )
+    assert threads
+    assert threading.current_thread() not in threads
+
+
 def test_create_user_by_normal_user_is_unauthorized(
     client: TestClient, normal_user_token_headers: dict, db: Session
 ) -> None:
@@ -187,3 +237,487 @@ def test_retrieve_users_by_normal_user_is_unauthorized(
         f"{settings.API_V1_STR}/users/", headers=normal_user_token_headers
     )
     assert r.status_code == 401
+
+
+def test_retrieve_users_with_count(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=random_email(), password=random_lower_string()
+        ),
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superadmin_token_headers,
+        params={"count": True, "limit": 1},
+    )
+    assert r.status_code == 200
+    assert len(r.json()) == 1
+    assert r.headers["X-Total-Count"] == str(db.query(User).count())
+    assert r.headers["X-Total-Count-Type"] == "exact"
+
+
+def test_deactivate_user_revokes_refresh_tokens(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.user.create(
+        db, obj_in=UserCreate(email=email, password=password)
+    )
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/access-token",
+        data={"username": email, "password": password},
+    )
+    refresh_token = r.json()["refresh_token"]
+    r = client.put(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superadmin_token_headers,
+        json={"is_active": False},
+    )
+    assert r.status_code == 200
+    assert r.json()["is_active"] is False
+    r = client.post(
+        f"{settings.API_V1_STR}/auth/refresh",
+        json={"refresh_token": refresh_token},
+    )
+    assert r.status_code == 401
+
+
+def test_update_own_user_refreshes_cached_principal(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me", headers=superadmin_token_headers
+    )
+    assert r.status_code == 200
+    full_name = random_lower_string()
+    r = client.put(
+        f"{settings.API_V1_STR}/users/me",
+        headers=superadmin_token_headers,
+        json={"full_name": full_name},
+    )
+    assert r.status_code == 200
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me", headers=superadmin_token_headers
+    )
+    assert r.json()["full_name"] == full_name
+
+
+def test_get_own_user_queries(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    principal_cache.clear()
+    # The user and its role are loaded in a single query
+    with assert_num_queries(1):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me",
+            headers=superadmin_token_headers,
+        )
+    assert r.status_code == 200
+    with assert_num_queries(0):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me",
+            headers=superadmin_token_headers,
+        )
+    assert r.status_code == 200
+    assert r.json()["user_role"]["role"]["name"] == "SUPER_ADMIN"
+
+
+def test_get_users_queries(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    client.get(
+        f"{settings.API_V1_STR}/users/me", headers=superadmin_token_headers
+    )
+    # Roles are eager loaded, so the page costs one query however many
+    # users it holds
+    with assert_num_queries(1):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/", headers=superadmin_token_headers
+        )
+    assert r.status_code == 200
+    assert len(r.json()) > 1
+
+
+def test_get_users_by_cursor(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    for _ in range(3):
+        crud.user.create(
+            db,
+            obj_in=UserCreate(
+                email=random_email(), password=random_lower_string()
+            ),
+        )
+    # The walk is checked against the keyset order in the database, the
+    # table holds users of other tests too
+    expected = [
+        str(user_id)
+        for user_id, in db.query(User.id).order_by(*crud.user.keyset)
+    ]
+
+    ids = []
+    cursor = None
+    while len(ids) < 6:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superadmin_token_headers,
+            params=params,
+        )
+        assert r.status_code == 200
+        ids.extend(user["id"] for user in r.json())
+        cursor = r.headers["X-Next-Cursor"]
+    assert ids == expected[:6]
+
+    # The page after the last user is empty and has no cursor
+    last = (
+        db.query(User)
+        .order_by(*[column.desc() for column in crud.user.keyset])
+        .first()
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superadmin_token_headers,
+        params={"cursor": crud.user.get_next_cursor([last], 1)},
+    )
+    assert r.status_code == 200
+    assert r.json() == []
+    assert "X-Next-Cursor" not in r.headers
+
+
+def test_get_users_by_invalid_cursor(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    for cursor in ["not-a-cursor", "WyJhIiwiYiJd"]:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superadmin_token_headers,
+            params={"cursor": cursor},
+        )
+        assert r.status_code == 400
+
+
+def test_get_users_fields(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    client.get(
+        f"{settings.API_V1_STR}/users/me", headers=superadmin_token_headers
+    )
+    with count_queries() as statements:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superadmin_token_headers,
+            params={"fields": "id,email,is_active", "limit": 2},
+        )
+    assert r.status_code == 200
+    assert "X-Next-Cursor" in r.headers
+    for user in r.json():
+        assert set(user) == {"id", "email", "is_active"}
+    # Only the requested and keyset columns are selected, without joins
+    assert len(statements) == 1
+    assert "hashed_password" not in statements[0]
+    assert "user_roles" not in statements[0]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superadmin_token_headers,
+        params={"fields": "email,user_role"},
+    )
+    assert r.status_code == 200
+    assert any(user["user_role"] for user in r.json())
+
+
+def test_get_user_fields(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers=superadmin_token_headers,
+        params={"fields": "id,email"},
+    )
+    assert r.status_code == 200
+    me = r.json()
+    assert set(me) == {"id", "email"}
+    assert me["email"] == settings.FIRST_SUPER_ADMIN_EMAIL
+
+    with count_queries() as statements:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/{me['id']}",
+            headers=superadmin_token_headers,
+            params={"fields": "email,is_active"},
+        )
+    assert r.status_code == 200
+    assert r.json() == {"email": me["email"], "is_active": True}
+    user_statements = [
+        statement for statement in statements if "FROM users" in statement
+    ]
+    assert "hashed_password" not in user_statements[-1]
+    assert "user_roles" not in user_statements[-1]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/{me['id']}",
+        headers=superadmin_token_headers,
+        params={"fields": "email,hashed_password"},
+    )
+    assert r.status_code == 400
+
+
+def test_get_users_unknown_fields(
+    client: TestClient, superadmin_token_headers: dict
+) -> None:
+    for fields in ["email,hashed_password", ","]:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superadmin_token_headers,
+            params={"fields": fields},
+        )
+        assert r.status_code == 400
+
+
+def test_search_users(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    account = Account(name=random_lower_string())
+    db.add(account)
+    db.commit()
+    email = random_email()
+    crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=email,
+            password=random_lower_string(),
+            account_id=account.id,
+        ),
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/users/search",
+        headers=superadmin_token_headers,
+        params={"q": email[:10], "account_id": str(account.id)},
+    )
+    assert r.status_code == 200
+    assert [user["email"] for user in r.json()] == [email]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/search",
+        headers=superadmin_token_headers,
+        params={"q": "ab"},
+    )
+    assert r.status_code == 422
+
+
+def test_create_users_bulk(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    existing_email = random_email()
+    user_in = UserCreate(email=existing_email, password=random_lower_string())
+    crud.user.create(db, obj_in=user_in)
+    new_email = random_email()
+    password = random_lower_string()
+    data = [
+        {"email": new_email, "password": password, "full_name": "New"},
+        {"email": existing_email, "password": random_lower_string()},
+        {"email": new_email, "password": random_lower_string()},
+        {"email": "not-an-email", "password": random_lower_string()},
+        {
+            "email": random_email(),
+            "password": random_lower_string(),
+            "account_id": str(uuid4()),
+        },
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers=superadmin_token_headers,
+        json=data,
+    )
+    assert r.status_code == 200
+    results = r.json()
+    assert [result["status"] for result in results] == [
+        "created",
+        "duplicate",
+        "duplicate",
+        "invalid",
+        "invalid",
+    ]
+    user = crud.user.get(db, id=results[0]["id"])
+    assert user.email == new_email
+    assert user.full_name == "New"
+    assert verify_password(password, user.hashed_password)
+
+
+def test_create_users_bulk_with_phone_numbers(
+    client: TestClient,
+    superadmin_token_headers: dict,
+    db: Session,
+    monkeypatch,
+) -> None:
+    taken_phone_number = random_phone_number()
+    crud.user.update(
+        db,
+        db_obj=crud.user.create(
+            db,
+            obj_in=UserCreate(
+                email=random_email(), password=random_lower_string()
+            ),
+        ),
+        obj_in={"phone_number": taken_phone_number},
+    )
+    phone_number = random_phone_number()
+    data = [
+        {
+            "email": random_email(),
+            "password": random_lower_string(),
+            "phone_number": phone_number,
+            "is_active": False,
+        },
+        {
+            "email": random_email(),
+            "password": random_lower_string(),
+            "phone_number": phone_number,
+        },
+        {
+            "email": random_email(),
+            "password": random_lower_string(),
+            "phone_number": taken_phone_number,
+        },
+        {
+            "email": random_email(),
+            "password": random_lower_string(),
+            "phone_number": "+" + "1" * 13,
+        },
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers=superadmin_token_headers,
+        json=data,
+    )
+    assert r.status_code == 200
+    results = r.json()
+    assert [result["status"] for result in results] == [
+        "created",
+        "duplicate",
+        "duplicate",
+        "invalid",
+    ]
+    assert results[1]["detail"] == "Phone number already exists"
+    user = crud.user.get(db, id=results[0]["id"])
+    assert user.phone_number == phone_number
+    assert user.is_active is False
+
+    # Taken between the check and the insert
+    def get_existing_phone_numbers(self: Any, db: Any, **kwargs: Any) -> Any:
+        return set()
+
+    async def get_existing_phone_numbers_async(
+        self: Any, db: Any, **kwargs: Any
+    ) -> Any:
+        return set()
+
+    for method in [
+        get_existing_phone_numbers,
+        get_existing_phone_numbers_async,
+    ]:
+        monkeypatch.setattr(type(crud.user), method.__name__, method)
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers=superadmin_token_headers,
+        json=[data[2]],
+    )
+    assert r.json()[0]["status"] == "duplicate"
+    assert r.json()[0]["detail"] == "Phone number already exists"
+
+
+def test_create_users_bulk_too_many_rows(
+    client: TestClient, superadmin_token_headers: dict, monkeypatch
+) -> None:
+    monkeypatch.setattr(settings, "BULK_IMPORT_MAX_ROWS", 1)
+    data = [
+        {"email": random_email(), "password": random_lower_string()}
+        for _ in range(2)
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers=superadmin_token_headers,
+        json=data,
+    )
+    assert r.status_code == 413
+
+
+def test_create_users_bulk_from_csv(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    emails = [random_email() for _ in range(3)]
+    lines = ["email,password,full_name"] + [
+        f"{email},{random_lower_string()}," for email in emails
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers={**superadmin_token_headers, "Content-Type": "text/csv"},
+        data="\n".join(lines),
+    )
+    assert r.status_code == 200
+    assert [result["status"] for result in r.json()] == ["created"] * 3
+    assert crud.user.get_existing_emails(db, emails=emails) == set(emails)
+
+
+def test_create_users_bulk_from_csv_with_extra_cells(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    emails = [random_email() for _ in range(2)]
+    lines = [
+        "email,password",
+        f"{emails[0]},{random_lower_string()},extra",
+        f"{emails[1]},{random_lower_string()}",
+    ]
+    r = client.post(
+        f"{settings.API_V1_STR}/users/bulk",
+        headers={**superadmin_token_headers, "Content-Type": "text/csv"},
+        data="\n".join(lines),
+    )
+    assert r.status_code == 200
+    results = r.json()
+    assert results[0]["status"] == "invalid"
+    assert results[0]["detail"] == "Too many columns"
+    assert results[1]["status"] == "created"
+    assert crud.user.get_existing_emails(db, emails=emails) == {emails[1]}
+
+
+def test_export_users(
+    client: TestClient, superadmin_token_headers: dict, db: Session
+) -> None:
+    # crud.account.create trips over the schema's field names
+    account = Account(name=random_lower_string())
+    db.add(account)
+    db.commit()
+    emails = sorted(random_email() for _ in range(3))
+    for email in emails:
+        user_in = UserCreate(
+            email=email, password=random_lower_string(), account_id=account.id
+        )
+        crud.user.create(db, obj_in=user_in)
+    r = client.get(
+        f"{settings.API_V1_STR}/users/export",
+        headers=superadmin_token_headers,
+        params={"account_id": str(account.id)},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    users = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted(user["email"] for user in users) == emails
+    assert users[0]["account_id"] == str(account.id)
+    assert users[0]["role"] is None
+    assert "hashed_password" not in users[0]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/export",
+        headers=superadmin_token_headers,
+        params={"account_id": str(account.id), "format": "csv"},
+    )
+    assert r.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert sorted(row["email"] for row in rows) == emails
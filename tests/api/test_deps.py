@@ -0,0 +1,38 @@
+import asyncio
+import threading
+from typing import Any, Coroutine
+
+from app.api import deps
+from app.core.config import settings
+from pytest import MonkeyPatch
+
+
+class FakeCRUD:
+    def get(self, db: Any, *, id: int) -> Any:
+        return "sync", db, id, threading.current_thread()
+
+    async def get_async(self, db: Any, *, id: int) -> Any:
+        return "async", db, id, threading.current_thread()
+
+
+def run(coroutine: Coroutine) -> Any:
+    # Leaves the current event loop of the main thread to the test clients
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_run_crud_in_threadpool(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "ASYNC_DB", False)
+    kind, db, id, thread = run(deps.run_crud(FakeCRUD().get, "db", id=1))
+    assert (kind, db, id) == ("sync", "db", 1)
+    assert thread is not threading.current_thread()
+
+
+def test_run_crud_awaits_async_counterpart(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "ASYNC_DB", True)
+    kind, db, id, thread = run(deps.run_crud(FakeCRUD().get, "db", id=1))
+    assert (kind, db, id) == ("async", "db", 1)
+    assert thread is threading.current_thread()
@@ -0,0 +1,56 @@
+from typing import Optional
+
+from app.api.responses import ORJSONResponse, ORJSONRoute
+from fastapi import APIRouter, FastAPI, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+
+class Item(BaseModel):
+    name: str
+    price: Optional[float] = None
+
+
+class ItemInDB(Item):
+    secret: str
+
+
+router = APIRouter(route_class=ORJSONRoute)
+
+
+@router.get("/items/{name}", response_model=Item)
+def read_item(name: str, response: Response) -> ItemInDB:
+    response.headers["X-Item"] = name
+    response.status_code = 203
+    return ItemInDB(name=name, price=1.5, secret="hidden")
+
+
+@router.get("/items", response_model=Item)
+async def read_invalid_item() -> dict:
+    return {"price": 2}
+
+
+app = FastAPI(default_response_class=ORJSONResponse)
+app.include_router(router)
+client = TestClient(app, raise_server_exceptions=False)
+
+
+def test_orjson_route_keeps_response_headers_and_status() -> None:
+    r = client.get("/items/spoon")
+    assert r.status_code == 203
+    assert r.headers["x-item"] == "spoon"
+    assert r.headers["content-type"] == "application/json"
+    # Fields of a subclass of the response model are left out
+    assert r.json() == {"name": "spoon", "price": 1.5}
+
+
+def test_orjson_route_validates_response() -> None:
+    r = client.get("/items")
+    assert r.status_code == 500
+
+
+def test_orjson_route_openapi() -> None:
+    operation = client.get("/openapi.json").json()["paths"]["/items/{name}"]
+    assert [param["name"] for param in operation["get"]["parameters"]] == [
+        "name"
+    ]
@@ -1,8 +1,10 @@
-from typing import Dict, Generator
+from typing import AsyncGenerator, Dict, Generator
 
 import pytest
-from app.api.deps import get_db
-from app.db.session import TestingSessionLocal
+from app import crud
+from app.api.deps import get_async_db, get_db
+from app.core.throttle import login_throttle
+from app.db.session import AsyncTestingSessionLocal, TestingSessionLocal
 from app.main import app
 from fastapi.testclient import TestClient
 
@@ -21,6 +23,16 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db() -> AsyncGenerator:
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
+
+@pytest.fixture(autouse=True)
+def reset_login_throttle() -> None:
+    login_throttle.reset()
+
+
 @pytest.fixture(scope="session")
 def db() -> Generator:
     yield TestingSessionLocal()
@@ -29,7 +41,14 @@ def db() -> Generator:
 @pytest.fixture(scope="module")
 def client() -> Generator:
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     with TestClient(app) as c:
+        # Startup loaded the catalog from the application database
+        db = TestingSessionLocal()
+        try:
+            crud.role.load_catalog(db)
+        finally:
+            db.close()
         yield c
 
 
@@ -0,0 +1,52 @@
+import time
+
+from app.core.cache import TTLCache
+
+
+def test_cache_hit_and_miss() -> None:
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("key") is None
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire() -> None:
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", "value", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("key") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_invalidation() -> None:
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    cache.invalidate("a")
+    assert cache.invalidate_where(lambda value: value > 2) == 1
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") is None
+
+
+def test_disabled_cache_stores_nothing() -> None:
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set("key", "value")
+    assert cache.get("key") is None
@@ -0,0 +1,59 @@
+import asyncio
+
+from app.core import security
+from app.core.hashing import (
+    HashingExecutor,
+    bulk_password_hasher,
+    calibrate_bcrypt_rounds,
+    password_hasher,
+)
+
+
+def test_hash_and_verify_password_async() -> None:
+    hashed_password = asyncio.run(security.get_password_hash_async("secret"))
+    assert security.verify_password("secret", hashed_password)
+    assert asyncio.run(
+        security.verify_password_async("secret", hashed_password)
+    )
+    assert not asyncio.run(
+        security.verify_password_async("wrong", hashed_password)
+    )
+
+
+def test_bulk_hashing_runs_on_its_own_pool() -> None:
+    submitted = password_hasher.stats()["submitted"]
+    bulk_submitted = bulk_password_hasher.stats()["submitted"]
+    hashes = asyncio.run(security.get_password_hashes_async(["a", "b"]))
+    assert security.verify_password("b", hashes[1])
+    assert password_hasher.stats()["submitted"] == submitted
+    assert bulk_password_hasher.stats()["submitted"] > bulk_submitted
+
+
+def test_hashing_executor_stats() -> None:
+    hasher = HashingExecutor(kind="thread", max_workers=2)
+
+    async def hash_passwords() -> list:
+        return await asyncio.gather(
+            *[
+                hasher.run(security.get_password_hash, "secret")
+                for _ in range(3)
+            ]
+        )
+
+    hashes = asyncio.run(hash_passwords())
+    hasher.shutdown()
+    stats = hasher.stats()
+    assert len(hashes) == 3
+    assert stats["submitted"] == 3
+    assert stats["completed"] == 3
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["avg_latency_ms"] >= stats["avg_run_time_ms"] > 0
+
+
+def test_calibrate_bcrypt_rounds() -> None:
+    rounds, latency = calibrate_bcrypt_rounds(target_ms=0)
+    assert rounds == 4
+    assert latency > 0
+    rounds, latency = calibrate_bcrypt_rounds(target_ms=60000, max_rounds=5)
+    assert rounds == 5
@@ -0,0 +1,21 @@
+from app.core.metrics import Counter, Histogram, MetricsRegistry
+
+
+def test_render_counter_and_histogram() -> None:
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("jobs_total", "Jobs", ["queue"]))
+    histogram = registry.register(
+        Histogram("job_seconds", "Job time", ["queue"], buckets=[0.1, 1])
+    )
+    counter.inc('say "hi"')
+    counter.inc('say "hi"', amount=2)
+    for value in [0.05, 0.1, 0.5, 5]:
+        histogram.observe(value, "default")
+    lines = registry.render().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{queue="say \\"hi\\""} 3.0' in lines
+    assert 'job_seconds_bucket{queue="default",le="0.1"} 2.0' in lines
+    assert 'job_seconds_bucket{queue="default",le="1.0"} 3.0' in lines
+    assert 'job_seconds_bucket{queue="default",le="+Inf"} 4.0' in lines
+    assert 'job_seconds_sum{queue="default"} 5.65' in lines
+    assert 'job_seconds_count{queue="default"} 4.0' in lines
@@ -0,0 +1,74 @@
+from typing import Any, Callable, Generator, List, Tuple
+
+import pytest
+from app.core.config import settings
+from app.db.pool import PoolMetrics, engine_options, monitor_pool, pool_metrics
+from app.db.session import test_engine
+from pytest import MonkeyPatch
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import Engine
+
+
+@pytest.fixture
+def make_engine(
+    monkeypatch: MonkeyPatch,
+) -> Generator[Callable[..., Tuple[Engine, PoolMetrics]], None, None]:
+    engines: List[Engine] = []
+
+    def make(**overrides: Any) -> Tuple[Engine, PoolMetrics]:
+        for name, value in overrides.items():
+            monkeypatch.setattr(settings, name, value)
+        engine = create_engine(test_engine.url, **engine_options())
+        engines.append(engine)
+        return engine, monitor_pool(engine, "test_pool")
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+    # Keep the disposed engine out of /stats/db-pool and /metrics
+    pool_metrics.pop("test_pool", None)
+
+
+def test_pool_metrics(make_engine: Callable) -> None:
+    engine, metrics = make_engine(
+        DB_POOL_SIZE=1, DB_MAX_OVERFLOW=0, DB_POOL_TIMEOUT=0.1
+    )
+    connection = engine.connect()
+    stats = metrics.stats()
+    assert stats["checked_out"] == 1
+    assert stats["size"] == 1
+    assert stats["checkouts"] == 1
+    assert stats["connects"] == 1
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert metrics.stats()["checkout_timeouts"] == 1
+    assert metrics.stats()["max_wait_ms"] >= 100
+    connection.close()
+    stats = metrics.stats()
+    assert stats["checked_out"] == 0
+    assert stats["idle"] == 1
+
+    engine.dispose()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert metrics.stats()["checkouts"] == 2
+
+
+def test_pool_pings_idle_connections(make_engine: Callable) -> None:
+    engine, metrics = make_engine(
+        DB_POOL_PRE_PING="idle", DB_POOL_PRE_PING_IDLE_SECONDS=0
+    )
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert metrics.stats()["pings"] == 0
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert metrics.stats()["pings"] == 1
+
+    # A connection that died while idle is replaced on checkout
+    engine.pool._pool.queue[0].connection.close()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    stats = metrics.stats()
+    assert stats["invalidations"] == 1
+    assert stats["connects"] == 2
@@ -0,0 +1,57 @@
+from app.core import security
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from pytest import MonkeyPatch
+
+
+def generate_rsa_private_key() -> str:
+    private_key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048
+    )
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+def test_create_and_decode_access_token() -> None:
+    token = security.create_access_token({"id": "user-id"})
+    payload = security.decode_access_token(token)
+    assert payload["id"] == "user-id"
+    assert "exp" in payload
+
+
+def test_rs256_token_verifies_with_published_key(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    private_key = generate_rsa_private_key()
+    public_jwk = security.get_public_jwk(private_key, "RS256")
+    monkeypatch.setattr(security, "ALGORITHM", "RS256")
+    monkeypatch.setattr(security, "SIGNING_KEY", private_key)
+    monkeypatch.setattr(security, "KEY_ID", public_jwk["kid"])
+    token = security.create_access_token({"id": "user-id"})
+    assert jwt.get_unverified_header(token)["kid"] == public_jwk["kid"]
+    payload = jwt.decode(
+        token, jwk.construct(public_jwk, "RS256"), algorithms=["RS256"]
+    )
+    assert payload["id"] == "user-id"
+    assert "d" not in public_jwk
+
+
+def test_jwk_thumbprint_is_stable() -> None:
+    private_key = generate_rsa_private_key()
+    public_jwk = security.get_public_jwk(private_key, "RS256")
+    assert public_jwk["kid"] == security.jwk_thumbprint(public_jwk)
+    assert security.get_public_jwk(private_key, "RS256", "key-1")[
+        "kid"
+    ] == "key-1"
+
+
+def test_hash_with_other_rounds_needs_update() -> None:
+    old_context = security.get_crypt_context(["bcrypt"], bcrypt_rounds=4)
+    new_context = security.get_crypt_context(["bcrypt"], bcrypt_rounds=5)
+    hashed_password = old_context.hash("secret")
+    assert new_context.needs_update(hashed_password)
+    assert not new_context.needs_update(new_context.hash("secret"))
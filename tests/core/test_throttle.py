@@ -0,0 +1,84 @@
+from app.core.throttle import LoginThrottle, MemoryTokenBucketBackend
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_memory_bucket_refills() -> None:
+    clock = FakeClock()
+    backend = MemoryTokenBucketBackend(max_keys=10, clock=clock)
+    assert backend.take("key", capacity=2, rate=1) == 0
+    assert backend.take("key", capacity=2, rate=1) == 0
+    assert backend.take("key", capacity=2, rate=1) == 1
+    clock.now = 1.0
+    assert backend.take("key", capacity=2, rate=1) == 0
+    clock.now = 100.0
+    assert backend.take("key", capacity=2, rate=1) == 0
+    assert backend.take("key", capacity=2, rate=1) == 0
+    assert backend.take("key", capacity=2, rate=1) == 1
+
+
+def test_memory_bucket_evicts_least_recently_used() -> None:
+    backend = MemoryTokenBucketBackend(max_keys=1, clock=FakeClock())
+    assert backend.take("first", capacity=1, rate=1) == 0
+    assert backend.take("second", capacity=1, rate=1) == 0
+    assert backend.take("first", capacity=1, rate=1) == 0
+
+
+def test_login_throttle_checks_ip_before_username() -> None:
+    throttle = LoginThrottle(
+        MemoryTokenBucketBackend(max_keys=10, clock=FakeClock()),
+        username_capacity=1,
+        username_per_minute=1,
+        ip_capacity=2,
+        ip_per_minute=1,
+    )
+    assert throttle.check("User@Email.com", "10.0.0.1") == 0
+    assert throttle.check("user@email.com", "10.0.0.1") == 60
+    assert throttle.check("other@email.com", "10.0.0.1") == 60
+    assert throttle.check("other@email.com", "10.0.0.2") == 0
+    stats = throttle.stats()
+    assert stats["allowed"] == 2
+    assert stats["throttled_username"] == 1
+    assert stats["throttled_ip"] == 1
+
+
+def test_login_throttle_only_counts_failed_attempts() -> None:
+    throttle = LoginThrottle(
+        MemoryTokenBucketBackend(max_keys=10, clock=FakeClock()),
+        username_capacity=1,
+        username_per_minute=1,
+        ip_capacity=1,
+        ip_per_minute=1,
+    )
+    for _ in range(3):
+        assert throttle.check("user@email.com", "10.0.0.1") == 0
+        throttle.succeeded("user@email.com", "10.0.0.1")
+    assert throttle.check("user@email.com", "10.0.0.1") == 0
+    assert throttle.check("user@email.com", "10.0.0.1") == 60
+
+
+def test_login_throttle_client_ip_behind_trusted_proxies() -> None:
+    throttle = LoginThrottle(
+        MemoryTokenBucketBackend(max_keys=10, clock=FakeClock()),
+        username_capacity=1,
+        username_per_minute=1,
+        ip_capacity=1,
+        ip_per_minute=1,
+        trusted_proxies=["10.0.0.0/8"],
+    )
+    assert throttle.client_ip("10.0.0.1", None) == "10.0.0.1"
+    assert throttle.client_ip("10.0.0.1", "1.2.3.4") == "1.2.3.4"
+    # The left-most addresses are set by the client
+    assert (
+        throttle.client_ip("10.0.0.1", "6.6.6.6, 1.2.3.4, 10.0.0.2")
+        == "1.2.3.4"
+    )
+    assert throttle.client_ip("10.0.0.1", "10.0.0.3") == "10.0.0.3"
+    # Only trusted proxies may set the header
+    assert throttle.client_ip("1.2.3.4", "6.6.6.6") == "1.2.3.4"
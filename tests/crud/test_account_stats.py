@@ -0,0 +1,144 @@
+from app import crud, schemas
+from app.models.account import Account
+from app.models.account_stats import AccountStats
+from app.models.user import User
+from app.models.user_role import UserRole
+from sqlalchemy.orm import Session
+from tests.utils.utils import random_email, random_lower_string
+
+
+def create_account(db: Session) -> Account:
+    account = Account(name=random_lower_string())
+    db.add(account)
+    db.commit()
+    return account
+
+
+def test_account_stats_follow_user_writes(db: Session) -> None:
+    account = create_account(db)
+    other_account = create_account(db)
+    assert crud.account_stats.get(db, account_id=account.id) is None
+
+    users = [
+        crud.user.create(
+            db,
+            obj_in=schemas.UserCreate(
+                email=random_email(),
+                password=random_lower_string(),
+                account_id=account.id,
+            ),
+        )
+        for _ in range(3)
+    ]
+    role = crud.role.get_by_name(db, name="ACCOUNT_ADMIN")
+    crud.user_role.create(
+        db, obj_in=schemas.UserRoleCreate(user_id=users[0].id, role_id=role.id)
+    )
+    crud.user.update(db, db_obj=users[1], obj_in={"is_active": False})
+    crud.user.update(db, db_obj=users[2], obj_in={"account_id": None})
+    crud.user.create_multi(
+        db,
+        objs_in=[
+            (
+                schemas.UserCreate(
+                    email=random_email(),
+                    password=random_lower_string(),
+                    account_id=other_account.id,
+                ),
+                "hashed",
+            )
+        ],
+    )
+
+    stats = crud.account_stats.get(db, account_id=account.id)
+    db.refresh(stats)
+    assert stats.user_count == 2
+    assert stats.active_user_count == 1
+    assert stats.inactive_user_count == 1
+    assert [(r.role_id, r.user_count) for r in stats.roles] == [(role.id, 1)]
+
+    crud.user.update(db, db_obj=users[0], obj_in={"account_id": None})
+    db.expire_all()
+    stats = crud.account_stats.get(db, account_id=account.id)
+    assert stats.user_count == 1
+    assert stats.roles == []
+    other_stats = crud.account_stats.get(db, account_id=other_account.id)
+    assert other_stats.user_count == 1
+
+
+def test_rebuild_account_stats(db: Session) -> None:
+    account = create_account(db)
+    crud.user.create(
+        db,
+        obj_in=schemas.UserCreate(
+            email=random_email(),
+            password=random_lower_string(),
+            account_id=account.id,
+        ),
+    )
+    db.query(AccountStats).update(
+        {AccountStats.user_count: 100}, synchronize_session=False
+    )
+    db.commit()
+    crud.account_stats.rebuild(db, account_id=account.id)
+    db.expire_all()
+    assert crud.account_stats.get(db, account_id=account.id).user_count == 1
+
+    db.query(AccountStats).update(
+        {AccountStats.user_count: 100}, synchronize_session=False
+    )
+    db.commit()
+    crud.account_stats.rebuild(db)
+    db.expire_all()
+    assert crud.account_stats.get(db, account_id=account.id).user_count == 1
+
+
+def test_account_stats_follow_bulk_statements(db: Session) -> None:
+    account = create_account(db)
+    other_account = create_account(db)
+    created = crud.user.create_multi(
+        db,
+        objs_in=[
+            (
+                schemas.UserCreate(
+                    email=random_email(),
+                    password=random_lower_string(),
+                    account_id=account.id,
+                ),
+                "hashed",
+            )
+            for _ in range(4)
+        ],
+    )
+    ids = list(created.values())
+    role = crud.role.get_by_name(db, name="ACCOUNT_MANAGER")
+    db.execute(
+        UserRole.__table__.insert(),
+        [{"user_id": id, "role_id": role.id} for id in ids[:3]],
+    )
+    db.commit()
+    db.query(User).filter(User.id.in_(ids[:2])).update(
+        {User.account_id: other_account.id}, synchronize_session=False
+    )
+    db.query(User).filter(User.id.in_(ids)).update(
+        {User.is_active: False}, synchronize_session=False
+    )
+    db.commit()
+
+    db.expire_all()
+    stats = crud.account_stats.get(db, account_id=account.id)
+    assert (stats.user_count, stats.active_user_count) == (2, 0)
+    assert [(r.role_id, r.user_count) for r in stats.roles] == [(role.id, 1)]
+    other_stats = crud.account_stats.get(db, account_id=other_account.id)
+    assert (other_stats.user_count, other_stats.active_user_count) == (2, 0)
+    assert [(r.role_id, r.user_count) for r in other_stats.roles] == [
+        (role.id, 2)
+    ]
+
+    db.query(UserRole).filter(UserRole.user_id.in_(ids)).delete(
+        synchronize_session=False
+    )
+    db.commit()
+    db.expire_all()
+    assert crud.account_stats.get(db, account_id=account.id).roles == []
+    assert crud.account_stats.get(db, account_id=other_account.id).roles == []
@@ -0,0 +1,45 @@
+from app import crud
+from app.schemas.user import UserCreate
+from sqlalchemy.orm import Session
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_issue_refresh_token(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.user.create(db, obj_in=user_in)
+    token = crud.refresh_token.issue(db, user_id=user.id)
+    db_token = crud.refresh_token.get_by_token(db, token=token)
+    assert db_token
+    assert db_token.user_id == user.id
+    assert db_token.token_hash != token
+    assert db_token.revoked_at is None
+
+
+def test_rotate_refresh_token(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.user.create(db, obj_in=user_in)
+    token = crud.refresh_token.issue(db, user_id=user.id)
+    db_token = crud.refresh_token.get_by_token(db, token=token)
+    new_token = crud.refresh_token.rotate(db, db_obj=db_token)
+    new_db_token = crud.refresh_token.get_by_token(db, token=new_token)
+    assert new_db_token.family_id == db_token.family_id
+    assert crud.refresh_token.get_by_token(db, token=token).revoked_at
+    assert crud.refresh_token.rotate(db, db_obj=db_token) is None
+
+
+def test_revoke_refresh_tokens_for_user(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.user.create(db, obj_in=user_in)
+    crud.refresh_token.issue(db, user_id=user.id)
+    crud.refresh_token.issue(db, user_id=user.id)
+    assert crud.refresh_token.revoke_for_user(db, user_id=user.id) == 2
+    assert crud.refresh_token.revoke_for_user(db, user_id=user.id) == 0
+
+
+def test_remove_user_with_refresh_tokens(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.user.create(db, obj_in=user_in)
+    token = crud.refresh_token.issue(db, user_id=user.id)
+    crud.user.remove(db, id=user.id)
+    assert crud.user.get(db, id=user.id) is None
+    assert crud.refresh_token.get_by_token(db, token=token) is None
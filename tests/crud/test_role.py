@@ -1,6 +1,9 @@
 from app import crud
+from app.models.role import Role as RoleModel
 from app.schemas.role import RoleCreate
 from sqlalchemy.orm import Session
+from tests.utils.queries import assert_num_queries
+from tests.utils.utils import random_lower_string
 
 
 def test_get_roles(db: Session) -> None:
@@ -15,3 +18,44 @@ def test_get_roles(db: Session) -> None:
     assert role_1
     assert role_2
     assert len(roles) > 1
+
+
+def test_role_catalog_reloads_on_write(db: Session) -> None:
+    role_in = RoleCreate(name=random_lower_string(), description="catalog")
+    role = crud.role.create(db, obj_in=role_in)
+    catalog = crud.role.get_catalog(db)
+    assert catalog.get(role.id).name == role_in.name
+    assert catalog.get_by_name(role_in.name).id == role.id
+
+    etag = catalog.etag
+    crud.role.update(db, db_obj=role, obj_in={"description": "updated"})
+    assert catalog.get(role.id).description == "updated"
+    assert catalog.etag != etag
+
+    crud.role.remove(db, id=role.id)
+    assert catalog.get(role.id) is None
+    assert catalog.get_by_name(role_in.name) is None
+
+
+def test_role_catalog_lookups_skip_the_database(db: Session) -> None:
+    crud.role.load_catalog(db)
+    with assert_num_queries(0):
+        catalog = crud.role.get_catalog(db)
+        assert catalog.get_by_name("ACCOUNT_ADMIN")
+    catalog.invalidate()
+    with assert_num_queries(1):
+        crud.role.get_catalog(db)
+
+
+def test_get_role_by_name_from_the_catalog(db: Session) -> None:
+    crud.role.load_catalog(db)
+    with assert_num_queries(0):
+        assert crud.role.get_by_name(db, name="ACCOUNT_ADMIN")
+    # Written behind the catalog's back, e.g. by another worker
+    name = random_lower_string()
+    db.add(RoleModel(name=name, description="catalog"))
+    db.commit()
+    role = crud.role.get_by_name(db, name=name)
+    assert role and role.name == name
+    assert crud.role.get_catalog(db).get_by_name(name)
+    assert crud.role.get_by_name(db, name=random_lower_string()) is None
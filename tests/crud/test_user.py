@@ -1,8 +1,14 @@
+from uuid import uuid4
+
 from app import crud
+from app.core import security
 from app.core.security import verify_password
+from app.db.session import TestingSessionLocal
 from app.schemas.user import UserCreate, UserUpdate
 from fastapi.encoders import jsonable_encoder
+from pytest import MonkeyPatch
 from sqlalchemy.orm import Session
+from tests.utils.queries import count_queries
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -27,6 +33,28 @@ def test_authenticate_user(db: Session) -> None:
     assert user.email == authenticated_user.email
 
 
+def test_authenticate_rehashes_outdated_password(
+    db: Session, monkeypatch: MonkeyPatch
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    old_context = security.get_crypt_context(["bcrypt"], bcrypt_rounds=4)
+    user = crud.user.create(
+        db,
+        obj_in=UserCreate(email=email, password=password),
+        hashed_password=old_context.hash(password),
+    )
+    new_context = security.get_crypt_context(["bcrypt"], bcrypt_rounds=5)
+    monkeypatch.setattr(security, "pwd_context", new_context)
+    authenticated_user = crud.user.authenticate(
+        db, email=email, password=password
+    )
+    assert authenticated_user
+    db.refresh(user)
+    assert not new_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
+
+
 def test_not_authenticate_user(db: Session) -> None:
     email = random_email()
     password = random_lower_string()
@@ -77,6 +105,34 @@ def test_update_user(db: Session) -> None:
     assert new_username == user_2.full_name
 
 
+def test_update_user_in_one_query(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.user.create(db, obj_in=user_in)
+    updated_at = user.updated_at
+    full_name = random_lower_string()
+    with count_queries() as statements:
+        crud.user.update(db, db_obj=user, obj_in={"full_name": full_name})
+        assert user.full_name == full_name
+        assert user.updated_at > updated_at
+    # The UPDATE ... RETURNING, then the role expired by the commit
+    assert len(statements) == 2
+    assert statements[0].startswith("UPDATE users")
+    db.expire(user)
+    assert user.full_name == full_name
+
+
+def test_update_deleted_user(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.user.create(db, obj_in=user_in)
+    other_db = TestingSessionLocal()
+    crud.user.remove(other_db, id=user.id)
+    other_db.close()
+    updated = crud.user.update(
+        db, db_obj=user, obj_in={"full_name": random_lower_string()}
+    )
+    assert updated is None
+
+
 def test_update_password(db: Session) -> None:
     password = random_lower_string()
     email = random_email()
@@ -89,3 +145,30 @@ def test_update_password(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(password, user_2.hashed_password)
+
+
+def test_search_users(db: Session) -> None:
+    prefix = random_lower_string()[:12]
+    name = random_lower_string()
+    by_email = crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=f"{prefix}@example.com", password=random_lower_string()
+        ),
+    )
+    by_name = crud.user.create(
+        db,
+        obj_in=UserCreate(
+            email=random_email(),
+            password=random_lower_string(),
+            full_name=f"Ada {name.upper()} Lovelace",
+        ),
+    )
+    users = crud.user.search(db, q=prefix.upper())
+    assert [user.id for user in users] == [by_email.id]
+    users = crud.user.search(db, q=name[3:12])
+    assert [user.id for user in users] == [by_name.id]
+    assert users[0].user_role is None
+    # Wildcards are matched literally
+    assert crud.user.search(db, q="%%%") == []
+    assert crud.user.search(db, q=prefix, account_id=uuid4()) == []
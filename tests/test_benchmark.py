@@ -0,0 +1,67 @@
+from app import crud, schemas
+from app.benchmark import (
+    BENCHMARK_EMAIL_DOMAIN,
+    compare,
+    delete_created_users,
+    is_disposable_db,
+    percentile,
+    summarize,
+)
+from sqlalchemy.orm import Session
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_percentile() -> None:
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3.0, 1.0, 2.0], 50) == 2
+    assert percentile([], 50) == 0
+
+
+def test_summarize() -> None:
+    result = summarize("users_me", 4, [0.001, 0.002, 0.003, 0.004], 1, 2.0)
+    assert result.requests == 4
+    assert result.errors == 1
+    assert result.rps == 2
+    assert result.p50_ms == 2
+    assert result.p99_ms == 4
+
+
+def test_compare() -> None:
+    baseline = [
+        {"scenario": "users_me", "concurrency": 1, "p95_ms": 10, "rps": 100},
+        {"scenario": "login", "concurrency": 1, "p95_ms": 300, "rps": 3},
+    ]
+    results = [
+        {"scenario": "users_me", "concurrency": 1, "p95_ms": 10.5, "rps": 95},
+        {"scenario": "login", "concurrency": 1, "p95_ms": 400, "rps": 2},
+        {"scenario": "login", "concurrency": 4, "p95_ms": 900, "rps": 1},
+    ]
+    regressions = compare(results, baseline, threshold=0.1)
+    assert len(regressions) == 2
+    assert all(regression.startswith("login x1") for regression in regressions)
+
+
+def test_is_disposable_db() -> None:
+    assert is_disposable_db("app_test")
+    assert is_disposable_db("app_benchmark")
+    assert not is_disposable_db("app")
+    assert not is_disposable_db("test_app")
+
+
+def test_delete_created_users(db: Session) -> None:
+    created_email = f"created-{random_lower_string()}@{BENCHMARK_EMAIL_DOMAIN}"
+    kept_email = random_email()
+    for email in (created_email, kept_email):
+        crud.user.create(
+            db,
+            obj_in=schemas.UserCreate(
+                email=email, password=random_lower_string()
+            ),
+        )
+    assert delete_created_users(db) >= 1
+    db.expire_all()
+    assert crud.user.get_by_email(db, email=created_email) is None
+    assert crud.user.get_by_email(db, email=kept_email)
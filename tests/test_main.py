@@ -1,3 +1,8 @@
+from typing import Any, Dict, List
+
+from _pytest.monkeypatch import MonkeyPatch
+from app.core.config import settings
+from app.db import query_stats
 from fastapi.testclient import TestClient
 
 
@@ -6,3 +11,63 @@ def test_health_check(client: TestClient) -> None:
     assert r.status_code == 200
     assert "message" in r.json()
     assert r.json()["message"] == "ok!"
+
+
+def test_jwks(client: TestClient) -> None:
+    r = client.get("/.well-known/jwks.json")
+    assert r.status_code == 200
+    assert "keys" in r.json()
+    assert r.headers["cache-control"].startswith("public, max-age=")
+
+
+def test_metrics(client: TestClient) -> None:
+    client.get("/health")
+    client.get("/api/v1/users/00000000-0000-0000-0000-000000000000")
+    client.get("/no-such-path")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert (
+        'http_requests_total{method="GET",route="/health",status="200"}'
+        in text
+    )
+    # Labelled by the route template, not the requested path
+    assert 'route="/api/v1/users/{user_id}"' in text
+    assert "00000000-0000" not in text
+    assert 'route="<unmatched>",status="404"' in text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_bucket{method="GET"' in text
+    assert 'app_cache_hits_total{cache="principal"}' in text
+    assert 'app_db_pool_checkouts_total{engine="test"}' in text
+
+
+def test_server_timing(
+    client: TestClient,
+    superadmin_token_headers: Dict[str, str],
+    monkeypatch: MonkeyPatch,
+) -> None:
+    warnings: List[Any] = []
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(
+        query_stats.logger, "warning", lambda *args: warnings.append(args)
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/users/search",
+        headers=superadmin_token_headers,
+        params={"q": settings.FIRST_SUPER_ADMIN_EMAIL},
+    )
+    assert r.status_code == 200
+    timing = r.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert 'desc="0 queries"' not in timing
+    # Logged with the route template, parameter values are redacted
+    assert warnings
+    assert any(args[2] == "/api/v1/users/search" for args in warnings)
+    assert settings.FIRST_SUPER_ADMIN_EMAIL not in str(warnings)
+    r = client.get("/metrics")
+    assert (
+        'http_request_db_queries_count{method="GET",'
+        'route="/api/v1/users/search"}' in r.text
+    )
+    assert 'db_slow_queries_total{route="/api/v1/users/search"}' in r.text
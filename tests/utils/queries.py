@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, List
+
+from app.core.config import settings
+from app.db import session
+from sqlalchemy import event
+
+test_engines = [session.test_engine]
+if settings.ASYNC_DB:
+    test_engines.append(session.async_test_engine.sync_engine)
+
+
+@contextmanager
+def count_queries() -> Iterator[List[str]]:
+    """
+    Collect the statements executed against the test database, from
+    either session kind.
+    """
+    statements: List[str] = []
+
+    def before_cursor_execute(
+        conn: Any, cursor: Any, statement: str, *args: Any
+    ) -> None:
+        statements.append(statement)
+
+    for engine in test_engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in test_engines:
+            event.remove(
+                engine, "before_cursor_execute", before_cursor_execute
+            )
+
+
+@contextmanager
+def assert_num_queries(expected: int) -> Iterator[None]:
+    """
+    Fail if the block does not execute exactly `expected` statements.
+    """
+    with count_queries() as statements:
+        yield
+    assert len(statements) == expected, "\n\n".join(statements)
@@ -12,3 +12,7 @@ def random_lower_string() -> str:
 
 def random_email() -> str:
     return f"{random_lower_string()}@{random_lower_string()}.com"
+
+
+def random_phone_number() -> str:
+    return "+" + "".join(random.choices(string.digits, k=12))